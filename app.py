@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, send_file, g, has_app_context
 import pymysql
 import bcrypt
 import os
@@ -6,15 +6,41 @@ import uuid
 from datetime import datetime, timedelta
 import pytz
 import secrets
+import threading
+import time
+import tempfile
+from urllib.parse import urlencode
+import hashlib
+import mimetypes
 from functools import wraps
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import uuid
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.local import LocalProxy
+from werkzeug.http import is_resource_modified
+from werkzeug.exceptions import NotFound
 
 from PIL import Image
 
+from db_pool import ConnectionPool
+from page_view_writer import PageViewWriter
+from view_counter import ViewCounter
+from stats_rollup import StatsRollup
+from site_counters import SiteCounters
+from image_derivatives import ImageDerivatives
+from image_variants import VariantCache
+from image_index import ImageIndex, image_filename
+from blob_store import BlobStore
+import keyset
+from page_cache import PageCache, TaggedValue
+from proxy_purge import ProxyPurger
+from static_assets import StaticManifest
+from compression import CompressionMiddleware
+from template_assets import TemplateAssets, TemplateAssetLoader
+
 app = Flask(__name__)
 app.secret_key = 'your-fixed-secret-key-for-development-only'
 
@@ -23,6 +49,47 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000  # 1 year cache for static fi
 app.config['JSON_AS_ASCII'] = False  # Support for non-ASCII characters in JSON
 app.config['COMPRESS_MIMETYPES'] = ['text/html', 'text/css', 'text/xml', 'application/json', 'application/javascript']
 
+# Content-hashed static assets (prebuild with: python static_assets.py)
+STATIC_FINGERPRINT_ENABLED = os.getenv('STATIC_FINGERPRINT_ENABLED', 'True').lower() == 'true'
+static_assets = StaticManifest(app.static_folder)
+if STATIC_FINGERPRINT_ENABLED:
+    static_assets.load_or_build()
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """url_for('static', filename=...) points at the content-hashed copy"""
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = static_assets.url(values['filename'])
+
+def serve_static(filename):
+    """Static files, sending the precompressed .br / .gz sibling the client accepts"""
+    encoding, path = static_assets.negotiate(filename, request.accept_encodings)
+    response = send_from_directory(app.static_folder, path,
+                                   mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+app.view_functions['static'] = serve_static
+
+# Large inline <style>/<script> blocks in templates are served as cached bundles (build: python template_assets.py)
+TEMPLATE_ASSETS_ENABLED = os.getenv('TEMPLATE_ASSETS_ENABLED', 'True').lower() == 'true'
+if TEMPLATE_ASSETS_ENABLED:
+    app.jinja_loader = TemplateAssetLoader(os.path.join(app.root_path, app.template_folder),
+                                           TemplateAssets(static_assets).load())
+
+# On-the-fly gzip/brotli for rendered pages and JSON (static files are precompressed)
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True').lower() == 'true'
+compression = CompressionMiddleware(
+    app.wsgi_app,
+    mimetypes=app.config['COMPRESS_MIMETYPES'],
+    min_size=int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),
+    level=int(os.getenv('COMPRESSION_LEVEL', 6)),
+    brotli_quality=int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+)
+if COMPRESSION_ENABLED:
+    app.wsgi_app = compression
+
 # Add response headers for optimization
 @app.after_request
 def after_request(response):
@@ -35,10 +102,27 @@ def after_request(response):
     response.headers['X-XSS-Protection'] = '1; mode=block'
     
     # Cache control for static assets
-    if request.endpoint and request.endpoint.startswith('static'):
-        response.headers['Cache-Control'] = 'public, max-age=31536000'  # 1 year
+    if request.endpoint == 'static' and static_assets.is_fingerprinted(request.view_args.get('filename', '')):
+        # The name changes with the content, so browsers never need to ask again
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    elif request.endpoint and request.endpoint.startswith('static'):
+        # Unhashed names can change in place; revalidate with Last-Modified / ETag
+        response.headers['Cache-Control'] = 'public, no-cache'
+        response.headers.pop('Expires', None)
     elif request.endpoint and 'image' in request.endpoint:
         response.headers['Cache-Control'] = 'public, max-age=2592000'  # 30 days
+    elif request.endpoint in REVALIDATED_FILE_ENDPOINTS:
+        # Strong ETag / Last-Modified make an unchanged file a 304
+        response.headers['Cache-Control'] = 'public, no-cache'
+    elif shared_cacheable(response):
+        # Anonymous listing: a reverse proxy may keep it; browsers revalidate
+        s_maxage, stale = SHARED_CACHE_RULES[request.endpoint]
+        response.headers['Cache-Control'] = f'public, max-age=0, s-maxage={s_maxage}, stale-while-revalidate={stale}'
+        response.headers[proxy_purger.header] = ' '.join(PAGE_CACHE_RULES[request.endpoint][1])
+        response.vary.add('Cookie')
+    elif request.endpoint in CONDITIONAL_PAGES and 'ETag' in response.headers:
+        # Revalidated on every use; an unchanged page costs a 304 instead of a render
+        response.headers['Cache-Control'] = 'private, no-cache'
     else:
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         response.headers['Pragma'] = 'no-cache'
@@ -66,11 +150,14 @@ def get_beijing_now():
     return beijing_time.replace(tzinfo=None)  # Return naive datetime for MySQL
 
 @app.template_filter('image_url')
-def image_url_filter(image_path):
+def image_url_filter(image_path, variant=None, fmt='jpeg'):
     """Convert database image path to proper URL for display
     
     Args:
         image_path (str): Relative path from database
+        variant (str): Sized copy to prefer ('cover', 'card', 'thumb'); the
+            original is used until the copy has been generated
+        fmt (str): Format of the sized copy ('jpeg' or 'webp')
         
     Returns:
         str: Proper URL for web display
@@ -79,28 +166,13 @@ def image_url_filter(image_path):
         return ''
     
     # If it's already a full URL, return as-is
-    if image_path.startswith('http'):
+    filename = image_filename(image_path)
+    if filename is None:
         return image_path
     
-    # Remove leading slash if present
-    if image_path.startswith('/'):
-        image_path = image_path[1:]
-    
-    # Check if path starts with 'image/' (server format)
-    if image_path.startswith('image/'):
-        # Server environment - serve from /image/ directory
-        return f"/{image_path}"
-    elif image_path.startswith('uploads/'):
-        # Convert uploads/ to cloud format /image/
-        # uploads/forum_images/... -> /image/forum_images/...
-        cloud_path = image_path.replace('uploads/', 'image/', 1)
-        return f"/{cloud_path}"
-    elif image_path.startswith('resources/'):
-        # Resource images - always use cloud format
-        return f"/image/{image_path}"
-    else:
-        # Fallback - assume it's in image directory
-        return f"/image/{image_path}"
+    if variant and IMAGE_DERIVATIVES_ENABLED:
+        filename = image_derivatives.resolve(filename, variant, fmt) or filename
+    return f"/image/{filename}"
 
 # 添加Jinja2模板过滤器
 @app.template_filter('beijing_time')
@@ -149,7 +221,7 @@ app.jinja_env.globals.update(min=min, max=max)
 # 将current_user添加到Jinja2全局变量，让所有模板都可以访问
 @app.context_processor
 def inject_current_user():
-    return dict(current_user=current_user)
+    return dict(current_user=get_current_user())
 
 # Email configuration for password reset
 EMAIL_CONFIG = {
@@ -186,8 +258,106 @@ class AnonymousUser:
         self.is_active = True
         self.is_anonymous = True
 
-# 全局匿名用户对象
-current_user = AnonymousUser()
+def get_current_user():
+    """Return the user for the active request (anonymous outside of a request)"""
+    if has_app_context():
+        user = g.get('user')
+        if user is not None:
+            return user
+    return AnonymousUser()
+
+# 请求级别的当前用户 - 每个请求/线程独立，支持多线程/gevent worker
+current_user = LocalProxy(get_current_user)
+
+# Session user snapshot - lets load_logged_in_user skip the users lookup
+SESSION_USER_VERSION = 1  # bump to invalidate every snapshot already issued
+SESSION_USER_MAX_AGE = int(os.getenv('SESSION_USER_MAX_AGE', 3600))    # seconds before a snapshot is reloaded anyway
+USER_REVOCATION_TTL = int(os.getenv('USER_REVOCATION_TTL', 30))       # seconds between checks for changed users
+
+# user_id -> users.updated_at (Beijing time string) for users changed within SESSION_USER_MAX_AGE
+_user_revocations = {'checked_at': 0, 'changed': {}}
+_user_revocations_lock = threading.Lock()
+
+def _session_time(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+def store_session_user(user):
+    """Embed a snapshot of the user in the signed session cookie"""
+    session['user'] = {
+        'v': SESSION_USER_VERSION,
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.user_role,
+        'status': user.registration_status,
+        'issued': _session_time(get_beijing_now())
+    }
+
+def mark_user_changed(user_id):
+    """Invalidate session snapshots of a user whose role or status just changed
+    
+    Takes effect immediately in this process; other workers pick the change up
+    from users.updated_at within USER_REVOCATION_TTL seconds.
+    """
+    with _user_revocations_lock:
+        _user_revocations['changed'][user_id] = _session_time(get_beijing_now())
+
+def refresh_user_revocations():
+    """Reload recently changed users at most once per USER_REVOCATION_TTL"""
+    now = time.monotonic()
+    with _user_revocations_lock:
+        if now - _user_revocations['checked_at'] < USER_REVOCATION_TTL:
+            return
+        _user_revocations['checked_at'] = now
+    
+    since = get_beijing_now() - timedelta(seconds=SESSION_USER_MAX_AGE)
+    connection = get_db_connection()
+    if connection is None:
+        return
+    cursor = connection.cursor()
+    cursor.execute("SELECT id, updated_at FROM users WHERE updated_at >= %s", (since,))
+    rows = cursor.fetchall()
+    cursor.close()
+    connection.close()
+    
+    cutoff = _session_time(since)
+    with _user_revocations_lock:
+        changed = _user_revocations['changed']
+        for user_id, updated_at in rows:
+            stamp = _session_time(updated_at)
+            if stamp > changed.get(user_id, ''):
+                changed[user_id] = stamp
+        # Snapshots older than the cutoff are reloaded anyway, so older entries can go
+        for user_id in [uid for uid, stamp in changed.items() if stamp < cutoff]:
+            del changed[user_id]
+
+def session_user_from_snapshot(user_id):
+    """Build the User from the session snapshot, or None if it must be reloaded"""
+    snapshot = session.get('user')
+    if not snapshot or snapshot.get('v') != SESSION_USER_VERSION or snapshot.get('id') != user_id:
+        return None
+    
+    issued = snapshot.get('issued', '')
+    max_age_cutoff = _session_time(get_beijing_now() - timedelta(seconds=SESSION_USER_MAX_AGE))
+    if issued < max_age_cutoff:
+        return None
+    
+    try:
+        refresh_user_revocations()
+    except Exception as e:
+        print(f"Error refreshing user revocations: {e}")
+    with _user_revocations_lock:
+        changed_at = _user_revocations['changed'].get(user_id)
+    if changed_at is not None and changed_at >= issued:
+        return None
+    
+    return User(
+        id=snapshot['id'],
+        username=snapshot['username'],
+        email=snapshot.get('email'),
+        user_role=snapshot['role'],
+        registration_status=snapshot['status']
+    )
 
 # 用户登录函数 - 简化版本
 def login_user(user):
@@ -195,86 +365,73 @@ def login_user(user):
     session['user_id'] = user.id
     session['username'] = user.username
     session['user_role'] = user.user_role
-    global current_user
-    current_user = user
+    store_session_user(user)
+    g.user = user
 
 # 用户登出函数 - 简化版本  
 def logout_user():
     """登出用户 - 清除session"""
     session.clear()
-    global current_user
-    current_user = AnonymousUser()
+    g.user = AnonymousUser()
 
 # 在每个请求前检查用户session状态
 @app.before_request
 def load_logged_in_user():
-    """从session加载用户信息"""
-    global current_user
+    """从session加载用户信息 - 优先使用session快照，失效时才查询数据库"""
     user_id = session.get('user_id')
+    g.user = AnonymousUser()
     
     if user_id is None:
-        current_user = AnonymousUser()
-    else:
-        # 从数据库加载用户信息
-        try:
-            connection = get_db_connection()
-            if connection is None:
-                current_user = AnonymousUser()
-                return
-                
-            cursor = connection.cursor()
-            cursor.execute("""
-                SELECT id, username, email, user_role, registration_status
-                FROM users WHERE id = %s
-            """, (user_id,))
+        return
+    
+    user = session_user_from_snapshot(user_id)
+    if user is not None:
+        g.user = user
+        return
+    
+    # 快照缺失或已失效 - 从数据库加载用户信息
+    try:
+        connection = get_db_connection()
+        if connection is None:
+            return
             
-            user_data = cursor.fetchone()
-            if user_data:
-                current_user = User(
-                    id=user_data[0],
-                    username=user_data[1],
-                    email=user_data[2],
-                    user_role=user_data[3],
-                    registration_status=user_data[4]
-                )
-            else:
-                current_user = AnonymousUser()
-                session.clear()
-                
-            cursor.close()
-            connection.close()
-                
-        except Exception as e:
-            print(f"Error loading user from session: {e}")
-            current_user = AnonymousUser()
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT id, username, email, user_role, registration_status
+            FROM users WHERE id = %s
+        """, (user_id,))
+        
+        user_data = cursor.fetchone()
+        if user_data:
+            g.user = User(
+                id=user_data[0],
+                username=user_data[1],
+                email=user_data[2],
+                user_role=user_data[3],
+                registration_status=user_data[4]
+            )
+            store_session_user(g.user)
+        else:
+            session.clear()
+            
+        cursor.close()
+        connection.close()
+            
+    except Exception as e:
+        print(f"Error loading user from session: {e}")
 
 def track_page_view(page_type, page_id=None, user_id=None):
-    """Record page view in database"""
+    """Queue a page view for the background writer (no database work in the request)"""
     try:
-        # Simple database connection for tracking
-        connection = pymysql.connect(
-            **DB_CONFIG,
-            autocommit=True,
-            charset='utf8mb4'
-        )
-        cursor = connection.cursor()
-        cursor.execute("SET time_zone = '+08:00'")
-        cursor.execute("SET SESSION time_zone = '+08:00'")
-        
         # Get user information
         ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
         user_agent = request.environ.get('HTTP_USER_AGENT', '')[:500] if request.environ.get('HTTP_USER_AGENT') else ''
         referrer = request.environ.get('HTTP_REFERER', '')[:500] if request.environ.get('HTTP_REFERER') else ''
         session_id = session.get('session_id', 'anonymous')[:100]
         
-        # Insert page view record
-        cursor.execute("""
-            INSERT INTO page_views (page_type, page_id, user_id, ip_address, user_agent, referrer, session_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (page_type, page_id, user_id, ip_address, user_agent, referrer, session_id))
-        
-        cursor.close()
-        connection.close()
+        # created_at is captured now because the row is written a little later
+        page_view_writer.record((page_type, page_id, user_id, ip_address, user_agent,
+                                 referrer, session_id, get_beijing_now()))
         
     except Exception as e:
         print(f"Error tracking page view: {e}")
@@ -300,8 +457,18 @@ class User:
         self.is_authenticated = True  # 真实用户总是已认证的
         self.is_active = True
 
-def get_db_connection(max_retries=3):
-    """Get database connection with optimized retry mechanism"""
+# Connection pool configuration
+DB_POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+    'max_idle': int(os.getenv('DB_POOL_MAX_IDLE', 300)),          # seconds before an idle connection is recycled
+    'max_lifetime': int(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),  # seconds before any connection is recycled
+    'ping_after': int(os.getenv('DB_POOL_PING_AFTER', 5)),         # idle seconds before checkout pings
+    'checkout_timeout': int(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', 5))
+}
+
+def create_db_connection(max_retries=3):
+    """Open a new database connection with optimized retry mechanism"""
     for attempt in range(max_retries):
         try:
             connection = pymysql.connect(
@@ -314,20 +481,480 @@ def get_db_connection(max_retries=3):
                 init_command="SET SESSION sql_mode='STRICT_TRANS_TABLES', time_zone='+08:00'",
                 max_allowed_packet=16777216  # 16MB
             )
-            # Quick connection test
-            connection.ping(reconnect=False)
             return connection
             
         except Exception as e:
             print(f"Database connection attempt {attempt + 1} failed: {e}")
             if attempt == max_retries - 1:
-                print("All database connection attempts failed. Using fallback mode.")
-                return None
+                raise
             import time
             # Faster retry: 0.1, 0.2, 0.4 seconds
             wait_time = 0.1 * (2 ** attempt)
             time.sleep(wait_time)
 
+db_pool = ConnectionPool(create_db_connection, **DB_POOL_CONFIG)
+
+def get_db_connection():
+    """Get a pooled database connection
+    
+    Inside a request every call returns the same connection, kept on flask.g and
+    handed back to the pool at teardown, so close() in handlers is harmless.
+    Outside a request close() returns the connection to the pool.
+    
+    Returns:
+        PooledConnection or None if the database is unreachable
+    """
+    if has_app_context() and '_db_connection' in g:
+        return g._db_connection
+    
+    try:
+        if has_app_context():
+            g._db_connection = db_pool.connection(scoped=True)
+            return g._db_connection
+        return db_pool.connection()
+    except Exception as e:
+        print(f"All database connection attempts failed. Using fallback mode. ({e})")
+        return None
+
+def get_own_db_connection():
+    """A pooled connection of its own, even inside a request
+
+    For work that commits or rolls back independently of the request's
+    transaction. close() returns it to the pool.
+    """
+    try:
+        return db_pool.connection()
+    except Exception as e:
+        print(f"All database connection attempts failed. Using fallback mode. ({e})")
+        return None
+
+# Page view tracking - batched multi-row INSERTs from a background thread
+PAGE_VIEW_CONFIG = {
+    'max_queue': int(os.getenv('PAGE_VIEW_MAX_QUEUE', 10000)),
+    'batch_size': int(os.getenv('PAGE_VIEW_BATCH_SIZE', 200)),
+    'flush_interval': float(os.getenv('PAGE_VIEW_FLUSH_INTERVAL', 2.0))
+}
+
+page_view_writer = PageViewWriter(get_db_connection, **PAGE_VIEW_CONFIG).register_shutdown()
+
+# View counts - increments are coalesced in memory and flushed as one UPDATE per table
+VIEW_COUNT_FLUSH_INTERVAL = float(os.getenv('VIEW_COUNT_FLUSH_INTERVAL', 5.0))
+VIEW_COUNT_SHOW_PENDING = os.getenv('VIEW_COUNT_SHOW_PENDING', 'True').lower() == 'true'
+
+view_counter = ViewCounter(get_db_connection, flush_interval=VIEW_COUNT_FLUSH_INTERVAL).register_shutdown()
+
+# Hourly/daily statistics rollups (backfill history with: python stats_rollup.py --backfill)
+STATS_ROLLUP_INTERVAL = int(os.getenv('STATS_ROLLUP_INTERVAL', 300))
+
+stats_rollup = StatsRollup(get_db_connection, get_beijing_now, interval=STATS_ROLLUP_INTERVAL)
+
+# Site-wide totals, adjusted by the write paths and periodically recounted (python site_counters.py)
+SITE_COUNTERS_RECONCILE_INTERVAL = int(os.getenv('SITE_COUNTERS_RECONCILE_INTERVAL', 3600))
+
+# Reconciliation commits, so it never borrows the request's connection
+site_counters = SiteCounters(get_own_db_connection, interval=SITE_COUNTERS_RECONCILE_INTERVAL)
+
+# Sized WebP/JPEG copies of uploaded images, made off the request path (backfill: python image_derivatives.py --backfill)
+IMAGE_DERIVATIVES_ENABLED = os.getenv('IMAGE_DERIVATIVES_ENABLED', 'True').lower() == 'true'
+
+image_derivatives = ImageDerivatives(
+    get_db_connection,
+    image_root='/image',
+    workers=int(os.getenv('IMAGE_DERIVATIVE_WORKERS', 2)),
+    refresh_interval=int(os.getenv('IMAGE_DERIVATIVES_REFRESH_INTERVAL', 60)),
+    reload_interval=int(os.getenv('IMAGE_DERIVATIVES_RELOAD_INTERVAL', 600))
+)
+
+# Resized copies served by /image/<path>?w=<width>&fmt=<format>, cached on disk with LRU eviction
+IMAGE_VARIANTS_ENABLED = os.getenv('IMAGE_VARIANTS_ENABLED', 'True').lower() == 'true'
+IMAGE_VARIANT_WIDTHS = tuple(int(w) for w in os.getenv('IMAGE_VARIANT_WIDTHS', '160,320,480,640,800,1200,1600').split(','))
+# Format used when only a width is given: keep PNG/WebP, everything else becomes JPEG
+IMAGE_VARIANT_DEFAULT_FORMATS = {'.png': 'png', '.webp': 'webp'}
+
+image_variants = VariantCache(
+    cache_dir=os.getenv('IMAGE_VARIANT_CACHE_DIR', '/image/.variants'),
+    max_bytes=int(os.getenv('IMAGE_VARIANT_CACHE_MB', 512)) * 1024 * 1024,
+    widths=IMAGE_VARIANT_WIDTHS
+)
+
+# Manifest of the files under /image, scanned at startup and kept current by the save/delete paths
+image_index = ImageIndex(
+    '/image',
+    workers=int(os.getenv('IMAGE_INDEX_SCAN_WORKERS', 8)),
+    negative_ttl=int(os.getenv('IMAGE_INDEX_NEGATIVE_TTL', 60))
+)
+
+# Uploaded images stored once per distinct content under /image/blobs/, reference-counted per post/resource
+blob_store = BlobStore('/image')
+
+def queue_image_derivatives(image_path):
+    """Index a just-saved image and have the worker pool make its sized copies"""
+    filename = image_filename(image_path)
+    if filename:
+        image_index.add(filename)
+    if (IMAGE_DERIVATIVES_ENABLED and filename
+            and not image_derivatives.resolve(filename, 'cover', 'jpeg')  # a re-uploaded blob has them already
+            and os.path.exists(os.path.join(image_derivatives.image_root, filename))):
+        image_derivatives.enqueue(filename)
+
+def save_image_blob(file, file_ext):
+    """Store an uploaded image by content hash; returns the path to keep in the database"""
+    path, size, existed = blob_store.save(file, f'.{file_ext}')
+    if existed:
+        print(f"♻️ 重复图片，复用已有文件: {path}")
+    queue_image_derivatives(path)
+    return path
+
+def release_image_blobs(paths):
+    """Delete blobs (and their sized copies) whose last reference was just committed away"""
+    for path in blob_store.unlink(paths):
+        image_index.discard(path)
+        if IMAGE_DERIVATIVES_ENABLED:
+            image_derivatives.remove(path)
+
+# Comments shown per page on a forum post
+COMMENTS_PER_PAGE = int(os.getenv('COMMENTS_PER_PAGE', 50))
+
+# Page sizes for keyset-paginated listings
+LISTING_PAGE_SIZE = int(os.getenv('LISTING_PAGE_SIZE', 24))
+FORUM_PAGE_SIZE = int(os.getenv('FORUM_PAGE_SIZE', 50))
+
+# Full-page cache for anonymous GET requests: endpoint -> (TTL seconds, invalidation tags)
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'True').lower() == 'true'
+PAGE_CACHE_RULES = {
+    'index': (60, ('resources', 'forum')),
+    'forum': (30, ('forum',)),
+    'subjects_overview': (300, ('resources',)),
+    'subjects_category': (300, ('resources',)),
+    'subject_level_resources': (300, ('resources',)),
+    'subject_level_category_resources': (300, ('resources', 'forum')),
+    'competition_resources': (300, ('resources',)),
+    'university_resources': (300, ('resources',)),
+    'category_resources': (120, ('forum',)),
+    'education_resources': (120, ('forum',)),
+}
+assert set(PAGE_CACHE_RULES) <= set(PUBLIC_ROUTES)
+# Query parameters that never change the page
+PAGE_CACHE_IGNORED_ARGS = ('utm_', 'fbclid', 'gclid')
+
+page_cache = PageCache(
+    max_bytes=int(os.getenv('PAGE_CACHE_MAX_MB', 32)) * 1024 * 1024,
+    marker_dir=os.getenv('PAGE_CACHE_MARKER_DIR', os.path.join(tempfile.gettempdir(), 'stem_page_cache'))
+)
+
+# Reverse proxy / CDN caching of anonymous listings (rules follow SKIPPED_VIEW_TRACKERS below)
+SHARED_CACHE_ENABLED = os.getenv('SHARED_CACHE_ENABLED', 'True').lower() == 'true'
+SHARED_CACHE_STALE = int(os.getenv('SHARED_CACHE_STALE_WHILE_REVALIDATE', 60))
+
+proxy_purger = ProxyPurger(
+    url=os.getenv('PROXY_PURGE_URL'),
+    method=os.getenv('PROXY_PURGE_METHOD', 'PURGE'),
+    header=os.getenv('PROXY_PURGE_HEADER', 'Surrogate-Key')
+)
+
+def purge_cached_pages(*tags):
+    """Drop pages with these tags from the page cache, every worker and the reverse proxy"""
+    page_cache.invalidate(*tags)
+    proxy_purger.purge(*tags)
+
+def shared_cacheable(response):
+    """Anonymous page identical for every visitor without a session, safe for a shared cache"""
+    return (SHARED_CACHE_ENABLED
+            and request.method in ('GET', 'HEAD')
+            and request.endpoint in SHARED_CACHE_RULES
+            and response.status_code in (200, 304)
+            and not current_user.is_authenticated
+            and not session.get('admin_logged_in')
+            # a modified session would send a Set-Cookie with the page
+            and not session.modified
+            and '_flashes' not in session)
+
+@app.before_request
+def start_background_jobs():
+    """Start per-process maintenance threads (after any worker fork)"""
+    stats_rollup.ensure_started()
+    site_counters.ensure_started()
+    image_index.ensure_started()
+    if IMAGE_DERIVATIVES_ENABLED:
+        image_derivatives.ensure_started()
+
+def resource_version(resource_id):
+    """Columns of an active resource that its detail page shows beyond the 'resources' tag"""
+    connection = get_db_connection()
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    cursor.execute("""
+        SELECT updated_at, like_count, download_count FROM resources
+        WHERE id = %s AND status = 'active'
+    """, (resource_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    return row
+
+def forum_post_version(post_id):
+    """Columns of a visible forum post that its detail page shows beyond the 'forum' tag"""
+    connection = get_db_connection()
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    cursor.execute("""
+        SELECT updated_at, reply_count FROM forum_posts
+        WHERE id = %s AND status = 'active' AND approval_status = 'approved'
+    """, (post_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    return row
+
+# Conditional GET for dynamic pages: endpoint -> (data version tags, row version loader or None).
+# The tags are the page cache invalidation tags, so the same write routes move both.
+CONDITIONAL_GET_ENABLED = os.getenv('CONDITIONAL_GET_ENABLED', 'True').lower() == 'true'
+CONDITIONAL_PAGES = {endpoint: (tags, None) for endpoint, (ttl, tags) in PAGE_CACHE_RULES.items()}
+CONDITIONAL_PAGES.update({
+    'view_resource': (('resources',), resource_version),
+    'forum_post_detail': (('forum',), forum_post_version),
+})
+# View counts change without a tagged write; validators roll over this often
+CONDITIONAL_GET_WINDOW = int(os.getenv('CONDITIONAL_GET_WINDOW', 300))
+# Template edits and new static asset URLs change every page
+TEMPLATES_VERSION = max(entry.stat().st_mtime_ns
+                        for entry in os.scandir(os.path.join(app.root_path, app.template_folder)))
+
+# Views counted even when the page is answered without running the view function
+SKIPPED_VIEW_TRACKERS = {
+    'forum': lambda: track_page_view('forum', None, current_user.id if current_user.is_authenticated else None),
+    'forum_post_detail': lambda post_id: (
+        track_page_view('forum_post', post_id, current_user.id if current_user.is_authenticated else None),
+        view_counter.increment('forum_posts', post_id)),
+    'view_resource': lambda resource_id: view_counter.increment('resources', resource_id),
+}
+
+# endpoint -> (s-maxage, stale-while-revalidate). Pages that count views stay out:
+# a proxy hit never reaches the app, so the view would not be recorded.
+SHARED_CACHE_RULES = {endpoint: (ttl, SHARED_CACHE_STALE) for endpoint, (ttl, tags) in PAGE_CACHE_RULES.items()
+                      if endpoint not in SKIPPED_VIEW_TRACKERS}
+
+def track_skipped_view():
+    tracker = SKIPPED_VIEW_TRACKERS.get(request.endpoint)
+    if tracker is not None:
+        tracker(**request.view_args)
+
+def page_validators():
+    """(etag, last_modified) for the current request, or None when it must be rendered"""
+    tags, row_version = CONDITIONAL_PAGES[request.endpoint]
+    changed_ns = page_cache.last_invalidated(tags)
+    last_modified = datetime.fromtimestamp(changed_ns / 1e9, pytz.utc) if changed_ns else None
+    versions = [changed_ns]
+    if row_version is not None:
+        row = row_version(**request.view_args)
+        if row is None:
+            return None  # the view shows its not-found response
+        versions.append(sorted(row.items()))
+        if row.get('updated_at'):
+            updated = convert_to_beijing_time(row['updated_at'])
+            last_modified = max(filter(None, [last_modified, updated]))
+    viewer = (current_user.id if current_user.is_authenticated else None, bool(session.get('admin_logged_in')))
+    window = int(time.time() // CONDITIONAL_GET_WINDOW)
+    source = repr((request.endpoint, page_cache_key(), viewer, versions, window,
+                   TEMPLATES_VERSION, static_assets.version))
+    return hashlib.sha1(source.encode('utf-8')).hexdigest(), last_modified
+
+@app.before_request
+def answer_conditional_get():
+    """304 for a page the browser already holds, decided before any template is rendered"""
+    if (not CONDITIONAL_GET_ENABLED or request.method not in ('GET', 'HEAD')
+            or request.endpoint not in CONDITIONAL_PAGES or '_flashes' in session):
+        return None
+    try:
+        validators = page_validators()
+    except Exception as e:
+        print(f"Error computing page validators: {e}")
+        return None
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    g.page_validators = validators
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    track_skipped_view()
+    response = app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+def page_cache_key():
+    """Normalised URL: path plus sorted, non-empty, non-tracking query arguments"""
+    args = sorted((k, v) for k, v in request.args.items(multi=True)
+                  if v and not k.startswith(PAGE_CACHE_IGNORED_ARGS))
+    return f"{request.path}?{urlencode(args)}" if args else request.path
+
+def page_cacheable():
+    """Anonymous GET on a cached endpoint with no flashed messages waiting"""
+    return (PAGE_CACHE_ENABLED
+            and request.method in ('GET', 'HEAD')
+            and request.endpoint in PAGE_CACHE_RULES
+            and not current_user.is_authenticated
+            and not session.get('admin_logged_in')
+            and '_flashes' not in session)
+
+@app.before_request
+def serve_cached_page():
+    """Answer anonymous requests for cached endpoints without running the view"""
+    if not page_cacheable():
+        return None
+    key = page_cache_key()
+    entry = page_cache.get(key)
+    if entry is None:
+        g.page_cache_key = key
+        g.page_cache_started = page_cache.clock()
+        return None
+    track_skipped_view()
+    response = app.response_class(entry.body, status=entry.status, headers=entry.headers)
+    response.headers['X-Page-Cache'] = 'HIT'
+    return response.make_conditional(request)
+
+@app.after_request
+def store_cached_page(response):
+    """Keep successful anonymous renders that did not touch the session"""
+    key = g.pop('page_cache_key', None)
+    if key is None:
+        return response
+    if (response.status_code == 200 and response.mimetype == 'text/html'
+            and not response.direct_passthrough and not session.modified
+            and 'Set-Cookie' not in response.headers):
+        ttl, tags = PAGE_CACHE_RULES[request.endpoint]
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name in ('Content-Type', 'ETag', 'Last-Modified')]
+        page_cache.put(key, 200, headers, response.get_data(), ttl, tags, g.page_cache_started)
+    response.headers['X-Page-Cache'] = 'MISS'
+    return response
+
+@app.after_request
+def add_page_validators(response):
+    """ETag / Last-Modified on rendered pages (runs before the page cache stores them)"""
+    validators = g.pop('page_validators', None)
+    if validators is not None and response.status_code == 200:
+        etag, last_modified = validators
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified
+    return response
+
+# Catalog summary shared by the home and subjects overview pages
+CATALOG_SUMMARY_TTL = int(os.getenv('CATALOG_SUMMARY_TTL', 300))
+CATALOG_FEATURED_PER_SUBJECT = 3
+CATALOG_FEATURED_OVERALL = 6
+
+def load_catalog_summary():
+    """Per-subject counts, top resources per subject and overall, in one query"""
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError('database unavailable')
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute("""
+            SELECT ranked.id, ranked.title, ranked.description, ranked.category, ranked.subject,
+                   ranked.resource_type, ranked.view_count, ranked.like_count, ranked.created_at,
+                   ranked.subject_rank, ranked.overall_rank, ranked.subject_count, ranked.total_count,
+                   u.username as author_name
+            FROM (
+                SELECT r.id, r.title, r.description, r.category, r.subject, r.resource_type,
+                       r.view_count, r.like_count, r.created_at, r.user_id,
+                       ROW_NUMBER() OVER (PARTITION BY r.subject
+                                          ORDER BY r.view_count DESC, r.created_at DESC, r.id DESC) as subject_rank,
+                       ROW_NUMBER() OVER (ORDER BY r.view_count DESC, r.created_at DESC, r.id DESC) as overall_rank,
+                       COUNT(*) OVER (PARTITION BY r.subject) as subject_count,
+                       COUNT(*) OVER () as total_count
+                FROM resources r
+                WHERE r.status = 'active'
+            ) ranked
+            JOIN users u ON ranked.user_id = u.id
+            WHERE ranked.subject_rank <= %s OR ranked.overall_rank <= %s
+            ORDER BY ranked.overall_rank
+        """, (CATALOG_FEATURED_PER_SUBJECT, CATALOG_FEATURED_OVERALL))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+    summary = {'subject_counts': {}, 'featured_by_subject': {}, 'featured': [], 'total_resources': 0}
+    for row in rows:
+        summary['subject_counts'][row['subject']] = row['subject_count']
+        summary['total_resources'] = row['total_count']
+        if row['subject_rank'] <= CATALOG_FEATURED_PER_SUBJECT:
+            summary['featured_by_subject'].setdefault(row['subject'], []).append(row)
+        if row['overall_rank'] <= CATALOG_FEATURED_OVERALL:
+            summary['featured'].append(row)
+    for featured in summary['featured_by_subject'].values():
+        featured.sort(key=lambda row: row['subject_rank'])
+    return summary
+
+catalog_summary = TaggedValue(page_cache, load_catalog_summary, CATALOG_SUMMARY_TTL, ('resources',))
+
+def catalog_rows(rows):
+    """Copies of cached catalog rows with pending view increments applied"""
+    return with_pending_views([dict(row) for row in rows], 'resources')
+
+def invalidates_pages(*tags):
+    """Decorator for write routes: purge cached pages with these tags after a POST"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                return f(*args, **kwargs)
+            finally:
+                if request.method != 'GET':
+                    purge_cached_pages(*tags)
+        return decorated_function
+    return decorator
+
+def fetch_listing_page(cursor, query, params, ordering, alias, table, limit=None):
+    """Keyset page of a listing query driven by the ?after= / ?before= cursors"""
+    page = keyset.fetch_page(cursor, query, params, ordering, alias=alias,
+                             after=request.args.get('after'), before=request.args.get('before'),
+                             limit=limit or LISTING_PAGE_SIZE)
+    with_pending_views(page.rows, table)
+    return page
+
+def with_pending_views(rows, table):
+    """Add not-yet-flushed view increments to rows shown on listing pages"""
+    if VIEW_COUNT_SHOW_PENDING:
+        view_counter.apply_pending(rows, table)
+    return rows
+
+def load_attachment_previews(cursor, posts, limit=5):
+    """Attach attachment_count and the first `limit` attachments to each post in one query"""
+    for post in posts:
+        post['attachment_count'] = 0
+        post['attachments'] = []
+    if not posts:
+        return posts
+    by_id = {post['id']: post for post in posts}
+    placeholders = ', '.join(['%s'] * len(by_id))
+    cursor.execute(f"""
+        SELECT post_id, name, size, attachment_count
+        FROM (
+            SELECT post_id, name, size,
+                   ROW_NUMBER() OVER (PARTITION BY post_id ORDER BY created_at, id) as rn,
+                   COUNT(*) OVER (PARTITION BY post_id) as attachment_count
+            FROM forum_attachments
+            WHERE post_id IN ({placeholders})
+        ) ranked
+        WHERE rn <= %s
+        ORDER BY post_id, rn
+    """, (*by_id, limit))
+    for row in cursor.fetchall():
+        post = by_id[row['post_id']]
+        post['attachment_count'] = row['attachment_count']
+        post['attachments'].append({'name': row['name'], 'size': row['size']})
+    return posts
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Return the request-scoped connection to the pool"""
+    connection = g.pop('_db_connection', None)
+    if connection is not None:
+        connection.release()
+
 # Admin authentication
 ADMIN_USERNAME = 'admin'
 ADMIN_PASSWORD = 'admin123'
@@ -402,6 +1029,14 @@ def delete_image_file(image_path):
         print(f"🔄 跳过外部URL或空路径: {image_path}")
         return True
     
+    if blob_store.digest(image_path):
+        # Shared by content: removed by release_image_blobs() when no row uses it any more
+        return True
+    
+    image_index.discard(image_filename(image_path))
+    if IMAGE_DERIVATIVES_ENABLED:
+        image_derivatives.remove(image_filename(image_path))
+    
     # List of possible paths to try (for different deployment environments)
     possible_paths = [
         f"/image/{image_path}",  # Primary path (Zeabur)
@@ -570,20 +1205,10 @@ def save_forum_image(file, image_type='cover', post_id=None):
         date_folder = datetime.now().strftime('%Y/%m')
         
         # Check if we're on server (detect by /image directory existence)
-        if os.path.exists('/image'):
-            # Server environment - use /image/uploads/
-            base_upload_dir = '/image/uploads/forum_images'
-            save_folder = os.path.join(base_upload_dir, date_folder)
-            os.makedirs(save_folder, exist_ok=True)
-            
-            # Full file path
-            file_path = os.path.join(save_folder, filename)
-            
-            # Save file
-            file.save(file_path)
-            
-            # Return relative path for database storage (without leading /)
-            relative_path = f"image/uploads/forum_images/{date_folder}/{filename}"
+        if blob_store.enabled:
+            # Server environment - content-addressed under /image/blobs/, identical uploads share one file
+            relative_path = save_image_blob(file, file_ext)
+            filename = os.path.basename(relative_path)
         else:
             # Local environment - use static/uploads/
             save_folder = os.path.join(UPLOAD_FOLDER, date_folder)
@@ -599,9 +1224,10 @@ def save_forum_image(file, image_type='cover', post_id=None):
             # Convert absolute path to relative path from static folder
             static_dir = os.path.join(os.getcwd(), 'static')
             relative_path = os.path.relpath(file_path, static_dir).replace('\\', '/')
-        
-        # Skip image optimization for better performance
-        # Images will be displayed as-is to avoid 30-second upload delays
+            
+            # The original is kept as uploaded; sized copies are made in the background
+            # so the upload returns without waiting on a resize
+            queue_image_derivatives(relative_path)
         
         return {
             'success': True,
@@ -794,17 +1420,9 @@ def index():
         connection = get_db_connection()
         cursor = connection.cursor(pymysql.cursors.DictCursor)
         
-        # Get featured resources (restore original resources table query)
-        cursor.execute("""
-            SELECT r.id, r.title, r.description, r.category, r.view_count, r.like_count,
-                   u.username as author_name, r.created_at
-            FROM resources r
-            JOIN users u ON r.user_id = u.id
-            WHERE r.status = 'active'
-            ORDER BY r.view_count DESC, r.created_at DESC
-            LIMIT 6
-        """)
-        featured_resources = cursor.fetchall()
+        # Featured resources and the resource total come from the cached catalog summary
+        catalog = catalog_summary.get()
+        featured_resources = catalog_rows(catalog['featured'])
         
         # Get recent forum posts (ordered by view count for popular content)
         cursor.execute("""
@@ -816,22 +1434,15 @@ def index():
             ORDER BY fp.view_count DESC, fp.created_at DESC
             LIMIT 5
         """)
-        recent_posts = cursor.fetchall()
+        recent_posts = with_pending_views(cursor.fetchall(), 'forum_posts')
         
         # Get statistics
-        cursor.execute("SELECT COUNT(*) FROM users WHERE registration_status = 'approved'")
-        total_users = cursor.fetchone()['COUNT(*)']
-        
-        cursor.execute("SELECT COUNT(*) FROM resources WHERE status = 'active'")
-        total_resources = cursor.fetchone()['COUNT(*)']
-        
-        cursor.execute("SELECT COUNT(*) FROM forum_posts WHERE status = 'active'")
-        total_posts = cursor.fetchone()['COUNT(*)']
+        counters = site_counters.get(cursor, 'users.status.approved', 'posts.status.active')
         
         stats = {
-            'users': total_users,
-            'resources': total_resources,
-            'posts': total_posts
+            'users': counters['users.status.approved'],
+            'resources': catalog['total_resources'],
+            'posts': counters['posts.status.active']
         }
         
         cursor.close()
@@ -894,6 +1505,7 @@ def register():
                 INSERT INTO users (username, email, password_hash, registration_status, user_role)
                 VALUES (%s, %s, %s, 'approved', 'student')
             """, (username, email, password_hash))
+            site_counters.row_inserted(cursor, 'users', registration_status='approved')
             
             connection.commit()
             flash('Registration successful! You can now log in with your account.', 'success')
@@ -1320,6 +1932,7 @@ def get_post_details(post_id):
 
 @app.route('/admin/resources/new', methods=['GET', 'POST'])
 @admin_required
+@invalidates_pages('resources')
 def admin_new_resource():
     """Admin create new resource page"""
     if request.method == 'POST':
@@ -1352,14 +1965,9 @@ def admin_new_resource():
                     date_folder = datetime.now().strftime('%Y/%m')
                     
                     # Check if we're on server (detect by /image directory existence)
-                    if os.path.exists('/image'):
-                        # Server environment - use /image/resources/
-                        uploads_dir = os.path.join('/image/resources', date_folder)
-                        os.makedirs(uploads_dir, exist_ok=True)
-                        upload_path = os.path.join(uploads_dir, filename)
-                        cover_file.save(upload_path)
-                        # Store relative path for server
-                        cover_image_path = f'resources/{date_folder}/{filename}'
+                    if blob_store.enabled:
+                        # Server environment - content-addressed under /image/blobs/
+                        cover_image_path = save_image_blob(cover_file, file_ext)
                     else:
                         # Local environment - use static/uploads/resources/
                         static_dir = os.path.join(os.getcwd(), 'static')
@@ -1387,14 +1995,9 @@ def admin_new_resource():
                     date_folder = datetime.now().strftime('%Y/%m')
                     
                     # Check if we're on server (detect by /image directory existence)
-                    if os.path.exists('/image'):
-                        # Server environment - use /image/resources/
-                        uploads_dir = os.path.join('/image/resources', date_folder)
-                        os.makedirs(uploads_dir, exist_ok=True)
-                        upload_path = os.path.join(uploads_dir, filename)
-                        img_file.save(upload_path)
-                        # Store relative path for server
-                        resource_path = f'resources/{date_folder}/{filename}'
+                    if blob_store.enabled:
+                        # Server environment - content-addressed under /image/blobs/
+                        resource_path = save_image_blob(img_file, file_ext)
                     else:
                         # Local environment - use static/uploads/resources/
                         static_dir = os.path.join(os.getcwd(), 'static')
@@ -1444,6 +2047,9 @@ def admin_new_resource():
                 resource_type, difficulty_level, cover_image_path, 
                 additional_images_string, get_beijing_now()
             ))
+            resource_id = cursor.lastrowid
+            site_counters.row_inserted(cursor, 'resources', status='active')
+            blob_store.link(cursor, 'resources', resource_id, [cover_image_path] + additional_images_paths)
             
             connection.commit()
             cursor.close()
@@ -1593,24 +2199,18 @@ def admin_dashboard():
         pending_posts = cursor.fetchall()
         
         # Get comprehensive statistics
-        cursor.execute("SELECT COUNT(*) as count FROM users")
-        total_users = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM resources")
-        total_resources = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM forum_posts")
-        total_posts = cursor.fetchone()['count']
-        
-        # Get forum post statistics by approval status
-        cursor.execute("""
-            SELECT 
-                COUNT(CASE WHEN approval_status = 'pending' THEN 1 END) as pending_posts,
-                COUNT(CASE WHEN approval_status = 'approved' THEN 1 END) as approved_posts,
-                COUNT(CASE WHEN approval_status = 'rejected' THEN 1 END) as rejected_posts
-            FROM forum_posts
-        """)
-        forum_stats = cursor.fetchone()
+        counters = site_counters.get(cursor, 'users', 'resources', 'posts', 'posts.approval.pending',
+                                     'posts.approval.approved', 'posts.approval.rejected')
+        total_users = counters['users']
+        total_resources = counters['resources']
+        total_posts = counters['posts']
+        
+        # Forum post statistics by approval status
+        forum_stats = {
+            'pending_posts': counters['posts.approval.pending'],
+            'approved_posts': counters['posts.approval.approved'],
+            'rejected_posts': counters['posts.approval.rejected']
+        }
         
         # Get user activity statistics (last 30 days)
         cursor.execute("""
@@ -1621,12 +2221,13 @@ def admin_dashboard():
         active_users_result = cursor.fetchone()
         active_users = active_users_result['active_users'] if active_users_result else 0
         
-        # Get today's statistics
+        # Get today's statistics (range on created_at so the index can be used)
         cursor.execute("""
             SELECT 
-                COUNT(CASE WHEN DATE(created_at) = CURDATE() THEN 1 END) as today_posts,
-                COUNT(CASE WHEN DATE(created_at) = CURDATE() AND approval_status = 'pending' THEN 1 END) as today_pending
+                COUNT(*) as today_posts,
+                COUNT(CASE WHEN approval_status = 'pending' THEN 1 END) as today_pending
             FROM forum_posts
+            WHERE created_at >= CURDATE() AND created_at < CURDATE() + INTERVAL 1 DAY
         """)
         today_stats = cursor.fetchone()
         
@@ -1697,17 +2298,20 @@ def admin_resources():
 
 @app.route('/admin/approve_resource/<int:resource_id>', methods=['POST'])
 @admin_required
+@invalidates_pages('resources')
 def approve_resource(resource_id):
     """Approve a resource"""
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
         
+        before = site_counters.lock_row(cursor, 'resources', resource_id)
         cursor.execute("""
             UPDATE resources 
             SET status = 'active', updated_at = %s 
             WHERE id = %s
         """, (get_beijing_now(), resource_id))
+        site_counters.row_updated(cursor, 'resources', before, status='active')
         
         connection.commit()
         cursor.close()
@@ -1721,17 +2325,20 @@ def approve_resource(resource_id):
 
 @app.route('/admin/reject_resource/<int:resource_id>', methods=['POST'])
 @admin_required
+@invalidates_pages('resources')
 def reject_resource(resource_id):
     """Reject a resource"""
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
         
+        before = site_counters.lock_row(cursor, 'resources', resource_id)
         cursor.execute("""
             UPDATE resources 
             SET status = 'archived', updated_at = %s 
             WHERE id = %s
         """, (get_beijing_now(), resource_id))
+        site_counters.row_updated(cursor, 'resources', before, status='archived')
         
         connection.commit()
         cursor.close()
@@ -1745,6 +2352,7 @@ def reject_resource(resource_id):
 
 @app.route('/admin/delete_resource/<int:resource_id>', methods=['DELETE'])
 @admin_required
+@invalidates_pages('resources')
 def delete_resource(resource_id):
     """Delete a resource with image cleanup"""
     try:
@@ -1773,14 +2381,18 @@ def delete_resource(resource_id):
         print(f"🧹 Resource {resource_id} 图片清理结果: {cleanup_results}")
         
         # Delete the resource (foreign key constraints will handle cleanup)
+        before = site_counters.lock_row(cursor, 'resources', resource_id)
         cursor.execute("""
             DELETE FROM resources 
             WHERE id = %s
         """, (resource_id,))
+        site_counters.row_deleted(cursor, 'resources', before)
+        released = blob_store.release(cursor, 'resources', resource_id)
         
         connection.commit()
         cursor.close()
         connection.close()
+        release_image_blobs(released)
         
         # Prepare response message
         message = 'Resource deleted successfully'
@@ -1799,17 +2411,20 @@ def delete_resource(resource_id):
 
 @app.route('/admin/archive_resource/<int:resource_id>', methods=['POST'])
 @admin_required
+@invalidates_pages('resources')
 def archive_resource(resource_id):
     """Archive a resource"""
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
         
+        before = site_counters.lock_row(cursor, 'resources', resource_id)
         cursor.execute("""
             UPDATE resources 
             SET status = 'archived', updated_at = %s 
             WHERE id = %s
         """, (get_beijing_now(), resource_id))
+        site_counters.row_updated(cursor, 'resources', before, status='archived')
         
         connection.commit()
         cursor.close()
@@ -1823,17 +2438,20 @@ def archive_resource(resource_id):
 
 @app.route('/admin/activate_resource/<int:resource_id>', methods=['POST'])
 @admin_required
+@invalidates_pages('resources')
 def activate_resource(resource_id):
     """Activate a resource"""
     try:
         connection = get_db_connection()
         cursor = connection.cursor()
         
+        before = site_counters.lock_row(cursor, 'resources', resource_id)
         cursor.execute("""
             UPDATE resources 
             SET status = 'active', updated_at = %s 
             WHERE id = %s
         """, (get_beijing_now(), resource_id))
+        site_counters.row_updated(cursor, 'resources', before, status='active')
         
         connection.commit()
         cursor.close()
@@ -1871,12 +2489,9 @@ def view_resource(resource_id):
             flash('Resource not found', 'error')
             return redirect(url_for('index'))
             
-        # Increment view count
-        cursor.execute("""
-            UPDATE resources SET view_count = view_count + 1 
-            WHERE id = %s
-        """, (resource_id,))
-        connection.commit()
+        # Increment view count (coalesced and flushed in the background)
+        with_pending_views([resource], 'resources')
+        view_counter.increment('resources', resource_id)
             
         cursor.close()
         connection.close()
@@ -1943,31 +2558,30 @@ def subjects_category(subject):
         connection = get_db_connection()
         cursor = connection.cursor(pymysql.cursors.DictCursor)
         
-        # Get resources for this subject grouped by education level
-        cursor.execute("""
+        # Get one page of resources for this subject ordered by education level
+        page = fetch_listing_page(cursor, """
             SELECT r.id, r.title, r.description, r.category, r.subject, r.resource_type,
                    r.difficulty_level, r.view_count, r.download_count, r.like_count,
                    r.cover_image, r.created_at, u.username as author_name
             FROM resources r
             JOIN users u ON r.user_id = u.id
             WHERE r.subject = %s AND r.status = 'active'
-            ORDER BY r.category, r.view_count DESC, r.created_at DESC
-        """, (subject,))
-        
-        all_resources = cursor.fetchall()
+        """, (subject,), 'category_popular', 'r', 'resources')
+        all_resources = page.rows
         
-        # Group resources by education level
+        # Group the page's resources by education level
         resources_by_level = {}
-        level_counts = {}
-        print(f"🔧 DEBUG: Processing {len(all_resources)} resources for subject '{subject}'")
         for resource in all_resources:
-            level = resource['category']
-            if level not in resources_by_level:
-                resources_by_level[level] = []
-                level_counts[level] = 0
-            resources_by_level[level].append(resource)
-            level_counts[level] += 1
-        print(f"🔧 DEBUG: level_counts = {level_counts}")
+            resources_by_level.setdefault(resource['category'], []).append(resource)
+        
+        # Level counts cover the whole subject, not just this page
+        cursor.execute("""
+            SELECT category, COUNT(*) as count
+            FROM resources
+            WHERE subject = %s AND status = 'active'
+            GROUP BY category
+        """, (subject,))
+        level_counts = {row['category']: row['count'] for row in cursor.fetchall()}
         
         cursor.close()
         connection.close()
@@ -1984,6 +2598,7 @@ def subjects_category(subject):
         
         return render_template('subjects_category.html', 
                              all_resources=all_resources,
+                             page=page,
                              resources_by_level=resources_by_level,
                              level_counts=level_counts,
                              subject=subject,
@@ -1999,37 +2614,14 @@ def subjects_category(subject):
 def subjects_overview():
     """Overview page showing all subjects (Maths, Physics, Chemistry, Biology)"""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        # Counts and top resources per subject come from the cached catalog summary
+        catalog = catalog_summary.get()
+        subject_counts = catalog['subject_counts']
         
-        # Get resource counts by subject
-        cursor.execute("""
-            SELECT subject, COUNT(*) as count
-            FROM resources 
-            WHERE status = 'active'
-            GROUP BY subject
-        """)
-        
-        subject_counts = {row['subject']: row['count'] for row in cursor.fetchall()}
-        
-        # Get featured resources from each subject
         featured_resources = {}
         subjects = ['math', 'physics', 'chemistry', 'biology']
-        
         for subject in subjects:
-            cursor.execute("""
-                SELECT r.id, r.title, r.description, r.category, r.resource_type,
-                       r.view_count, r.created_at, u.username as author_name
-                FROM resources r
-                JOIN users u ON r.user_id = u.id
-                WHERE r.subject = %s AND r.status = 'active'
-                ORDER BY r.view_count DESC, r.created_at DESC
-                LIMIT 3
-            """, (subject,))
-            featured_resources[subject] = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
+            featured_resources[subject] = catalog_rows(catalog['featured_by_subject'].get(subject, []))
         
         return render_template('subjects_overview.html', 
                              subject_counts=subject_counts,
@@ -2070,18 +2662,17 @@ def subject_level_resources(subject, education_level):
         connection = get_db_connection()
         cursor = connection.cursor(pymysql.cursors.DictCursor)
         
-        # Get resources for this subject and education level
-        cursor.execute("""
+        # Get one page of resources for this subject and education level
+        page = fetch_listing_page(cursor, """
             SELECT r.id, r.title, r.description, r.category, r.subject, r.resource_type,
                    r.difficulty_level, r.view_count, r.download_count, r.like_count,
                    r.cover_image, r.created_at, u.username as author_name
             FROM resources r
             JOIN users u ON r.user_id = u.id
             WHERE r.subject = %s AND r.category = %s AND r.status = 'active'
-            ORDER BY r.view_count DESC, r.created_at DESC
-        """, (subject, db_category))
+        """, (subject, db_category), 'popular', 'r', 'resources')
         
-        resources = cursor.fetchall()
+        resources = page.rows
         cursor.close()
         connection.close()
         
@@ -2106,6 +2697,7 @@ def subject_level_resources(subject, education_level):
         
         return render_template('subject_level_resources.html', 
                              resources=resources,
+                             page=page,
                              subject=subject,
                              education_level=education_level,
                              subject_title=subject_title,
@@ -2152,17 +2744,16 @@ def subject_level_category_resources(subject, education_level, category):
         
         # For forum posts (questions category), get from forum_posts table
         if category == 'questions':
-            cursor.execute("""
+            page = fetch_listing_page(cursor, """
                 SELECT fp.id, fp.title, fp.content as description, fp.category, fp.topic,
                        fp.view_count, fp.reply_count, fp.created_at, fp.cover_image,
                        u.username as author_name, 'question' as resource_type
                 FROM forum_posts fp
                 JOIN users u ON fp.user_id = u.id
                 WHERE fp.topic LIKE %s AND fp.category = %s AND fp.status = 'active'
-                ORDER BY fp.view_count DESC, fp.created_at DESC
-            """, (f"%{subject}%", category))
+            """, (f"%{subject}%", category), 'popular', 'fp', 'forum_posts')
             
-            resources = cursor.fetchall()
+            resources = page.rows
             # Add resource_type for template consistency
             for resource in resources:
                 resource['resource_type'] = 'question'
@@ -2182,7 +2773,7 @@ def subject_level_category_resources(subject, education_level, category):
             # Get resources matching all three criteria
             if category in ['books', 'homework', 'tests', 'notes']:
                 # Use broader search for resource content category
-                cursor.execute("""
+                page = fetch_listing_page(cursor, """
                     SELECT r.id, r.title, r.description, r.category, r.subject, r.resource_type,
                            r.difficulty_level, r.view_count, r.download_count, r.like_count,
                            r.cover_image, r.created_at, u.username as author_name
@@ -2191,21 +2782,19 @@ def subject_level_category_resources(subject, education_level, category):
                     WHERE r.subject = %s AND r.category = %s
                     AND (r.resource_type = %s OR r.title LIKE %s OR r.description LIKE %s)
                     AND r.status = 'active'
-                    ORDER BY r.view_count DESC, r.created_at DESC
                 """, (subject, db_category, category_to_resource_type.get(category, category), 
-                      f"%{category}%", f"%{category}%"))
+                      f"%{category}%", f"%{category}%"), 'popular', 'r', 'resources')
             else:
-                cursor.execute("""
+                page = fetch_listing_page(cursor, """
                     SELECT r.id, r.title, r.description, r.category, r.subject, r.resource_type,
                            r.difficulty_level, r.view_count, r.download_count, r.like_count,
                            r.cover_image, r.created_at, u.username as author_name
                     FROM resources r
                     JOIN users u ON r.user_id = u.id
                     WHERE r.subject = %s AND r.category = %s AND r.status = 'active'
-                    ORDER BY r.view_count DESC, r.created_at DESC
-                """, (subject, db_category))
+                """, (subject, db_category), 'popular', 'r', 'resources')
             
-            resources = cursor.fetchall()
+            resources = page.rows
         
         cursor.close()
         connection.close()
@@ -2240,6 +2829,7 @@ def subject_level_category_resources(subject, education_level, category):
         
         return render_template('subject_level_category_resources.html', 
                              resources=resources,
+                             page=page,
                              subject=subject,
                              education_level=education_level,
                              category=category,
@@ -2255,8 +2845,7 @@ def subject_level_category_resources(subject, education_level, category):
 
 # Resource Interaction Routes
 @app.route('/like_resource/<int:resource_id>', methods=['POST'])
-
-
+@invalidates_pages('resources')
 def like_resource(resource_id):
     """Toggle like status for a resource"""
     try:
@@ -2407,15 +2996,14 @@ def admin_forum_management():
         rejected_posts = cursor.fetchall()
         
         # Get statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(CASE WHEN approval_status = 'pending' THEN 1 END) as pending,
-                COUNT(CASE WHEN approval_status = 'approved' THEN 1 END) as approved,
-                COUNT(CASE WHEN approval_status = 'rejected' THEN 1 END) as rejected,
-                COUNT(*) as total
-            FROM forum_posts
-        """)
-        stats = cursor.fetchone()
+        counters = site_counters.get(cursor, 'posts.approval.pending', 'posts.approval.approved',
+                                     'posts.approval.rejected', 'posts')
+        stats = {
+            'pending': counters['posts.approval.pending'],
+            'approved': counters['posts.approval.approved'],
+            'rejected': counters['posts.approval.rejected'],
+            'total': counters['posts']
+        }
         
         cursor.close()
         connection.close()
@@ -2433,6 +3021,7 @@ def admin_forum_management():
 
 @app.route('/admin/forum/approve/<int:post_id>', methods=['POST'])
 @admin_required
+@invalidates_pages('forum')
 def admin_approve_forum_post(post_id):
     """Approve a forum post"""
     try:
@@ -2440,6 +3029,7 @@ def admin_approve_forum_post(post_id):
         cursor = connection.cursor()
         
         # Update post approval status
+        before = site_counters.lock_row(cursor, 'forum_posts', post_id)
         cursor.execute("""
             UPDATE forum_posts 
             SET approval_status = 'approved', 
@@ -2448,6 +3038,7 @@ def admin_approve_forum_post(post_id):
                 rejection_reason = NULL
             WHERE id = %s
         """, (current_user.id, get_beijing_now(), post_id))
+        site_counters.row_updated(cursor, 'forum_posts', before, approval_status='approved')
         
         # Log the review action
         cursor.execute("""
@@ -2467,6 +3058,7 @@ def admin_approve_forum_post(post_id):
 
 @app.route('/admin/forum/reject/<int:post_id>', methods=['POST'])
 @admin_required
+@invalidates_pages('forum')
 def admin_reject_forum_post(post_id):
     """Reject a forum post"""
     try:
@@ -2480,6 +3072,7 @@ def admin_reject_forum_post(post_id):
         cursor = connection.cursor()
         
         # Update post approval status
+        before = site_counters.lock_row(cursor, 'forum_posts', post_id)
         cursor.execute("""
             UPDATE forum_posts 
             SET approval_status = 'rejected', 
@@ -2488,6 +3081,7 @@ def admin_reject_forum_post(post_id):
                 rejection_reason = %s
             WHERE id = %s
         """, (current_user.id, get_beijing_now(), reason, post_id))
+        site_counters.row_updated(cursor, 'forum_posts', before, approval_status='rejected')
         
         # Log the review action
         cursor.execute("""
@@ -2507,6 +3101,7 @@ def admin_reject_forum_post(post_id):
 
 @app.route('/admin/forum/delete/<int:post_id>', methods=['DELETE'])
 @admin_required
+@invalidates_pages('forum')
 def admin_delete_forum_post(post_id):
     """Delete a forum post permanently with image cleanup"""
     try:
@@ -2570,11 +3165,16 @@ def admin_delete_forum_post(post_id):
         cursor.execute("DELETE FROM forum_replies WHERE post_id = %s", (post_id,))
         
         # Then delete the post itself
+        before = site_counters.lock_row(cursor, 'forum_posts', post_id)
         cursor.execute("DELETE FROM forum_posts WHERE id = %s", (post_id,))
+        site_counters.row_deleted(cursor, 'forum_posts', before)
+        # Content-addressed images are only unlinked once no other post or resource uses them
+        released = blob_store.release(cursor, 'forum_posts', post_id)
         
         connection.commit()
         cursor.close()
         connection.close()
+        release_image_blobs(released)
         
         # Prepare response message
         message = 'Question deleted successfully'
@@ -2665,6 +3265,7 @@ def admin_forum_post_detail(post_id):
 
 @app.route('/admin/forum/delete-comment/<int:comment_id>', methods=['DELETE'])
 @admin_required
+@invalidates_pages('forum')
 def admin_delete_comment(comment_id):
     """Delete a forum comment"""
     try:
@@ -2720,128 +3321,85 @@ def admin_statistics():
         connection = get_db_connection()
         cursor = connection.cursor(pymysql.cursors.DictCursor)
         
-        # Basic counts
-        cursor.execute("SELECT COUNT(*) as count FROM users")
-        total_users = cursor.fetchone()['count']
+        # Everything below reads the rollup tables maintained by stats_rollup;
+        # until its background thread has run once the page shows zeros
+        totals = stats_rollup.read_snapshot(cursor, 'totals') or {}
         
-        cursor.execute("SELECT COUNT(*) as count FROM forum_posts")
-        total_posts = cursor.fetchone()['count']
+        total_users = totals.get('users', 0)
+        total_posts = totals.get('posts', 0)
+        total_comments = totals.get('comments', 0)
+        total_feedback = totals.get('feedback', 0)
         
-        cursor.execute("SELECT COUNT(*) as count FROM forum_replies")
-        total_comments = cursor.fetchone()['count']
+        top_users = stats_rollup.read_snapshot(cursor, 'top_users') or []
+        category_stats = stats_rollup.read_snapshot(cursor, 'category_stats') or []
         
-        cursor.execute("SELECT COUNT(*) as count FROM user_feedback")
-        total_feedback = cursor.fetchone()['count']
-        
-        # User registration statistics (last 30 days)
-        cursor.execute("""
-            SELECT DATE(created_at) as date, COUNT(*) as count
-            FROM users 
-            WHERE created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
-            GROUP BY DATE(created_at)
-            ORDER BY date DESC
-        """)
-        user_registrations = cursor.fetchall()
+        today = get_beijing_now().date()
         
-        # Forum activity statistics (last 30 days)
+        # User registration and forum activity statistics (last 30 days)
         cursor.execute("""
-            SELECT DATE(created_at) as date, COUNT(*) as count
-            FROM forum_posts 
-            WHERE created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
-            GROUP BY DATE(created_at)
-            ORDER BY date DESC
-        """)
-        forum_activity = cursor.fetchall()
-        
-        # Top active users (by posts and comments)
-        cursor.execute("""
-            SELECT u.username, u.user_role,
-                   COUNT(DISTINCT fp.id) as post_count,
-                   COUNT(DISTINCT fr.id) as comment_count,
-                   (COUNT(DISTINCT fp.id) + COUNT(DISTINCT fr.id)) as total_activity
-            FROM users u
-            LEFT JOIN forum_posts fp ON u.id = fp.user_id
-            LEFT JOIN forum_replies fr ON u.id = fr.user_id
-            WHERE u.user_role != 'admin'
-            GROUP BY u.id, u.username, u.user_role
-            HAVING total_activity > 0
-            ORDER BY total_activity DESC
-            LIMIT 10
-        """)
-        top_users = cursor.fetchall()
-        
-        # Category statistics
-        cursor.execute("""
-            SELECT category, COUNT(*) as count
-            FROM forum_posts
-            WHERE approval_status = 'approved'
-            GROUP BY category
-            ORDER BY count DESC
-        """)
-        category_stats = cursor.fetchall()
+            SELECT bucket as date, metric, value as count
+            FROM stats_rollup_daily
+            WHERE metric IN ('registrations', 'posts') AND dimension = ''
+              AND bucket >= %s AND value > 0
+            ORDER BY bucket DESC
+        """, (today - timedelta(days=30),))
+        daily_rows = cursor.fetchall()
+        user_registrations = [row for row in daily_rows if row['metric'] == 'registrations']
+        forum_activity = [row for row in daily_rows if row['metric'] == 'posts']
         
         # Monthly statistics for the last 12 months
         cursor.execute("""
             SELECT 
-                DATE_FORMAT(created_at, '%Y-%m') as month,
-                COUNT(DISTINCT CASE WHEN table_name = 'users' THEN id END) as new_users,
-                COUNT(DISTINCT CASE WHEN table_name = 'posts' THEN id END) as new_posts,
-                COUNT(DISTINCT CASE WHEN table_name = 'comments' THEN id END) as new_comments
-            FROM (
-                SELECT id, created_at, 'users' as table_name FROM users WHERE created_at >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-                UNION ALL
-                SELECT id, created_at, 'posts' as table_name FROM forum_posts WHERE created_at >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-                UNION ALL
-                SELECT id, created_at, 'comments' as table_name FROM forum_replies WHERE created_at >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-            ) combined
+                DATE_FORMAT(bucket, '%%Y-%%m') as month,
+                SUM(CASE WHEN metric = 'registrations' THEN value ELSE 0 END) as new_users,
+                SUM(CASE WHEN metric = 'posts' THEN value ELSE 0 END) as new_posts,
+                SUM(CASE WHEN metric = 'comments' THEN value ELSE 0 END) as new_comments
+            FROM stats_rollup_daily
+            WHERE metric IN ('registrations', 'posts', 'comments') AND dimension = ''
+              AND bucket >= %s
             GROUP BY month
             ORDER BY month DESC
             LIMIT 12
-        """)
+        """, (today.replace(day=1) - timedelta(days=365),))
         monthly_stats = cursor.fetchall()
         
-        # User activity logs statistics (if available)
+        # User activity logs statistics (last 7 days)
         cursor.execute("""
-            SELECT activity_type, COUNT(*) as count
-            FROM user_activity_logs
-            WHERE created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-            GROUP BY activity_type
+            SELECT dimension as activity_type, SUM(value) as count
+            FROM stats_rollup_daily
+            WHERE metric = 'activity' AND dimension != '' AND bucket >= %s
+            GROUP BY dimension
             ORDER BY count DESC
-        """)
+        """, (today - timedelta(days=7),))
         activity_stats = cursor.fetchall()
         
-        # Real page view statistics from page_views table
+        # Page view statistics
         cursor.execute("""
-            SELECT COUNT(*) as total_views,
-                   COUNT(DISTINCT COALESCE(user_id, ip_address)) as unique_visitors,
-                   COUNT(DISTINCT page_type) as page_types
-            FROM page_views
-        """)
-        views_result = cursor.fetchone()
-        total_views = views_result['total_views'] if views_result['total_views'] else 0
-        unique_visitors = views_result['unique_visitors'] if views_result['unique_visitors'] else 0
-        
-        # Get views by page type
-        cursor.execute("""
-            SELECT page_type,
-                   COUNT(*) as views,
-                   COUNT(DISTINCT COALESCE(user_id, ip_address)) as unique_viewers
-            FROM page_views
-            GROUP BY page_type
+            SELECT dimension as page_type, SUM(value) as views
+            FROM stats_rollup_daily
+            WHERE metric = 'views'
+            GROUP BY dimension
             ORDER BY views DESC
         """)
-        page_type_views = cursor.fetchall()
+        view_rows = cursor.fetchall()
+        total_views = sum(int(row['views']) for row in view_rows if row['page_type'] == '')
+        page_type_views = [row for row in view_rows if row['page_type'] != '']
+        
+        # Unique visitors come from HyperLogLog sketches (~1.6% error)
+        unique_visitors = stats_rollup.unique_visitors(cursor)
+        unique_last_30_days = stats_rollup.unique_visitors(cursor, today - timedelta(days=29), today)
+        today_unique = stats_rollup.unique_visitors(cursor, today, today)
+        unique_by_type = stats_rollup.unique_visitors_by_dimension(cursor)
+        for row in page_type_views:
+            row['unique_viewers'] = unique_by_type.get(row['page_type'], 0)
         
         # Get today's statistics
         cursor.execute("""
-            SELECT COUNT(*) as today_views,
-                   COUNT(DISTINCT COALESCE(user_id, ip_address)) as today_unique_visitors
-            FROM page_views
-            WHERE DATE(created_at) = CURDATE()
-        """)
-        today_stats = cursor.fetchone()
-        today_views = today_stats['today_views'] if today_stats['today_views'] else 0
-        today_unique = today_stats['today_unique_visitors'] if today_stats['today_unique_visitors'] else 0
+            SELECT value FROM stats_rollup_daily
+            WHERE bucket = %s AND metric = 'views' AND dimension = ''
+        """, (today,))
+        today_row = cursor.fetchone()
+        today_views = today_row['value'] if today_row else 0
         
         stats = {
             'totals': {
@@ -2851,6 +3409,7 @@ def admin_statistics():
                 'feedback': total_feedback,
                 'views': total_views,
                 'unique_visitors': unique_visitors,
+                'unique_last_30_days': unique_last_30_days,
                 'today_views': today_views,
                 'today_unique': today_unique
             },
@@ -3005,13 +3564,15 @@ def admin_change_user_role(user_id):
         
         # Update user role
         cursor.execute("""
-            UPDATE users SET user_role = %s WHERE id = %s
-        """, (new_role, user_id))
+            UPDATE users SET user_role = %s, updated_at = %s WHERE id = %s
+        """, (new_role, get_beijing_now(), user_id))
         
         connection.commit()
         cursor.close()
         connection.close()
         
+        mark_user_changed(user_id)
+        
         return jsonify({'success': True, 'message': f'Role changed to {new_role} for user {username}'})
         
     except Exception as e:
@@ -3041,14 +3602,18 @@ def admin_change_user_status(user_id):
         username = user_data[0]
         
         # Update user status
+        before = site_counters.lock_row(cursor, 'users', user_id)
         cursor.execute("""
-            UPDATE users SET registration_status = %s WHERE id = %s
-        """, (new_status, user_id))
+            UPDATE users SET registration_status = %s, updated_at = %s WHERE id = %s
+        """, (new_status, get_beijing_now(), user_id))
+        site_counters.row_updated(cursor, 'users', before, registration_status=new_status)
         
         connection.commit()
         cursor.close()
         connection.close()
         
+        mark_user_changed(user_id)
+        
         return jsonify({'success': True, 'message': f'Status changed to {new_status} for user {username}'})
         
     except Exception as e:
@@ -3268,7 +3833,7 @@ def category_resources(category_name):
             ORDER BY fp.view_count DESC, fp.created_at DESC
         """, (category_name,))
         
-        resources = cursor.fetchall()
+        resources = with_pending_views(cursor.fetchall(), 'forum_posts')
         cursor.close()
         connection.close()
         
@@ -3338,7 +3903,7 @@ def education_resources(education_type):
             ORDER BY fp.view_count DESC, fp.created_at DESC
         """, (education_level,))
         
-        resources = cursor.fetchall()
+        resources = with_pending_views(cursor.fetchall(), 'forum_posts')
         cursor.close()
         connection.close()
         
@@ -3393,7 +3958,7 @@ def competition_resources(competition_type):
             ORDER BY r.view_count DESC, r.created_at DESC
         """, (education_level.upper(),))
         
-        resources = cursor.fetchall()
+        resources = with_pending_views(cursor.fetchall(), 'resources')
         cursor.close()
         connection.close()
         
@@ -3425,31 +3990,29 @@ def university_resources():
         connection = get_db_connection()
         cursor = connection.cursor(pymysql.cursors.DictCursor)
         
-        # Query from resources table using category
-        cursor.execute("""
+        # Query one page from resources table using category
+        page = fetch_listing_page(cursor, """
             SELECT r.id, r.title, r.description, r.category, 
                    r.status, r.view_count, u.username as author_name, 
                    r.created_at, r.updated_at, r.cover_image, r.resource_type
             FROM resources r
             JOIN users u ON r.user_id = u.id
             WHERE r.status = 'active' AND r.category = 'UNIVERSITY_RESOURCES'
-            ORDER BY r.view_count DESC, r.created_at DESC
-        """)
+        """, (), 'popular', 'r', 'resources')
+        resources = page.rows
         
-        resources = cursor.fetchall()
+        # level_counts covers every page
+        cursor.execute("""
+            SELECT COUNT(*) as count FROM resources
+            WHERE status = 'active' AND category = 'UNIVERSITY_RESOURCES'
+        """)
+        level_counts = {'UNIVERSITY_RESOURCES': cursor.fetchone()['count']}
         cursor.close()
         connection.close()
         
-        # Calculate level_counts for template
-        level_counts = {}
-        for resource in resources:
-            level = resource.get('category', 'Other')
-            if level not in level_counts:
-                level_counts[level] = 0
-            level_counts[level] += 1
-        
         return render_template('subjects_category.html', 
                              resources=resources,
+                             page=page,
                              level_counts=level_counts,
                              page_title='University Resources',
                              category='UNIVERSITY_RESOURCES',
@@ -3496,7 +4059,7 @@ def all_university_resources():
         """
         
         cursor.execute(query, params)
-        resources = cursor.fetchall()
+        resources = with_pending_views(cursor.fetchall(), 'forum_posts')
         cursor.close()
         connection.close()
         
@@ -3533,38 +4096,25 @@ def forum():
         connection = get_db_connection()
         cursor = connection.cursor(pymysql.cursors.DictCursor)
         
-        # Get forum posts with author information and attachment counts (only approved posts)
-        cursor.execute("""
+        # Get one page of forum posts with author information (only approved posts)
+        page = fetch_listing_page(cursor, """
             SELECT fp.id, fp.title, fp.content, fp.category, fp.view_count, fp.reply_count,
-                   fp.created_at, u.username as author_name, u.user_role, fp.cover_image, fp.topic,
-                   COUNT(fa.id) as attachment_count
+                   fp.created_at, u.username as author_name, u.user_role, fp.cover_image, fp.topic
             FROM forum_posts fp
             JOIN users u ON fp.user_id = u.id
-            LEFT JOIN forum_attachments fa ON fp.id = fa.post_id
             WHERE fp.status = 'active' AND fp.approval_status = 'approved'
-            GROUP BY fp.id
-            ORDER BY fp.created_at DESC
-            LIMIT 50
-        """)
-        
-        posts = cursor.fetchall()
+        """, (), 'recent', 'fp', 'forum_posts', limit=FORUM_PAGE_SIZE)
+        posts = page.rows
         
-        # For posts without cover images, get their attachment information
+        # Attachment counts and previews for the whole page in one query;
+        # previews are only shown for posts without a cover image
+        load_attachment_previews(cursor, posts)
         for post in posts:
-            if not post.get('cover_image') and post.get('attachment_count', 0) > 0:
-                cursor.execute("""
-                    SELECT name, size FROM forum_attachments 
-                    WHERE post_id = %s 
-                    ORDER BY created_at ASC
-                    LIMIT 5
-                """, (post['id'],))
-                post['attachments'] = cursor.fetchall()
-            else:
+            if post.get('cover_image'):
                 post['attachments'] = []
         
         # Get forum statistics (only approved posts)
-        cursor.execute("SELECT COUNT(*) as total FROM forum_posts WHERE status = 'active' AND approval_status = 'approved'")
-        total_posts = cursor.fetchone()['total']
+        total_posts = site_counters.get(cursor, 'posts.visible')['posts.visible']
         
         cursor.execute("SELECT COUNT(DISTINCT user_id) as count FROM forum_posts WHERE status = 'active' AND approval_status = 'approved'")
         active_members = cursor.fetchone()['count']
@@ -3579,18 +4129,13 @@ def forum():
         # Get posts from today
         cursor.execute("""
             SELECT COUNT(*) as count FROM forum_posts 
-            WHERE status = 'active' AND approval_status = 'approved' AND DATE(created_at) = CURDATE()
+            WHERE status = 'active' AND approval_status = 'approved' 
+                  AND created_at >= CURDATE() AND created_at < CURDATE() + INTERVAL 1 DAY
         """)
         today = cursor.fetchone()['count']
         
         # Get category statistics
-        cursor.execute("""
-            SELECT category, COUNT(*) as count 
-            FROM forum_posts 
-            WHERE status = 'active' AND approval_status = 'approved'
-            GROUP BY category
-        """)
-        category_stats_raw = cursor.fetchall()
+        category_counts = site_counters.with_prefix(cursor, 'posts.visible.category.')
         
         # Create category statistics dictionary
         category_stats = {
@@ -3601,9 +4146,9 @@ def forum():
             'questions': 0
         }
         
-        for stat in category_stats_raw:
-            if stat['category'] in category_stats:
-                category_stats[stat['category']] = stat['count']
+        for category, count in category_counts.items():
+            if category in category_stats:
+                category_stats[category] = count
         
         stats = {
             'total_posts': total_posts,
@@ -3616,7 +4161,7 @@ def forum():
         cursor.close()
         connection.close()
         
-        return render_template('forum.html', posts=posts, stats=stats)
+        return render_template('forum.html', posts=posts, page=page, stats=stats)
         
     except Exception as e:
         print(f"Error loading forum: {e}")
@@ -3668,6 +4213,7 @@ def forum_post_detail(post_id):
         if not post_data:
             flash('Post not found or has been removed.', 'error')
             return redirect(url_for('forum'))
+        with_pending_views([post_data], 'forum_posts')
         
         # Get attachments for this post
         cursor.execute("""
@@ -3696,6 +4242,12 @@ def forum_post_detail(post_id):
             }
         }
         
+        # Comments are paginated so very long threads stay bounded
+        cursor.execute("SELECT COUNT(*) as total FROM forum_replies WHERE post_id = %s", (post_id,))
+        comment_total = cursor.fetchone()['total']
+        comment_pages = max(1, -(-comment_total // COMMENTS_PER_PAGE))
+        comment_page = min(max(request.args.get('comments_page', 1, type=int), 1), comment_pages)
+        
         # Get comments/replies for this post, ordered by like_count DESC, then created_at ASC
         cursor.execute("""
             SELECT fr.id, fr.content, fr.created_at, fr.like_count,
@@ -3703,28 +4255,31 @@ def forum_post_detail(post_id):
             FROM forum_replies fr
             JOIN users u ON fr.user_id = u.id
             WHERE fr.post_id = %s
-            ORDER BY fr.like_count DESC, fr.created_at ASC
-        """, (post_id,))
+            ORDER BY fr.like_count DESC, fr.created_at ASC, fr.id ASC
+            LIMIT %s OFFSET %s
+        """, (post_id, COMMENTS_PER_PAGE, (comment_page - 1) * COMMENTS_PER_PAGE))
         
         comments_data = cursor.fetchall()
-        comments = []
         
+        # Which of these comments the current user has liked, in one query
+        liked_ids = set()
+        if current_user.is_authenticated and comments_data:
+            reply_ids = [comment_data['id'] for comment_data in comments_data]
+            placeholders = ', '.join(['%s'] * len(reply_ids))
+            cursor.execute(f"""
+                SELECT reply_id FROM comment_likes 
+                WHERE user_id = %s AND reply_id IN ({placeholders})
+            """, (current_user.id, *reply_ids))
+            liked_ids = {row['reply_id'] for row in cursor.fetchall()}
+        
+        comments = []
         for comment_data in comments_data:
-            # Check if current user has liked this comment (only for authenticated users)
-            user_liked = False
-            if current_user.is_authenticated:
-                cursor.execute("""
-                    SELECT id FROM comment_likes 
-                    WHERE user_id = %s AND reply_id = %s
-                """, (current_user.id, comment_data['id']))
-                user_liked = cursor.fetchone() is not None
-            
             comments.append({
                 'id': comment_data['id'],
                 'content': comment_data['content'],
                 'created_at': comment_data['created_at'],
                 'like_count': comment_data['like_count'] or 0,
-                'user_liked': user_liked,
+                'user_liked': comment_data['id'] in liked_ids,
                 'author': {
                     'username': comment_data['author_name'],
                     'user_role': comment_data['user_role'],
@@ -3733,10 +4288,12 @@ def forum_post_detail(post_id):
             })
         
         post['comments'] = comments
+        post['comment_total'] = comment_total
+        post['comment_page'] = comment_page
+        post['comment_pages'] = comment_pages
         
-        # Increment view count
-        cursor.execute("UPDATE forum_posts SET view_count = view_count + 1 WHERE id = %s", (post_id,))
-        connection.commit()
+        # Increment view count (coalesced and flushed in the background)
+        view_counter.increment('forum_posts', post_id)
         
         cursor.close()
         connection.close()
@@ -3749,8 +4306,7 @@ def forum_post_detail(post_id):
         return redirect(url_for('forum'))
 
 @app.route('/forum/create-post', methods=['POST'])
-
-
+@invalidates_pages('forum')
 def create_forum_post():
     """Create a new forum post with topic and attachments support"""
     try:
@@ -3806,6 +4362,9 @@ def create_forum_post():
         """, (user_id, title, content, category, topic, cover_image_path, get_beijing_now()))
         
         post_id = cursor.lastrowid
+        site_counters.row_inserted(cursor, 'forum_posts', status='active', approval_status='approved',
+                                   category=category)
+        blob_store.link(cursor, 'forum_posts', post_id, [cover_image_path])
         
         # Handle attachments
         attachment_files = request.files.getlist('attachments')
@@ -3834,6 +4393,35 @@ def create_forum_post():
         flash('Error creating question. Please try again.', 'error')
         return redirect(url_for('forum_new_post'))
 
+def send_with_validators(path, etag=None, last_modified=None, **kwargs):
+    """send_file with a strong ETag and Last-Modified, answering revalidation with 304 before the file is opened
+    
+    Args:
+        path (str): File to send
+        etag (str): Validator to use instead of the file's size and mtime, which
+            change whenever the file is replaced
+        last_modified (float): Timestamp to use instead of the file's mtime
+        **kwargs: Passed to send_file (mimetype, as_attachment, download_name, ...)
+    
+    Raises:
+        NotFound: The file does not exist (the stat doubles as the existence check)
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise NotFound()
+    etag = etag or f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    modified = datetime.fromtimestamp(int(last_modified or st.st_mtime), pytz.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.last_modified = modified
+        return response
+    return send_file(path, etag=etag, last_modified=modified, **kwargs)
+
+# Files whose URL stays the same when they are replaced: browsers revalidate every use
+REVALIDATED_FILE_ENDPOINTS = ('uploaded_file', 'download_attachment')
+
 @app.route('/download/<int:attachment_id>')
 def download_attachment(attachment_id):
     """Download forum attachment by ID"""
@@ -3871,7 +4459,7 @@ def download_attachment(attachment_id):
             flash('File not found on server', 'error')
             return redirect(url_for('forum'))
         
-        return send_file(file_path, as_attachment=True, download_name=attachment['name'])
+        return send_with_validators(file_path, as_attachment=True, download_name=attachment['name'])
         
     except Exception as e:
         print(f"Error downloading attachment: {e}")
@@ -3882,11 +4470,13 @@ def download_attachment(attachment_id):
 def uploaded_file(filename):
     """Serve uploaded files"""
     uploads_dir = os.path.join(os.getcwd(), 'static', 'uploads')
-    return send_from_directory(uploads_dir, filename)
+    path = safe_join(uploads_dir, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    return send_with_validators(path)
 
 @app.route('/forum/post/<int:post_id>/comment', methods=['POST'])
-
-
+@invalidates_pages('forum')
 def add_comment(post_id):
     """Add a new comment to a forum post"""
     try:
@@ -3936,8 +4526,7 @@ def add_comment(post_id):
         return redirect(url_for('forum_post_detail', post_id=post_id))
 
 @app.route('/forum/comment/<int:comment_id>/like', methods=['POST'])
-
-
+@invalidates_pages('forum')
 def toggle_comment_like(comment_id):
     """Toggle like for a comment"""
     try:
@@ -4000,55 +4589,87 @@ def toggle_comment_like(comment_id):
 
 @app.route('/image/<path:filename>')
 def serve_image(filename):
-    """Serve images from the /image directory with fallback for old paths"""
+    """Serve images from the /image directory with fallback for old paths
+    
+    Paths are resolved through image_index instead of probing the legacy
+    aliases on disk: a repeated miss touches nothing, and a hit costs the one
+    stat send_with_validators needs for its validators (which also answers
+    revalidations with a 304) before the file is opened. A file deleted by
+    another worker shows up as NotFound from that stat and leaves the index.
+    
+    ?w=<width>[&fmt=webp|jpeg|png] returns a resized copy from the variant cache
+    (widths in IMAGE_VARIANT_WIDTHS only).
+    """
     try:
-        # 减少调试日志，提高性能
-        # print(f"🖼️ 图片请求: {filename}")
-        
-        # 首先尝试直接访问（新格式）
-        primary_path = f"/image/{filename}"
-        
-        if os.path.exists(primary_path):
-            # 直接发送文件，添加缓存头
-            response = send_from_directory('/image', filename)
-            # 设置强缓存，避免重复请求
-            response.headers['Cache-Control'] = 'public, max-age=2592000, immutable'  # 30天
-            response.headers['ETag'] = f'"{filename}"'
-            return response
+        variant = requested_image_variant(filename)
+        if variant is False:
+            return "Unsupported image size or format", 400
         
-        # 如果文件不存在，尝试旧格式的回退路径
-        # 对于旧数据，路径可能缺少 forum_images/ 前缀
-        if not filename.startswith('forum_images/') and not filename.startswith('resources/'):
-            # 尝试添加 forum_images/ 前缀（论坛图片）
-            fallback_filename = f"forum_images/{filename}"
-            fallback_path = f"/image/{fallback_filename}"
-            
-            if os.path.exists(fallback_path):
-                response = send_from_directory('/image', fallback_filename)
-                response.headers['Cache-Control'] = 'public, max-age=2592000, immutable'
-                response.headers['ETag'] = f'"{fallback_filename}"'
-                return response
-        
-        # 对于resources路径，也尝试旧格式回退
-        if filename.startswith('resources/') and '/' in filename[10:]:  # resources/xxx 但不是 resources/2025/08/xxx
-            # 检查是否是新格式路径但文件不存在，尝试旧格式
-            old_filename_part = filename.split('/')[-1]  # 获取最后的文件名部分
-            old_format_path = f"/image/resources/{old_filename_part}"
-            
-            if os.path.exists(old_format_path):
-                response = send_from_directory('/image', f"resources/{old_filename_part}")
-                response.headers['Cache-Control'] = 'public, max-age=2592000, immutable'
-                response.headers['ETag'] = f'"resources/{old_filename_part}"'
-                return response
+        # Dot paths are the variant cache and temporary files, never images
+        if any(part.startswith('.') for part in filename.split('/')):
+            return "Image not found", 404
         
-        # 所有路径都不存在，快速返回404
-        print(f"❌ 图片文件不存在: {filename}")
-        return "Image not found", 404
+        # 新格式路径，或旧数据缺少 forum_images/ 前缀、resources/ 缺少日期目录的回退路径
+        resolved = image_index.resolve(filename)
+        if resolved is None:
+            return "Image not found", 404
+        try:
+            return send_image(resolved, variant)
+        except NotFound:
+            # Deleted by another worker since it was indexed
+            image_index.discard(resolved)
+            return "Image not found", 404
         
     except Exception as e:
         print(f"❌ 图片服务错误: {e}")
         return "Image service error", 404
 
+def requested_image_variant(filename):
+    """(width, format) asked for in the query string, None for the original, False if not allowed"""
+    if 'w' not in request.args and 'fmt' not in request.args:
+        return None
+    if not IMAGE_VARIANTS_ENABLED:
+        return None
+    width = request.args.get('w', type=int)
+    fmt = request.args.get('fmt') or IMAGE_VARIANT_DEFAULT_FORMATS.get(os.path.splitext(filename)[1].lower(), 'jpeg')
+    if width is None or not image_variants.allowed(width, fmt):
+        return False
+    return width, fmt
+
+def send_image(filename, variant=None):
+    """Response for a file under /image, or for its resized copy when variant is (width, format)"""
+    source = safe_join('/image', filename)
+    if source is None:
+        raise NotFound()
+    if variant is not None:
+        width, fmt = variant
+        try:
+            path = image_variants.get(source, width, fmt)
+        except FileNotFoundError:
+            raise NotFound()
+        except (OSError, Image.DecompressionBombError) as e:
+            # Not an image Pillow can read: the original is the best we have
+            print(f"❌ 图片缩放失败: {filename} ({e})")
+            path = None
+        # None also means an animated source, which is sent whole
+        if path is not None:
+            # The cached copy's mtime moves with LRU touches; its name (a hash of
+            # the source's size/mtime and the variant) and the source's mtime do not
+            try:
+                source_mtime = os.stat(source).st_mtime
+            except FileNotFoundError:
+                raise NotFound()
+            response = send_with_validators(path, etag=os.path.splitext(os.path.basename(path))[0],
+                                            last_modified=source_mtime,
+                                            mimetype=image_variants.mimetype(fmt))
+            response.headers['Cache-Control'] = 'public, max-age=2592000, immutable'
+            return response
+    # A blob's name is the SHA-256 of its content, a validator that survives copies and restores
+    response = send_with_validators(source, etag=blob_store.digest(filename))
+    # 设置强缓存，避免重复请求
+    response.headers['Cache-Control'] = 'public, max-age=2592000, immutable'  # 30天
+    return response
+
 @app.route('/test-image-speed/<path:filename>')
 def test_image_speed(filename):
     """测试图片加载速度的简化版本"""
@@ -4170,16 +4791,20 @@ def admin_api_approve_user(user_id):
         cursor = connection.cursor()
         
         # Update user registration status to approved
+        before = site_counters.lock_row(cursor, 'users', user_id)
         cursor.execute("""
             UPDATE users 
             SET registration_status = 'approved', updated_at = %s 
             WHERE id = %s
-        """, (datetime.now(), user_id))
+        """, (get_beijing_now(), user_id))
+        site_counters.row_updated(cursor, 'users', before, registration_status='approved')
         
         connection.commit()
         cursor.close()
         connection.close()
         
+        mark_user_changed(user_id)
+        
         return jsonify({'success': True, 'message': 'User approved successfully. User may need to re-login to access full features.'})
         
     except Exception as e:
@@ -4195,16 +4820,20 @@ def admin_api_reject_user(user_id):
         cursor = connection.cursor()
         
         # Update user registration status to rejected
+        before = site_counters.lock_row(cursor, 'users', user_id)
         cursor.execute("""
             UPDATE users 
             SET registration_status = 'rejected', updated_at = %s 
             WHERE id = %s
-        """, (datetime.now(), user_id))
+        """, (get_beijing_now(), user_id))
+        site_counters.row_updated(cursor, 'users', before, registration_status='rejected')
         
         connection.commit()
         cursor.close()
         connection.close()
         
+        mark_user_changed(user_id)
+        
         return jsonify({'success': True, 'message': 'User rejected successfully'})
         
     except Exception as e:
@@ -4213,6 +4842,7 @@ def admin_api_reject_user(user_id):
 
 @app.route('/admin/api/approve_resource/<int:resource_id>', methods=['POST'])
 @admin_required
+@invalidates_pages('resources')
 def admin_api_approve_resource(resource_id):
     """API endpoint to approve a resource from dashboard"""
     try:
@@ -4220,11 +4850,13 @@ def admin_api_approve_resource(resource_id):
         cursor = connection.cursor()
         
         # Update resource status to active
+        before = site_counters.lock_row(cursor, 'resources', resource_id)
         cursor.execute("""
             UPDATE resources 
             SET status = 'active', updated_at = %s 
             WHERE id = %s
         """, (datetime.now(), resource_id))
+        site_counters.row_updated(cursor, 'resources', before, status='active')
         
         connection.commit()
         cursor.close()
@@ -4238,6 +4870,7 @@ def admin_api_approve_resource(resource_id):
 
 @app.route('/admin/api/reject_resource/<int:resource_id>', methods=['POST'])
 @admin_required
+@invalidates_pages('resources')
 def admin_api_reject_resource(resource_id):
     """API endpoint to reject a resource from dashboard"""
     try:
@@ -4258,11 +4891,15 @@ def admin_api_reject_resource(resource_id):
             print(f"Resource {resource_id} image cleanup results: {cleanup_results}")
         
         # Delete the resource
+        before = site_counters.lock_row(cursor, 'resources', resource_id)
         cursor.execute("DELETE FROM resources WHERE id = %s", (resource_id,))
+        site_counters.row_deleted(cursor, 'resources', before)
+        released = blob_store.release(cursor, 'resources', resource_id)
         
         connection.commit()
         cursor.close()
         connection.close()
+        release_image_blobs(released)
         
         return jsonify({'success': True, 'message': 'Resource rejected and deleted successfully'})
         
@@ -4270,6 +4907,12 @@ def admin_api_reject_resource(resource_id):
         print(f"Error rejecting resource: {e}")
         return jsonify({'success': False, 'error': 'Database error'}), 500
 
+@app.route('/admin/api/compression_stats')
+@admin_required
+def admin_api_compression_stats():
+    """Response compression counters for this worker process"""
+    return jsonify({'success': True, 'enabled': COMPRESSION_ENABLED, 'stats': compression.stats()})
+
 @app.route('/submit-resource')
 def submit_resource_page():
     """Show the resource submission form"""
@@ -4278,6 +4921,7 @@ def submit_resource_page():
     return render_template('submit_resource.html')
 
 @app.route('/submit-resource', methods=['POST'])
+@invalidates_pages('resources')
 def submit_resource():
     """Handle user resource submission"""
     try:
@@ -4387,6 +5031,8 @@ def submit_resource():
         ))
         
         resource_id = cursor.lastrowid
+        site_counters.row_inserted(cursor, 'resources', status='active')
+        blob_store.link(cursor, 'resources', resource_id, [cover_image_path])
         
         # Handle additional images (optional)
         additional_images = request.files.getlist('additional_images')
@@ -4395,6 +5041,7 @@ def submit_resource():
             if additional_image and additional_image.filename and image_count < 3:
                 image_result = save_forum_image(additional_image, f'resource_additional_{image_count}')
                 if image_result['success']:
+                    blob_store.link(cursor, 'resources', resource_id, [image_result['path']])
                     # Insert additional image info into resource_images table (if it exists)
                     try:
                         cursor.execute("""
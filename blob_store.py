@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Blob Store
+Content-addressed image storage: identical uploads share one file, deleted when nothing refers to it
+
+使用方法:
+1. 删除没有任何帖子或资源引用的图片文件: python blob_store.py --gc
+2. 查看存储与去重统计: python blob_store.py --status
+"""
+
+import argparse
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import time
+
+import pymysql
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS image_blobs (
+        sha256 CHAR(64) NOT NULL PRIMARY KEY,
+        path VARCHAR(255) NOT NULL,
+        bytes BIGINT NOT NULL DEFAULT 0,
+        ref_count INT NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS image_blob_refs (
+        owner_table VARCHAR(32) NOT NULL,
+        owner_id INT NOT NULL,
+        sha256 CHAR(64) NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (owner_table, owner_id, sha256),
+        INDEX idx_image_blob_refs_sha (sha256)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+]
+
+# Pre-store upload paths that share a blob's content (hard links made by migration 0006);
+# they are unlinked together with the blob so deleting a migrated row frees its disk
+LEGACY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS image_blob_legacy (
+        path VARCHAR(255) NOT NULL PRIMARY KEY,
+        sha256 CHAR(64) NOT NULL,
+        INDEX idx_image_blob_legacy_sha (sha256)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+BLOB_DIR = 'blobs'
+BLOB_PATH = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.[a-z0-9]+$')
+# Tables whose rows show images: table -> columns holding one path or a comma-separated list
+IMAGE_COLUMNS = {
+    'forum_posts': ('cover_image',),
+    'resources': ('cover_image', 'additional_images'),
+}
+# A blob written or uploaded again this recently is never unlinked, so an upload
+# racing the delete of the last post using the same picture keeps its file
+UNLINK_GRACE = 3600
+CHUNK_SIZE = 64 * 1024
+
+
+def split_paths(value):
+    """Image paths in a cover_image / additional_images column value"""
+    return [path.strip() for path in (value or '').split(',') if path.strip()]
+
+
+class BlobStore:
+    """Stores each distinct image once, as blobs/<h[:2]>/<h[2:4]>/<sha256><ext> under root
+
+    save() hashes an upload while writing it to a temporary file, then either
+    renames it into place or, when a blob with that hash already exists,
+    throws it away. The returned path goes into forum_posts / resources as
+    before. Write paths record which rows use which blobs in their own
+    transaction:
+
+        blob_store.link(cursor, 'forum_posts', post_id, [cover_image_path])
+        ...
+        released = blob_store.release(cursor, 'resources', resource_id)
+        connection.commit()
+        blob_store.unlink(released)
+
+    image_blobs.ref_count counts the rows using a blob; release() returns the
+    blobs whose count reached zero, plus the old upload paths recorded for
+    them in image_blob_legacy, to be unlinked once the delete commits.
+    Blobs saved by a request that then failed have no references; gc()
+    removes them, and the legacy paths of blobs no longer in use.
+
+    Args:
+        root: Directory the stored image paths are relative to
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @property
+    def enabled(self):
+        """False in local development, where uploads stay under static/uploads"""
+        return os.path.isdir(self.root)
+
+    @staticmethod
+    def digest(path):
+        """SHA-256 of a blob path, or None for other paths"""
+        match = BLOB_PATH.match(path or '')
+        return match.group(1) if match else None
+
+    @staticmethod
+    def blob_path(sha256, ext):
+        return f"{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()}"
+
+    # -- files ---------------------------------------------------------------
+
+    def save(self, file, ext):
+        """Store an uploaded file; returns (path, bytes, True if an identical blob already existed)"""
+        tmp_dir = os.path.join(self.root, BLOB_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, prefix='.tmp-')
+        try:
+            file.seek(0)
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            path = self.blob_path(sha.hexdigest(), ext)
+            return (path, size, self._place(tmp_path, path))
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def adopt(self, full_path, ext=None):
+        """Blob path for an existing file, hard-linked (or copied) into the store"""
+        sha = hashlib.sha256()
+        with open(full_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+        path = self.blob_path(sha.hexdigest(), ext or os.path.splitext(full_path)[1])
+        target = os.path.join(self.root, path)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.tmp-{os.getpid()}"
+            try:
+                os.link(full_path, tmp_path)
+            except OSError:
+                shutil.copy2(full_path, tmp_path)
+            os.replace(tmp_path, target)
+        return path
+
+    def _place(self, tmp_path, path):
+        target = os.path.join(self.root, path)
+        if os.path.exists(target):
+            # Same content already stored; refresh its mtime to hold off unlink()
+            os.utime(target)
+            return True
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+        return False
+
+    def unlink(self, paths):
+        """Delete released blob files; returns the paths removed"""
+        removed = []
+        now = time.time()
+        for path in paths:
+            full_path = os.path.join(self.root, path)
+            try:
+                if now - os.stat(full_path).st_mtime < UNLINK_GRACE:
+                    continue  # left for gc()
+                os.remove(full_path)
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error deleting image blob {path}: {e}")
+        return removed
+
+    # -- references ----------------------------------------------------------
+
+    def link(self, cursor, table, owner_id, paths):
+        """Record that a row uses these images, within the caller's transaction"""
+        digests = sorted({(self.digest(path), path) for path in paths if self.digest(path)})
+        # Sorted so concurrent writers lock image_blobs rows in the same order
+        for sha, path in digests:
+            cursor.execute("""
+                INSERT IGNORE INTO image_blob_refs (owner_table, owner_id, sha256) VALUES (%s, %s, %s)
+            """, (table, owner_id, sha))
+            if cursor.rowcount != 1:
+                continue  # already linked
+            try:
+                size = os.path.getsize(os.path.join(self.root, path))
+            except OSError:
+                size = 0
+            cursor.execute("""
+                INSERT INTO image_blobs (sha256, path, bytes, ref_count) VALUES (%s, %s, %s, 1)
+                ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+            """, (sha, path, size))
+
+    def release(self, cursor, table, owner_id):
+        """Drop a row's references within the caller's transaction; returns blob paths no longer used"""
+        dict_cursor = cursor.connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            dict_cursor.execute("""
+                SELECT sha256 FROM image_blob_refs WHERE owner_table = %s AND owner_id = %s
+                ORDER BY sha256 FOR UPDATE
+            """, (table, owner_id))
+            digests = [row['sha256'] for row in dict_cursor.fetchall()]
+            if not digests:
+                return []
+            placeholders = ', '.join(['%s'] * len(digests))
+            dict_cursor.execute("DELETE FROM image_blob_refs WHERE owner_table = %s AND owner_id = %s",
+                                (table, owner_id))
+            dict_cursor.execute(f"UPDATE image_blobs SET ref_count = ref_count - 1 WHERE sha256 IN ({placeholders})",
+                                digests)
+            dict_cursor.execute(f"SELECT sha256, path FROM image_blobs WHERE sha256 IN ({placeholders}) AND ref_count <= 0",
+                                digests)
+            unused = dict_cursor.fetchall()
+            if not unused:
+                return []
+            unused_digests = [row['sha256'] for row in unused]
+            placeholders = ', '.join(['%s'] * len(unused))
+            dict_cursor.execute(f"DELETE FROM image_blobs WHERE sha256 IN ({placeholders})", unused_digests)
+            # The legacy rows stay until gc() sees their files gone (unlink() may skip a recent file)
+            dict_cursor.execute(f"SELECT path FROM image_blob_legacy WHERE sha256 IN ({placeholders})",
+                                unused_digests)
+            return [row['path'] for row in unused] + [row['path'] for row in dict_cursor.fetchall()]
+        finally:
+            dict_cursor.close()
+
+    def gc(self, cursor):
+        """Remove blob files no row refers to (failed uploads, unlinks skipped by the grace period)"""
+        cursor.execute("SELECT sha256 FROM image_blobs WHERE ref_count > 0")
+        used = {row['sha256'] for row in cursor.fetchall()}
+        removed = []
+        now = time.time()
+        for root, dirs, names in os.walk(os.path.join(self.root, BLOB_DIR)):
+            for name in names:
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                sha = self.digest(path)
+                if sha is None and not name.startswith('.tmp-'):
+                    sha = self.digest(derivative_source(path))  # sized copies go with their blob
+                if sha in used:
+                    continue
+                try:
+                    if now - os.stat(full_path).st_mtime >= UNLINK_GRACE:
+                        os.remove(full_path)
+                        removed.append(path)
+                except OSError:
+                    pass
+
+        cursor.execute("""
+            SELECT l.path FROM image_blob_legacy l
+            LEFT JOIN image_blobs b ON b.sha256 = l.sha256 AND b.ref_count > 0
+            WHERE b.sha256 IS NULL
+        """)
+        gone = []
+        for row in cursor.fetchall():
+            full_path = os.path.join(self.root, row['path'])
+            try:
+                if now - os.stat(full_path).st_mtime < UNLINK_GRACE:
+                    continue
+                os.remove(full_path)
+                removed.append(row['path'])
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            gone.append(row['path'])
+        if gone:
+            cursor.execute(f"DELETE FROM image_blob_legacy WHERE path IN ({', '.join(['%s'] * len(gone))})", gone)
+        return removed
+
+    def record_legacy(self, cursor):
+        """Record the files outside blobs/ that hold a stored blob's content; returns how many
+
+        Hard links are matched by inode; copies (made when linking failed) by
+        size and hash.
+        """
+        blob_root = os.path.join(self.root, BLOB_DIR)
+        inodes = {}
+        for root, dirs, names in os.walk(blob_root):
+            for name in names:
+                sha = self.digest(os.path.relpath(os.path.join(root, name), self.root).replace(os.sep, '/'))
+                if sha:
+                    stat = os.stat(os.path.join(root, name))
+                    inodes[(stat.st_dev, stat.st_ino)] = sha
+        cursor.execute("SELECT sha256, bytes FROM image_blobs")
+        blobs = cursor.fetchall()
+        stored = {row['sha256'] for row in blobs}
+        sizes = {row['bytes'] for row in blobs}
+
+        rows = []
+        for root, dirs, names in os.walk(self.root):
+            # Skip the store itself and hidden caches (.variants)
+            dirs[:] = [d for d in dirs if not d.startswith('.')
+                       and os.path.join(root, d) != blob_root]
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                full_path = os.path.join(root, name)
+                stat = os.stat(full_path)
+                sha = inodes.get((stat.st_dev, stat.st_ino))
+                if sha is None and stat.st_size in sizes:
+                    digest = hashlib.sha256()
+                    with open(full_path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            digest.update(chunk)
+                    sha = digest.hexdigest() if digest.hexdigest() in stored else None
+                if sha:
+                    rows.append((os.path.relpath(full_path, self.root).replace(os.sep, '/'), sha))
+        if rows:
+            cursor.executemany("INSERT IGNORE INTO image_blob_legacy (path, sha256) VALUES (%s, %s)", rows)
+        return len(rows)
+
+
+def derivative_source(path):
+    """'blobs/ab/cd/<sha>.card.webp' -> 'blobs/ab/cd/<sha>.x' (enough for digest())"""
+    directory, name = posixpath.split(path)
+    return posixpath.join(directory, name.split('.', 1)[0] + '.x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the content-addressed image store')
+    parser.add_argument('--gc', action='store_true', help='delete blob files no post or resource refers to')
+    parser.add_argument('--status', action='store_true', help='print blob and reference counts')
+    args = parser.parse_args()
+
+    from app import blob_store, get_db_connection
+
+    connection = get_db_connection()
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    if args.gc:
+        removed = blob_store.gc(cursor)
+        connection.commit()
+        print(f"✅ Removed {len(removed)} unreferenced blob files")
+    elif args.status:
+        cursor.execute("""
+            SELECT COUNT(*) as blobs, COALESCE(SUM(bytes), 0) as bytes,
+                   COALESCE(SUM(ref_count), 0) as refs, COALESCE(SUM(bytes * (ref_count - 1)), 0) as saved
+            FROM image_blobs WHERE ref_count > 0
+        """)
+        row = cursor.fetchone()
+        print(f"  {row['blobs']} blobs, {row['bytes']} bytes, {row['refs']} references, "
+              f"{row['saved']} bytes saved by deduplication")
+    else:
+        parser.print_help()
+    cursor.close()
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
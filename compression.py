@@ -0,0 +1,244 @@
+"""
+Compression
+WSGI middleware that gzip/brotli-compresses text responses on the fly, including streamed ones
+"""
+
+import threading
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+DEFAULT_MIMETYPES = ('text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript',
+                     'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+
+def accepted(accept_encoding, encoding):
+    """True if the Accept-Encoding header allows `encoding` (q > 0)"""
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() not in (encoding, '*'):
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class GzipStream:
+    def __init__(self, level):
+        # wbits=31: zlib stream with a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush):
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data, flush):
+        out = self._compressor.process(data)
+        return out + self._compressor.flush() if flush else out
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compresses eligible responses with the best encoding the client accepts
+
+    A response is left alone when it is a HEAD, has no body status, already
+    has a Content-Encoding (e.g. precompressed static files), advertises byte
+    ranges (send_file responses), says Cache-Control: no-transform, is not one
+    of `mimetypes`, or is smaller than min_size. Responses without a
+    Content-Length are buffered only until min_size bytes arrive; after that
+    every chunk the app yields is compressed and flushed straight away, so
+    streamed pages still reach the browser progressively.
+
+    The decision is made when the app calls start_response, so a response
+    that passes through gets its app_iter back untouched and the server can
+    still send a wsgi.file_wrapper with sendfile.
+
+    Args:
+        app: The WSGI application to wrap
+        mimetypes: Content types worth compressing
+        min_size: Smallest body, in bytes, that is compressed
+        level: zlib level for gzip (1-9)
+        brotli_quality: Brotli quality (0-11); low values suit per-request work
+    """
+
+    def __init__(self, app, mimetypes=DEFAULT_MIMETYPES, min_size=1024, level=6, brotli_quality=4):
+        self.app = app
+        self.mimetypes = tuple(mimetypes)
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self._lock = threading.Lock()
+        self._stats = {'compressed': 0, 'skipped': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0}
+
+    def stats(self):
+        """Counters for compressed responses, bytes saved and CPU time spent compressing"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+        stats['cpu_seconds'] = round(stats['cpu_seconds'], 3)
+        return stats
+
+    def __call__(self, environ, start_response):
+        encoding = self._choose_encoding(environ)
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        captured = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            if exc_info is not None and captured:
+                # Error after the headers were sent: let the server deal with it
+                return start_response(status, headers, exc_info)
+            length = self._eligible_length(status, headers)
+            captured.update(status=status, headers=headers, exc_info=exc_info, length=length)
+            if length is False:
+                return start_response(status, headers, exc_info)
+            return written.append
+
+        app_iter = self.app(environ, capture)
+        if captured.get('length') is False:
+            self._count(skipped=1)
+            return app_iter
+        return self._respond(app_iter, captured, written, encoding, start_response)
+
+    def _respond(self, app_iter, captured, written, encoding, start_response):
+        try:
+            chunks = iter(app_iter)
+            if 'status' not in captured:
+                # Generator apps call start_response on their first iteration
+                first = next(chunks, b'')
+                if captured['length'] is False:
+                    # capture() already passed the headers on
+                    self._count(skipped=1)
+                    yield first
+                    yield from chunks
+                    return
+                buffered = list(written) + [first]
+            else:
+                buffered = list(written)
+            status, headers, length = captured['status'], captured['headers'], captured['length']
+
+            streamed = length is None
+            size = sum(len(chunk) for chunk in buffered)
+            if streamed:
+                # Read ahead just far enough to know the body is worth compressing
+                for chunk in chunks:
+                    buffered.append(chunk)
+                    size += len(chunk)
+                    if size >= self.min_size:
+                        break
+                else:
+                    self._count(skipped=1)
+                    body = b''.join(buffered)
+                    start_response(status, self._with_length(headers, len(body)), captured['exc_info'])
+                    yield body
+                    return
+
+            start_response(status, self._compressed_headers(headers, encoding), captured['exc_info'])
+            stream = BrotliStream(self.brotli_quality) if encoding == 'br' else GzipStream(self.level)
+            bytes_in = bytes_out = 0
+            cpu = 0.0
+            try:
+                for chunk in self._chain(buffered, chunks):
+                    if not chunk:
+                        continue
+                    started = time.thread_time()
+                    out = stream.compress(chunk, flush=streamed)
+                    cpu += time.thread_time() - started
+                    bytes_in += len(chunk)
+                    bytes_out += len(out)
+                    if out:
+                        yield out
+                started = time.thread_time()
+                out = stream.finish()
+                cpu += time.thread_time() - started
+                bytes_out += len(out)
+                yield out
+            finally:
+                self._count(compressed=1, bytes_in=bytes_in, bytes_out=bytes_out, cpu_seconds=cpu)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    @staticmethod
+    def _chain(first, rest):
+        yield from first
+        yield from rest
+
+    def _choose_encoding(self, environ):
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        accept_encoding = environ.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and accepted(accept_encoding, 'br'):
+            return 'br'
+        if accepted(accept_encoding, 'gzip'):
+            return 'gzip'
+        return None
+
+    def _eligible_length(self, status, headers):
+        """False if the response must pass through, else its Content-Length (None if streamed)"""
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        values = {name.lower(): value for name, value in headers}
+        if ('content-encoding' in values or 'content-range' in values
+                or values.get('accept-ranges', 'none') != 'none'
+                or 'no-transform' in values.get('cache-control', '')):
+            return False
+        mimetype = values.get('content-type', '').split(';', 1)[0].strip().lower()
+        if mimetype not in self.mimetypes:
+            return False
+        if 'content-length' not in values:
+            return None
+        length = int(values['content-length'])
+        return length if length >= self.min_size else False
+
+    @staticmethod
+    def _with_length(headers, length):
+        return [(n, v) for n, v in headers if n.lower() != 'content-length'] + [('Content-Length', str(length))]
+
+    @staticmethod
+    def _compressed_headers(headers, encoding):
+        result = []
+        vary = []
+        for name, value in headers:
+            lower = name.lower()
+            if lower == 'content-length':
+                continue
+            if lower == 'vary':
+                vary.extend(v.strip() for v in value.split(',') if v.strip())
+                continue
+            if lower == 'etag' and not value.startswith('W/'):
+                # The compressed bytes differ from the identity representation
+                value = 'W/' + value
+            result.append((name, value))
+        if 'accept-encoding' not in (v.lower() for v in vary):
+            vary.append('Accept-Encoding')
+        result.append(('Vary', ', '.join(dict.fromkeys(vary))))
+        result.append(('Content-Encoding', encoding))
+        return result
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
@@ -0,0 +1,227 @@
+"""
+Database Connection Pool
+Thread-safe pool of PyMySQL connections with health-checked checkout and idle recycling
+"""
+
+import threading
+import time
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class PooledConnection:
+    """Thin wrapper around a pooled PyMySQL connection
+
+    Everything is delegated to the real connection except close(), which hands
+    the connection back to the pool instead of tearing down the socket. For
+    request-scoped handles close() is a no-op; the connection is returned once
+    at request teardown so every query in the request shares it.
+    """
+
+    def __init__(self, pool, connection, scoped=False):
+        self._pool = pool
+        self._connection = connection
+        self._scoped = scoped
+        self._released = False
+
+    @property
+    def raw(self):
+        return self._connection
+
+    @property
+    def open(self):
+        return not self._released and self._connection.open
+
+    def close(self):
+        """Return the connection to the pool (no-op for request-scoped handles)"""
+        if self._scoped:
+            return
+        self.release()
+
+    def release(self):
+        """Roll back any unfinished transaction and give the connection back"""
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._connection)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Bounded connection pool
+
+    Args:
+        factory: Callable returning a new DB-API connection (or raising)
+        min_size: Idle connections kept even after they pass max_idle
+        max_size: Upper bound on connections open at the same time
+        max_idle: Seconds an idle connection may sit before being recycled
+        max_lifetime: Seconds after which a connection is always recycled
+        ping_after: Idle seconds after which checkout pings before handing out
+        checkout_timeout: Seconds to wait for a free slot when the pool is full
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, max_idle=300,
+                 max_lifetime=3600, ping_after=5, checkout_timeout=5):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.factory = factory
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.checkout_timeout = checkout_timeout
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []      # [(connection, created_at, last_used_at)], most recent last
+        self._created = {}   # id(connection) -> created_at for checked-out connections
+        self._size = 0
+
+        self.stats = {'created': 0, 'reused': 0, 'recycled': 0, 'failed_checks': 0}
+
+    def acquire(self):
+        """Check out a healthy connection, creating one if the pool has room"""
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            stale = []
+            with self._available:
+                stale.extend(self._prune_idle_locked())
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhausted(f'No database connection available (max_size={self.max_size})')
+                    self._available.wait(remaining)
+                    stale.extend(self._prune_idle_locked())
+
+                if self._idle:
+                    connection, created_at, last_used = self._idle.pop()
+                else:
+                    connection = None
+                    self._size += 1
+
+            for old in stale:
+                self._close_quietly(old)
+
+            if connection is None:
+                try:
+                    connection = self.factory()
+                except Exception:
+                    self._discard_slot()
+                    raise
+                created_at = time.monotonic()
+                with self._lock:
+                    self.stats['created'] += 1
+                    self._created[id(connection)] = created_at
+                return connection
+
+            if time.monotonic() - last_used >= self.ping_after and not self._is_healthy(connection):
+                with self._lock:
+                    self.stats['failed_checks'] += 1
+                self._close_quietly(connection)
+                self._discard_slot()
+                continue
+
+            with self._lock:
+                self.stats['reused'] += 1
+                self._created[id(connection)] = created_at
+            return connection
+
+    def release(self, connection):
+        """Return a connection; broken or expired connections are closed instead"""
+        with self._lock:
+            created_at = self._created.pop(id(connection), time.monotonic())
+
+        healthy = getattr(connection, 'open', True)
+        if healthy:
+            try:
+                connection.rollback()
+            except Exception:
+                healthy = False
+
+        expired = time.monotonic() - created_at >= self.max_lifetime
+        if not healthy or expired:
+            self._close_quietly(connection)
+            with self._available:
+                self._size -= 1
+                if expired:
+                    self.stats['recycled'] += 1
+                self._available.notify()
+            return
+
+        with self._available:
+            self._idle.append((connection, created_at, time.monotonic()))
+            self._available.notify()
+
+    def connection(self, scoped=False):
+        """Acquire a connection wrapped so that close() returns it to the pool"""
+        return PooledConnection(self, self.acquire(), scoped=scoped)
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on release)"""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._available.notify_all()
+        for connection, _, _ in idle:
+            self._close_quietly(connection)
+
+    def status(self):
+        """Snapshot of pool occupancy for debugging and admin pages"""
+        with self._lock:
+            return dict(self.stats, size=self._size, idle=len(self._idle),
+                        in_use=self._size - len(self._idle), max_size=self.max_size)
+
+    def _prune_idle_locked(self):
+        """Drop connections idle past max_idle, keeping at least min_size warm
+
+        Returns the dropped connections so the caller can close them outside the lock.
+        """
+        now = time.monotonic()
+        keep = []
+        expired = []
+        # Oldest entries first so the freshest connections are the ones kept
+        for entry in self._idle:
+            connection, created_at, last_used = entry
+            too_old = now - created_at >= self.max_lifetime
+            too_idle = now - last_used >= self.max_idle
+            if too_old or (too_idle and len(self._idle) - len(expired) > self.min_size):
+                expired.append(connection)
+            else:
+                keep.append(entry)
+        if expired:
+            self._idle = keep
+            self._size -= len(expired)
+            self.stats['recycled'] += len(expired)
+            self._available.notify(len(expired))
+        return expired
+
+    def _discard_slot(self):
+        with self._available:
+            self._size -= 1
+            self._available.notify()
+
+    @staticmethod
+    def _is_healthy(connection):
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Image Derivatives
+Sized WebP/JPEG copies of uploaded images, generated by a background worker pool
+
+使用方法:
+1. 为已有的帖子和资源图片补生成缩略图: python image_derivatives.py --backfill
+2. 查看已生成的缩略图数量: python image_derivatives.py --status
+"""
+
+import argparse
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymysql
+from PIL import Image, ImageOps
+
+from image_variants import flatten
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS image_derivatives (
+        source_path VARCHAR(255) NOT NULL,
+        variant VARCHAR(16) NOT NULL,
+        format VARCHAR(8) NOT NULL,
+        path VARCHAR(255) NOT NULL,
+        width INT NOT NULL,
+        height INT NOT NULL,
+        bytes INT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (source_path, variant, format),
+        INDEX idx_image_derivatives_created (created_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# variant -> box (width, height) the derivative must cover; display CSS crops with object-fit: cover
+VARIANTS = {
+    'cover': (800, 600),
+    'card': (480, 360),
+    'thumb': (160, 120),
+}
+# format -> (file extension, Pillow save options)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+SOURCE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+def derivative_name(source, variant, fmt):
+    """'uploads/a/photo.png' -> 'uploads/a/photo.card.webp'"""
+    root, _ = posixpath.splitext(source)
+    return f"{root}.{variant}.{FORMATS[fmt][0]}"
+
+
+def covering_size(size, box):
+    """Smallest size with the source's aspect ratio that still covers box (never upscales)"""
+    width, height = size
+    scale = min(1.0, max(box[0] / width, box[1] / height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class ImageDerivatives:
+    """Generates and looks up the sized copies of images under image_root
+
+    Uploads are saved as-is and handed to enqueue(); a small thread pool then
+    writes every variant in every format next to the original, as
+    <name>.<variant>.<ext>, and records it in the image_derivatives table.
+    Paths are relative to image_root (the part of the URL after /image/).
+
+    resolve() answers from an in-memory map of the table, so templates never
+    query the database. Each process loads the map when its refresh thread
+    starts and then reads only rows created since the newest one it has, so
+    derivatives made by other workers show up within refresh_interval seconds.
+    Rows deleted by other workers cannot be seen that way, so every
+    reload_interval seconds the whole table is read again and replaces the
+    map. Until a derivative exists resolve() returns None and the page shows
+    the original.
+
+    Args:
+        get_connection: Callable returning a DB connection whose close() releases it
+        image_root: Directory the stored image paths are relative to
+        workers: Size of the resize thread pool
+        refresh_interval: Seconds between reloads of rows written by other processes
+        reload_interval: Seconds between full reloads that drop rows deleted by other processes
+    """
+
+    def __init__(self, get_connection, image_root='/image', workers=2, refresh_interval=60, reload_interval=600):
+        self.get_connection = get_connection
+        self.image_root = image_root
+        self.workers = workers
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+        self._known = {}          # source -> {(variant, format): derivative path}
+        self._watermark = None    # newest created_at loaded
+        self._reloaded_at = None  # monotonic time of the last full reload
+        self._pending = set()
+        self._executor = None
+        self._executor_pid = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {'generated': 0, 'failed': 0, 'skipped': 0}
+
+    # -- lookups -------------------------------------------------------------
+
+    def resolve(self, source, variant, fmt):
+        """Path of a ready derivative, or None"""
+        with self._lock:
+            return self._known.get(source, {}).get((variant, fmt))
+
+    # -- generation ----------------------------------------------------------
+
+    def enqueue(self, source):
+        """Queue generation of every derivative of source; returns immediately"""
+        if not source or not source.lower().endswith(SOURCE_SUFFIXES):
+            return
+        with self._lock:
+            if source in self._pending:
+                return
+            self._pending.add(source)
+        self._submit(self._generate_logged, source)
+
+    def generate(self, source):
+        """Write and record every derivative of source now; returns the number written"""
+        full_path = os.path.join(self.image_root, source)
+        rows = []
+        with Image.open(full_path) as img:
+            if getattr(img, 'is_animated', False):
+                # A still frame would replace the animation
+                self.stats['skipped'] += 1
+                return 0
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA', 'L'):
+                # Palette and CMYK images would resize with nearest-neighbour or not at all
+                img = img.convert('RGBA')
+            for variant, box in VARIANTS.items():
+                resized = img.resize(covering_size(img.size, box), Image.Resampling.LANCZOS)
+                for fmt, (ext, options) in FORMATS.items():
+                    target = derivative_name(source, variant, fmt)
+                    size = self._save(self._for_format(resized, fmt), target, options)
+                    rows.append((source, variant, fmt, target, resized.width, resized.height, size))
+        self._record(rows)
+        self.stats['generated'] += len(rows)
+        return len(rows)
+
+    def remove(self, source):
+        """Queue deletion of the derivative files and rows of a deleted image"""
+        if not source:
+            return
+        with self._lock:
+            self._known.pop(source, None)
+        # The pool uses its own connection, so the caller's transaction is left alone
+        self._submit(self._remove, source)
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                # A pool inherited across fork has no threads behind it
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='image-derivatives')
+                self._executor_pid = os.getpid()
+            executor = self._executor
+        executor.submit(fn, *args)
+
+    def _remove(self, source):
+        for variant in VARIANTS:
+            for fmt in FORMATS:
+                try:
+                    os.remove(os.path.join(self.image_root, derivative_name(source, variant, fmt)))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Error deleting image derivative of {source}: {e}")
+        connection = self.get_connection()
+        if connection is None:
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("DELETE FROM image_derivatives WHERE source_path = %s", (source,))
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            print(f"Error deleting image derivative rows of {source}: {e}")
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _generate_logged(self, source):
+        try:
+            self.generate(source)
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Error generating image derivatives for {source}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(source)
+
+    @staticmethod
+    def _for_format(img, fmt):
+        if fmt == 'jpeg':
+            return flatten(img)
+        return img if img.mode in ('RGB', 'RGBA') else img.convert('RGBA')
+
+    def _save(self, img, target, options):
+        """Atomic write next to the source; returns the file size"""
+        path = os.path.join(self.image_root, target)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            img.save(tmp_path, **options)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return os.path.getsize(path)
+
+    def _record(self, rows):
+        connection = self.get_connection()
+        if connection is not None:
+            cursor = connection.cursor()
+            try:
+                cursor.executemany("""
+                    INSERT INTO image_derivatives (source_path, variant, format, path, width, height, bytes)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE path = VALUES(path), width = VALUES(width), height = VALUES(height),
+                        bytes = VALUES(bytes), created_at = CURRENT_TIMESTAMP
+                """, rows)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+                connection.close()
+        # Usable in this process straight away; other processes see it on refresh
+        with self._lock:
+            for source, variant, fmt, target, *_ in rows:
+                self._known.setdefault(source, {})[(variant, fmt)] = target
+
+    # -- refresh -------------------------------------------------------------
+
+    def refresh(self, full=False):
+        """Load rows newer than the newest one already loaded, or the whole table when due; returns how many"""
+        full = (full or self._watermark is None
+                or time.monotonic() - self._reloaded_at >= self.reload_interval)
+        connection = self.get_connection()
+        if connection is None:
+            return 0
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            if full:
+                cursor.execute("SELECT source_path, variant, format, path, created_at FROM image_derivatives")
+            else:
+                # >= because created_at has one-second resolution; reloading a row is harmless
+                cursor.execute("""
+                    SELECT source_path, variant, format, path, created_at FROM image_derivatives
+                    WHERE created_at >= %s
+                """, (self._watermark,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        with self._lock:
+            if full:
+                # Rows recorded here during the query are newer than the watermark and come back next time
+                self._known = {}
+                self._watermark = None
+                self._reloaded_at = time.monotonic()
+            for row in rows:
+                self._known.setdefault(row['source_path'], {})[(row['variant'], row['format'])] = row['path']
+                if self._watermark is None or row['created_at'] > self._watermark:
+                    self._watermark = row['created_at']
+        return len(rows)
+
+    def ensure_started(self):
+        """Start the background refresh thread in this process"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run_forever, name='image-derivatives', daemon=True)
+            self._thread.start()
+
+    def _run_forever(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing image derivatives: {e}")
+            time.sleep(self.refresh_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate sized copies of uploaded images')
+    parser.add_argument('--backfill', action='store_true', help='generate derivatives for every post and resource image')
+    parser.add_argument('--status', action='store_true', help='print derivative counts per variant and format')
+    args = parser.parse_args()
+
+    from app import image_derivatives, get_db_connection
+    from blob_store import IMAGE_COLUMNS, split_paths
+    from image_index import image_filename
+
+    connection = get_db_connection()
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    if args.status:
+        cursor.execute("""
+            SELECT variant, format, COUNT(*) as count, SUM(bytes) as bytes
+            FROM image_derivatives GROUP BY variant, format ORDER BY variant, format
+        """)
+        for row in cursor.fetchall():
+            print(f"  {row['variant']:<8} {row['format']:<6} {row['count']:>8} files {row['bytes']:>14} bytes")
+    elif args.backfill:
+        image_derivatives.refresh()
+        sources = set()
+        for table, columns in IMAGE_COLUMNS.items():
+            cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            for row in cursor.fetchall():
+                for column in columns:
+                    sources.update(filter(None, map(image_filename, split_paths(row[column]))))
+        done = failed = 0
+        for source in sorted(sources):
+            if image_derivatives.resolve(source, 'thumb', 'jpeg'):
+                continue
+            try:
+                image_derivatives.generate(source)
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"  ❌ {source}: {e}")
+        print(f"✅ Generated derivatives for {done} images ({failed} failed, {len(sources)} referenced)")
+    else:
+        parser.print_help()
+    cursor.close()
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Image Index
+In-memory manifest of the files under /image, resolving requested paths (and legacy aliases) without disk probes
+"""
+
+import os
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def image_filename(image_path):
+    """Path of a stored image relative to the /image directory (None for external URLs)"""
+    if not image_path or image_path.startswith('http'):
+        return None
+
+    # Remove leading slash if present
+    if image_path.startswith('/'):
+        image_path = image_path[1:]
+
+    # Check if path starts with 'image/' (server format)
+    if image_path.startswith('image/'):
+        # Server environment - serve from /image/ directory
+        return image_path[len('image/'):]
+    elif image_path.startswith('uploads/'):
+        # Convert uploads/ to cloud format /image/
+        # uploads/forum_images/... -> /image/forum_images/...
+        return image_path[len('uploads/'):]
+    else:
+        # Content-addressed blobs/, resources/ and anything else live in the image directory
+        return image_path
+
+
+def candidates(filename):
+    """Stored paths a requested path may refer to, most specific first
+
+    Old posts saved forum images without the forum_images/ prefix, and old
+    resources saved covers directly under resources/ without the date folders.
+    """
+    yield filename
+    if not filename.startswith(('forum_images/', 'resources/', 'blobs/')):
+        yield f"forum_images/{filename}"
+    if filename.startswith('resources/') and '/' in filename[len('resources/'):]:
+        yield f"resources/{posixpath.basename(filename)}"
+
+
+class ImageIndex:
+    """Set of relative paths of every file under root, answering resolve() in memory
+
+    The set is filled by a background scan that walks the tree with scandir
+    on a thread pool, one directory per task, and kept current by add() and
+    discard() on the save and delete paths of this process. Files written by
+    other workers are not in it, so a miss probes the disk once; a found file
+    joins the index and a missing one is remembered for negative_ttl seconds,
+    so repeated requests for a missing image cost a dict lookup. Callers that
+    find an indexed file gone (deleted by another worker) discard() it.
+
+    Args:
+        root: Directory the requested paths are relative to
+        workers: Threads used by the startup scan
+        negative_ttl: Seconds a missing path is answered without probing again
+        max_negative: Most missing paths remembered
+    """
+
+    def __init__(self, root, workers=8, negative_ttl=60, max_negative=10000):
+        self.root = root
+        self.workers = workers
+        self.negative_ttl = negative_ttl
+        self.max_negative = max_negative
+        self._files = set()
+        self._missing = OrderedDict()   # requested path -> monotonic expiry
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.ready = False
+        self.stats = {'hits': 0, 'probes': 0, 'negative_hits': 0, 'misses': 0}
+
+    def resolve(self, filename):
+        """Relative path of the stored file for a requested path, or None"""
+        filename = posixpath.normpath(filename)
+        if filename.startswith(('../', '/')) or filename in ('.', '..'):
+            return None
+        paths = list(candidates(filename))
+        with self._lock:
+            for path in paths:
+                if path in self._files:
+                    self.stats['hits'] += 1
+                    return path
+            expires = self._missing.get(filename)
+            if expires is not None:
+                if expires > time.monotonic():
+                    self.stats['negative_hits'] += 1
+                    return None
+                del self._missing[filename]
+
+        self.stats['probes'] += 1
+        for path in paths:
+            if os.path.isfile(os.path.join(self.root, path)):
+                self.add(path)
+                return path
+        self.stats['misses'] += 1
+        with self._lock:
+            self._missing[filename] = time.monotonic() + self.negative_ttl
+            while len(self._missing) > self.max_negative:
+                self._missing.popitem(last=False)
+        return None
+
+    def add(self, path):
+        """Record a file just written under root"""
+        with self._lock:
+            self._files.add(path)
+            # Any remembered miss may have been this file (directly or through an alias)
+            self._missing.clear()
+
+    def discard(self, path):
+        """Forget a file that was deleted"""
+        with self._lock:
+            self._files.discard(path)
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, files=len(self._files), missing=len(self._missing), ready=self.ready)
+
+    def build(self):
+        """Scan root in parallel and merge every file found; returns the number of files"""
+        found = set()
+        if not os.path.isdir(self.root):
+            # Local development without an image volume
+            self.ready = True
+            return 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-index-scan') as pool:
+            pending = {pool.submit(self._scan_dir, '')}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    found.update(files)
+                    pending.update(pool.submit(self._scan_dir, subdir) for subdir in subdirs)
+        with self._lock:
+            # Union, so files added while the scan ran are kept
+            self._files |= found
+            self.ready = True
+        return len(found)
+
+    def _scan_dir(self, relative_dir):
+        files, subdirs = [], []
+        try:
+            with os.scandir(os.path.join(self.root, relative_dir)) as entries:
+                for entry in entries:
+                    # Dot entries are the variant cache and temporary files
+                    if entry.name.startswith('.') or '.tmp-' in entry.name:
+                        continue
+                    path = posixpath.join(relative_dir, entry.name) if relative_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(path)
+                    elif entry.is_file():
+                        files.append(path)
+        except OSError as e:
+            print(f"Error scanning image directory {relative_dir or '/'}: {e}")
+        return files, subdirs
+
+    def ensure_started(self):
+        """Start the initial scan in this process (resolve() probes the disk until it finishes)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._build_logged, name='image-index', daemon=True)
+            self._thread.start()
+
+    def _build_logged(self):
+        started = time.monotonic()
+        try:
+            count = self.build()
+            print(f"Image index ready: {count} files in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            print(f"Error building image index: {e}")
@@ -0,0 +1,220 @@
+"""
+Image Variants
+On-demand resized copies of stored images, kept in a size-bounded sharded disk cache
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from PIL import Image, ImageOps
+
+# Widths a client may ask for; anything else is rejected so the cache cannot be flooded
+ALLOWED_WIDTHS = (160, 320, 480, 640, 800, 1200, 1600)
+# format -> (file extension, mimetype, Pillow save options)
+VARIANT_FORMATS = {
+    'webp': ('webp', 'image/webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'image/jpeg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('png', 'image/png', {'format': 'PNG', 'optimize': True}),
+}
+# A hit refreshes the file's mtime (its LRU position) at most this often
+TOUCH_INTERVAL = 3600
+# Eviction removes the least recently used files until the cache is this fraction of max_bytes
+EVICT_TO = 0.9
+# Other workers write to the cache too, so the size estimate is refreshed by a scan this often
+RESCAN_INTERVAL = 600
+# Most animated source versions remembered (each would otherwise be decoded on every request)
+MAX_ANIMATED = 10000
+
+
+class VariantCache:
+    """Resizes images on first request and serves later requests from disk
+
+    A variant is stored as <cache_dir>/<k[:2]>/<k[2:4]>/<k>.<ext>, where k
+    hashes the source path, size and mtime together with the requested width
+    and format, so a replaced source gets new variants and the old ones age
+    out. File mtimes are the LRU order shared by every worker: hits refresh
+    them, and once the cache grows past max_bytes the oldest files are
+    removed. Concurrent misses for one variant in a process wait for a single
+    resize; writes are atomic, so two processes racing on a miss are harmless.
+    Animated sources get no variant (a resize would keep only the first
+    frame); get() returns None for them and the caller sends the original.
+
+    Args:
+        cache_dir: Directory holding the cached variants
+        max_bytes: Disk budget for the cache
+        widths: Allowed widths
+        formats: Allowed formats (keys of VARIANT_FORMATS)
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, widths=ALLOWED_WIDTHS, formats=tuple(VARIANT_FORMATS)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.widths = tuple(widths)
+        self.formats = tuple(formats)
+        self._bytes = None        # estimate; None until the first scan
+        self._scanned_at = 0
+        self._inflight = {}       # key -> Event set when its resize finishes
+        self._animated = set()    # source versions found to be animated
+        self._lock = threading.Lock()
+        self._evicting = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'collapsed': 0, 'evicted': 0, 'failed': 0, 'animated': 0}
+
+    def allowed(self, width, fmt):
+        return width in self.widths and fmt in self.formats
+
+    @staticmethod
+    def mimetype(fmt):
+        return VARIANT_FORMATS[fmt][1]
+
+    def get(self, source_path, width, fmt):
+        """Path of the cached variant of source_path, resizing it on a miss
+
+        Returns None when source_path is animated. Raises ValueError for sizes
+        or formats outside the allowlist and OSError when the source is
+        missing or cannot be decoded.
+        """
+        if not self.allowed(width, fmt):
+            raise ValueError(f"variant {width}/{fmt} is not allowed")
+        st = os.stat(source_path)
+        version = f"{source_path}\0{st.st_size}\0{st.st_mtime_ns}"
+        if version in self._animated:
+            return None
+        key = hashlib.sha256(f"{version}\0{width}\0{fmt}".encode('utf-8')).hexdigest()
+        path = os.path.join(self.cache_dir, key[:2], key[2:4], f"{key}.{VARIANT_FORMATS[fmt][0]}")
+
+        if self._hit(path):
+            return path
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            self.stats['collapsed'] += 1
+            event.wait()
+            if self._hit(path):
+                return path
+            if version in self._animated:
+                return None
+            # The leader failed; fall through and try once more ourselves
+        try:
+            self.stats['misses'] += 1
+            size = self._render(source_path, path, width, fmt)
+            if size is None:
+                # Recorded before waiters wake, so they do not open the source again
+                with self._lock:
+                    if len(self._animated) >= MAX_ANIMATED:
+                        self._animated.clear()
+                    self._animated.add(version)
+                self.stats['animated'] += 1
+                return None
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        finally:
+            if leader:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+        self._added(size)
+        return path
+
+    def status(self):
+        return dict(self.stats, bytes=self._bytes, max_bytes=self.max_bytes)
+
+    def _hit(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        if now - st.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        self.stats['hits'] += 1
+        return True
+
+    def _render(self, source_path, path, width, fmt):
+        ext, _, options = VARIANT_FORMATS[fmt]
+        with Image.open(source_path) as img:
+            if getattr(img, 'is_animated', False):
+                return None
+            # Let the JPEG decoder downscale by a power of two while decoding; a
+            # square box keeps enough pixels if EXIF orientation swaps the sides
+            img.draft('RGB', (width, width))
+            img = ImageOps.exif_transpose(img)
+            if fmt == 'jpeg':
+                img = flatten(img)
+            elif img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA')
+            if img.width > width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            try:
+                img.save(tmp_path, **options)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        return os.path.getsize(path)
+
+    def _added(self, size):
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += size
+            over = (self._bytes is None or self._bytes > self.max_bytes
+                    or time.monotonic() - self._scanned_at > RESCAN_INTERVAL)
+        if over and self._evicting.acquire(blocking=False):
+            # Only one thread scans; the others keep serving
+            try:
+                self.evict()
+            finally:
+                self._evicting.release()
+
+    def evict(self):
+        """Scan the cache and remove least recently used files until it fits; returns files removed"""
+        entries = []
+        total = 0
+        for root, dirs, names in os.walk(self.cache_dir):
+            for name in names:
+                if '.tmp-' in name:
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+                total += st.st_size
+        removed = 0
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TO
+            for mtime, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+        with self._lock:
+            self._bytes = total
+            self._scanned_at = time.monotonic()
+            self.stats['evicted'] += removed
+        return removed
+
+
+def flatten(img):
+    """RGB copy of img for JPEG, with transparency composited onto white"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return img if img.mode in ('RGB', 'L') else img.convert('RGB')
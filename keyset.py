@@ -0,0 +1,145 @@
+"""
+Keyset Pagination
+Cursor-based paging for listings sorted by popularity or recency
+"""
+
+import base64
+import json
+from datetime import datetime
+
+# ordering name -> ((column, descending), ...); id is always the last key so
+# the order is total. Key columns must be NOT NULL and selected by the query
+# (view_count is NOT NULL since migration 0008, which also gives category_popular
+# an index with the same mixed directions).
+ORDERINGS = {
+    'popular': (('view_count', True), ('created_at', True), ('id', True)),
+    'recent': (('created_at', True), ('id', True)),
+    'category_popular': (('category', False), ('view_count', True), ('created_at', True), ('id', True)),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of rows plus opaque cursors for the neighbouring pages"""
+
+    def __init__(self, rows, next_cursor=None, prev_cursor=None):
+        self.rows = rows
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def encode_cursor(ordering, row):
+    """Opaque token holding the sort key of a row"""
+    values = [_dump(row[column]) for column, _ in ORDERINGS[ordering]]
+    raw = json.dumps([ordering, values], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(ordering, token):
+    """Sort key values from a token; raises InvalidCursor for foreign or damaged tokens"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        name, values = json.loads(raw)
+        if name != ordering or len(values) != len(ORDERINGS[ordering]):
+            raise InvalidCursor(token)
+        return [_load(value) for value in values]
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor(token)
+
+
+def fetch_page(cursor, query, params, ordering, alias='', after=None, before=None, limit=24):
+    """Run `query` (a SELECT ending in a WHERE clause) for one page
+
+    The seek condition, ORDER BY and LIMIT are appended, so the database reads
+    only limit + 1 rows from the index no matter how deep the page is. `after`
+    and `before` are cursors from a previous page; an invalid cursor falls back
+    to the first page.
+    """
+    columns = ORDERINGS[ordering]
+    prefix = f'{alias}.' if alias else ''
+    params = list(params or [])
+
+    backwards = False
+    seek_values = None
+    try:
+        if before:
+            seek_values, backwards = decode_cursor(ordering, before), True
+        elif after:
+            seek_values = decode_cursor(ordering, after)
+    except InvalidCursor:
+        seek_values, backwards = None, False
+
+    sql = query
+    if seek_values is not None:
+        condition, seek_params = _seek_condition(columns, prefix, seek_values, backwards)
+        sql += f' AND {condition}'
+        params.extend(seek_params)
+    order = ', '.join(f"{prefix}{column} {'DESC' if descending != backwards else 'ASC'}"
+                      for column, descending in columns)
+    sql += f' ORDER BY {order} LIMIT %s'
+    params.append(limit + 1)
+
+    cursor.execute(sql, params)
+    rows = list(cursor.fetchall())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage(rows)
+    # Moving backwards we came from the next page; moving forwards, from the previous one
+    more_after = True if backwards else has_more
+    more_before = has_more if backwards else seek_values is not None
+    # Cursors are computed from the rows as read, before any display adjustments
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(ordering, rows[-1]) if more_after else None,
+        prev_cursor=encode_cursor(ordering, rows[0]) if more_before else None,
+    )
+
+
+def _seek_condition(columns, prefix, values, backwards):
+    """(a < x) OR (a = x AND b < y) OR ... with the operator flipped per direction"""
+    clauses = []
+    params = []
+    for i, (column, descending) in enumerate(columns):
+        parts = [f'{prefix}{previous} = %s' for previous, _ in columns[:i]]
+        operator = '<' if descending != backwards else '>'
+        parts.append(f'{prefix}{column} {operator} %s')
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return ['d', value.isoformat()]
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise TypeError(f'Unsupported keyset value: {value!r}')
+    return value
+
+
+def _load(value):
+    if isinstance(value, list) and len(value) == 2 and value[0] == 'd':
+        return datetime.fromisoformat(value[1])
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise InvalidCursor(value)
+    return value
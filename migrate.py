@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Schema Migration Runner
+Applies the versioned migrations in migrations/ and records them in schema_migrations
+
+使用方法:
+1. 查看状态: python migrate.py --status
+2. 预览待执行迁移的执行计划: python migrate.py --explain
+3. 执行所有待执行迁移: python migrate.py
+4. 执行到指定版本: python migrate.py --target 2
+5. 查看已执行迁移的 EXPLAIN 报告: python migrate.py --report 2
+
+执行前请先备份数据库!
+"""
+
+import argparse
+import hashlib
+import importlib
+import os
+import re
+import sys
+import time
+
+import pymysql
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+LOCK_NAME = 'schema_migrations'
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT NOT NULL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at DATETIME NOT NULL,
+        duration_ms INT NOT NULL DEFAULT 0,
+        explain_report MEDIUMTEXT
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+EXPLAIN_COLUMNS = ('table', 'type', 'key', 'rows', 'Extra')
+
+
+class Migration:
+    """One migrations/NNNN_name.py module"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, 'rb') as f:
+            self.checksum = hashlib.sha256(f.read()).hexdigest()
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            self._module = importlib.import_module(f'migrations.{os.path.basename(self.path)[:-3]}')
+        return self._module
+
+    @property
+    def explain_queries(self):
+        return getattr(self.module, 'EXPLAIN', [])
+
+    def __str__(self):
+        return f'{self.version:04d}_{self.name}'
+
+
+def discover_migrations():
+    """All migration modules sorted by version"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2),
+                                        os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError('Duplicate migration version numbers in migrations/')
+    return migrations
+
+
+def applied_migrations(cursor):
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row['version']: row for row in cursor.fetchall()}
+
+
+def explain_plans(cursor, queries):
+    """EXPLAIN each (label, sql, params) query; failures are reported, not raised"""
+    plans = []
+    for label, sql, params in queries:
+        try:
+            cursor.execute('EXPLAIN ' + sql.strip(), params)
+            plans.append((label, cursor.fetchall()))
+        except pymysql.Error as e:
+            plans.append((label, str(e)))
+    return plans
+
+
+def format_plan(plan):
+    if isinstance(plan, str):
+        return [f'      error: {plan}']
+    lines = []
+    for row in plan:
+        parts = [f"{column}={row.get(column)}" for column in EXPLAIN_COLUMNS]
+        lines.append('      ' + '  '.join(parts))
+    return lines
+
+
+def format_report(migration, before, after):
+    """Plans of each EXPLAIN query before (and after) a migration"""
+    lines = [f'EXPLAIN report for {migration}']
+    after_by_label = dict(after) if after is not None else {}
+    for label, plan in before:
+        lines.append(f'  {label}')
+        lines.append('    before:')
+        lines.extend(format_plan(plan))
+        if after is not None:
+            lines.append('    after:')
+            lines.extend(format_plan(after_by_label.get(label, 'not captured')))
+    return '\n'.join(lines)
+
+
+def apply_migration(connection, cursor, migration):
+    queries = migration.explain_queries
+    before = explain_plans(cursor, queries)
+
+    print(f"\n==> Applying {migration}")
+    started = time.monotonic()
+    try:
+        migration.module.up(cursor)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    duration_ms = int((time.monotonic() - started) * 1000)
+
+    after = explain_plans(cursor, queries)
+    report = format_report(migration, before, after) if queries else None
+    if report:
+        print(report)
+
+    cursor.execute("""
+        INSERT INTO schema_migrations (version, name, checksum, applied_at, duration_ms, explain_report)
+        VALUES (%s, %s, %s, NOW(), %s, %s)
+    """, (migration.version, migration.name, migration.checksum, duration_ms, report))
+    connection.commit()
+    print(f"    done in {duration_ms} ms")
+
+
+def migrate(connection, target=None, explain_only=False):
+    """Apply pending migrations up to target (inclusive); returns the number applied"""
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(SCHEMA)
+        # DDL auto-commits in MySQL, so serialize runners rather than relying on transactions
+        cursor.execute("SELECT GET_LOCK(%s, 30) as acquired", (LOCK_NAME,))
+        if not cursor.fetchone()['acquired']:
+            print("ERROR: Another migration run holds the lock")
+            return 0
+        try:
+            applied = applied_migrations(cursor)
+            pending = [m for m in discover_migrations()
+                       if m.version not in applied and (target is None or m.version <= target)]
+            if not pending:
+                print("Schema is up to date")
+                return 0
+
+            if explain_only:
+                for migration in pending:
+                    print(f"\n{migration} (pending)")
+                    print(format_report(migration, explain_plans(cursor, migration.explain_queries), None))
+                return 0
+
+            for migration in pending:
+                apply_migration(connection, cursor, migration)
+            return len(pending)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    finally:
+        cursor.close()
+
+
+def print_status(connection):
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(SCHEMA)
+        applied = applied_migrations(cursor)
+    finally:
+        cursor.close()
+    for migration in discover_migrations():
+        row = applied.get(migration.version)
+        if row is None:
+            print(f"  [pending]  {migration}")
+            continue
+        note = '' if row['checksum'] == migration.checksum else '  (file changed since it was applied)'
+        print(f"  [applied]  {migration}  {row['applied_at']}{note}")
+
+
+def print_report(connection, version):
+    cursor = connection.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute("SELECT explain_report FROM schema_migrations WHERE version = %s", (version,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row is None:
+        print(f"Migration {version} has not been applied")
+    else:
+        print(row['explain_report'] or f"Migration {version} has no EXPLAIN report")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--status', action='store_true', help='list applied and pending migrations')
+    group.add_argument('--explain', action='store_true', help='show current plans of pending migrations without applying')
+    group.add_argument('--report', type=int, metavar='VERSION', help='print the stored EXPLAIN report of a migration')
+    parser.add_argument('--target', type=int, help='apply migrations up to and including this version')
+    args = parser.parse_args()
+
+    from app import DB_CONFIG
+
+    try:
+        # No read timeout: building an index on a large table can take minutes
+        connection = pymysql.connect(**DB_CONFIG, autocommit=False, charset='utf8mb4',
+                                     connect_timeout=10, init_command="SET SESSION time_zone='+08:00'")
+    except Exception as e:
+        print(f"ERROR: Unable to connect to database: {e}")
+        return 1
+
+    try:
+        if args.status:
+            print_status(connection)
+        elif args.report is not None:
+            print_report(connection, args.report)
+        else:
+            count = migrate(connection, target=args.target, explain_only=args.explain)
+            if count:
+                print(f"\nApplied {count} migration(s)")
+        return 0
+    except Exception as e:
+        print(f"ERROR: Migration failed: {e}")
+        return 1
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
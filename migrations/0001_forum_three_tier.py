@@ -0,0 +1,19 @@
+"""
+Forum three-tier indexing: education_level and subject columns on forum_posts
+(formerly update_forum_schema.py)
+"""
+
+from migrations import add_column, create_index
+
+
+def up(cursor):
+    add_column(cursor, 'forum_posts', 'education_level',
+               "VARCHAR(20) DEFAULT NULL "
+               "COMMENT 'Education level: igcse, alevel, ap, competition, university' "
+               "AFTER category")
+    add_column(cursor, 'forum_posts', 'subject',
+               "VARCHAR(20) DEFAULT NULL "
+               "COMMENT 'Subject: math, physics, chemistry, biology' "
+               "AFTER education_level")
+    create_index(cursor, 'forum_posts', 'idx_forum_three_tier',
+                 ['subject', 'education_level', 'category', 'status'])
@@ -0,0 +1,132 @@
+"""
+Composite filter/sort indexes for the listing queries: status/approval filters
+sorted by view_count DESC, created_at DESC, subject + category + status filters,
+and created_at ranges used by the forum and dashboard counters
+
+They let the listings read matching rows already in page order (no filesort,
+LIMIT stops early); the listings select full rows and join users, so they are
+not covering. The COUNT(*) counters are index-only.
+"""
+
+from migrations import create_index
+
+INDEXES = [
+    # index(): featured resources; COUNT(*) WHERE status = 'active'
+    ('resources', 'idx_resources_status_views', ['status', 'view_count', 'created_at']),
+    # subjects_overview(): top resources per subject
+    ('resources', 'idx_resources_subject_views', ['subject', 'status', 'view_count', 'created_at']),
+    # subjects_category(), subject_level_resources(), subject_level_category_resources()
+    ('resources', 'idx_resources_subject_category', ['subject', 'status', 'category', 'view_count', 'created_at']),
+    # competition_resources(), university_resources()
+    ('resources', 'idx_resources_category_views', ['status', 'category', 'view_count', 'created_at']),
+    # index(): popular posts
+    ('forum_posts', 'idx_posts_approved_views', ['status', 'approval_status', 'view_count', 'created_at']),
+    # forum(): newest posts, this week / today counters, active members
+    ('forum_posts', 'idx_posts_approved_recent', ['status', 'approval_status', 'created_at', 'user_id']),
+    # category_resources(), forum() category stats
+    ('forum_posts', 'idx_posts_category_views', ['status', 'approval_status', 'category', 'view_count', 'created_at']),
+    # admin dashboard / forum management queues
+    ('forum_posts', 'idx_posts_approval_created', ['approval_status', 'created_at']),
+    # profile(): my posts
+    ('forum_posts', 'idx_posts_user_created', ['user_id', 'created_at']),
+    # forum_post_detail(): comments by popularity
+    ('forum_replies', 'idx_replies_post_likes', ['post_id', 'like_count DESC', 'created_at']),
+    # forum() / forum_post_detail(): attachments of a post
+    ('forum_attachments', 'idx_attachments_post_created', ['post_id', 'created_at']),
+    # admin dashboard: pending registrations
+    ('users', 'idx_users_status_created', ['registration_status', 'created_at']),
+]
+
+# The routes' own SQL (selected columns, users join, keyset ORDER BY and LIMIT page + 1),
+# so the report shows their real plans: the index should remove the filesort, while
+# the selected columns are still read from each matched row.
+RESOURCE_COLUMNS = """
+    r.id, r.title, r.description, r.category, r.subject, r.resource_type,
+    r.difficulty_level, r.view_count, r.download_count, r.like_count,
+    r.cover_image, r.created_at, u.username as author_name
+"""
+
+EXPLAIN = [
+    ('index / subjects_overview: catalog summary', """
+        SELECT ranked.id, ranked.subject_rank, ranked.overall_rank, u.username as author_name
+        FROM (
+            SELECT r.id, r.user_id,
+                   ROW_NUMBER() OVER (PARTITION BY r.subject
+                                      ORDER BY r.view_count DESC, r.created_at DESC, r.id DESC) as subject_rank,
+                   ROW_NUMBER() OVER (ORDER BY r.view_count DESC, r.created_at DESC, r.id DESC) as overall_rank
+            FROM resources r
+            WHERE r.status = 'active'
+        ) ranked
+        JOIN users u ON ranked.user_id = u.id
+        WHERE ranked.subject_rank <= 3 OR ranked.overall_rank <= 6
+        ORDER BY ranked.overall_rank
+    """, None),
+    ('index: popular posts', """
+        SELECT fp.id, fp.title, fp.category, fp.view_count, fp.reply_count,
+               u.username as author_name, fp.created_at
+        FROM forum_posts fp
+        JOIN users u ON fp.user_id = u.id
+        WHERE fp.status = 'active' AND fp.approval_status = 'approved'
+        ORDER BY fp.view_count DESC, fp.created_at DESC LIMIT 5
+    """, None),
+    ('subjects_category: first page', f"""
+        SELECT {RESOURCE_COLUMNS}
+        FROM resources r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.subject = %s AND r.status = 'active'
+        ORDER BY r.category ASC, r.view_count DESC, r.created_at DESC, r.id DESC LIMIT 25
+    """, ('math',)),
+    ('subject_level_resources: first page', f"""
+        SELECT {RESOURCE_COLUMNS}
+        FROM resources r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.subject = %s AND r.category = %s AND r.status = 'active'
+        ORDER BY r.view_count DESC, r.created_at DESC, r.id DESC LIMIT 25
+    """, ('math', 'IGCSE')),
+    ('university_resources: first page', """
+        SELECT r.id, r.title, r.description, r.category, r.status, r.view_count,
+               u.username as author_name, r.created_at, r.updated_at, r.cover_image, r.resource_type
+        FROM resources r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.status = 'active' AND r.category = 'UNIVERSITY_RESOURCES'
+        ORDER BY r.view_count DESC, r.created_at DESC, r.id DESC LIMIT 25
+    """, None),
+    ('forum: newest posts', """
+        SELECT fp.id, fp.title, fp.content, fp.category, fp.view_count, fp.reply_count,
+               fp.created_at, u.username as author_name, u.user_role, fp.cover_image, fp.topic
+        FROM forum_posts fp
+        JOIN users u ON fp.user_id = u.id
+        WHERE fp.status = 'active' AND fp.approval_status = 'approved'
+        ORDER BY fp.created_at DESC, fp.id DESC LIMIT 51
+    """, None),
+    ('forum: posts today', """
+        SELECT COUNT(*) FROM forum_posts
+        WHERE status = 'active' AND approval_status = 'approved'
+          AND created_at >= CURDATE() AND created_at < CURDATE() + INTERVAL 1 DAY
+    """, None),
+    ('forum: active members', """
+        SELECT COUNT(DISTINCT user_id) FROM forum_posts
+        WHERE status = 'active' AND approval_status = 'approved'
+    """, None),
+    ('admin: pending posts', """
+        SELECT fp.id, fp.title, fp.content, fp.category, fp.created_at,
+               u.username as author_name
+        FROM forum_posts fp
+        JOIN users u ON fp.user_id = u.id
+        WHERE fp.approval_status = 'pending'
+        ORDER BY fp.created_at DESC
+    """, None),
+    ('forum_post_detail: comments', """
+        SELECT fr.id, fr.content, fr.created_at, fr.like_count,
+               u.username as author_name, u.user_role, u.created_at as author_joined
+        FROM forum_replies fr
+        JOIN users u ON fr.user_id = u.id
+        WHERE fr.post_id = %s
+        ORDER BY fr.like_count DESC, fr.created_at ASC, fr.id ASC
+        LIMIT 50 OFFSET 0
+    """, (1,)),
+]
+
+def up(cursor):
+    for table, index, columns in INDEXES:
+        create_index(cursor, table, index, columns)
@@ -0,0 +1,37 @@
+"""
+created_at indexes on the tables scanned by the statistics rollup job, so each
+incremental run reads only the rows of its time window
+"""
+
+from migrations import create_index
+
+INDEXES = [
+    ('page_views', 'idx_page_views_created', ['created_at']),
+    ('user_activity_logs', 'idx_activity_logs_created', ['created_at']),
+    ('forum_replies', 'idx_replies_created', ['created_at']),
+    ('forum_posts', 'idx_posts_created', ['created_at']),
+    ('users', 'idx_users_created', ['created_at']),
+    # session snapshot revocation check (SELECT id, updated_at WHERE updated_at >= ...)
+    ('users', 'idx_users_updated', ['updated_at']),
+]
+
+EXPLAIN = [
+    ('rollup: page views of one hour', """
+        SELECT page_type, COUNT(*) FROM page_views
+        WHERE created_at >= NOW() - INTERVAL 1 HOUR AND created_at < NOW()
+        GROUP BY page_type
+    """, None),
+    ('rollup: activity of one hour', """
+        SELECT activity_type, COUNT(*) FROM user_activity_logs
+        WHERE created_at >= NOW() - INTERVAL 1 HOUR AND created_at < NOW()
+        GROUP BY activity_type
+    """, None),
+    ('session revocations', """
+        SELECT id, updated_at FROM users WHERE updated_at >= NOW() - INTERVAL 30 SECOND
+    """, None),
+]
+
+
+def up(cursor):
+    for table, index, columns in INDEXES:
+        create_index(cursor, table, index, columns)
@@ -0,0 +1,9 @@
+"""
+site_counters table for maintained totals (filled by: python site_counters.py)
+"""
+
+from site_counters import SCHEMA
+
+
+def up(cursor):
+    cursor.execute(SCHEMA)
@@ -0,0 +1,9 @@
+"""
+image_derivatives table for sized image copies (fill for existing images with: python image_derivatives.py --backfill)
+"""
+
+from image_derivatives import SCHEMA
+
+
+def up(cursor):
+    cursor.execute(SCHEMA)
@@ -0,0 +1,64 @@
+"""
+Content-addressed image storage: image_blobs / image_blob_refs tables, and the image
+paths of existing forum posts and resources rewritten to blobs/ (the old files are
+hard-linked into the store and left in place, so old URLs keep working)
+"""
+
+import os
+
+from blob_store import IMAGE_COLUMNS, SCHEMA, BlobStore, split_paths
+from image_index import candidates, image_filename
+
+IMAGE_ROOT = '/image'
+
+
+def adopt(store, path, cache):
+    """Blob path for a stored image path, or the path unchanged if its file cannot be found"""
+    if store.digest(path):
+        return path
+    filename = image_filename(path)
+    if filename is None:
+        return path  # external URL
+    if filename not in cache:
+        cache[filename] = path
+        for candidate in candidates(filename):
+            full_path = os.path.join(IMAGE_ROOT, candidate)
+            if os.path.isfile(full_path):
+                cache[filename] = store.adopt(full_path)
+                break
+        else:
+            print(f"   MISSING: {path} (left unchanged)")
+    return cache[filename]
+
+
+def up(cursor):
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    store = BlobStore(IMAGE_ROOT)
+    if not store.enabled:
+        print(f"   SKIPPED: {IMAGE_ROOT} not found, image paths left unchanged")
+        return
+
+    cache = {}
+    for table, columns in IMAGE_COLUMNS.items():
+        cursor.execute(f"SELECT id, {', '.join(columns)} FROM {table} ORDER BY id")
+        rewritten = 0
+        for row in cursor.fetchall():
+            changes = {}
+            blobs = []
+            for column in columns:
+                paths = split_paths(row[column])
+                new_paths = [adopt(store, path, cache) for path in paths]
+                blobs.extend(new_paths)
+                if new_paths != paths:
+                    changes[column] = ','.join(new_paths)
+            if changes:
+                assignments = ', '.join(f"{column} = %s" for column in changes)
+                cursor.execute(f"UPDATE {table} SET {assignments} WHERE id = %s",
+                               list(changes.values()) + [row['id']])
+                rewritten += 1
+            # INSERT IGNORE on the refs keeps a re-run from counting a row twice
+            store.link(cursor, table, row['id'], blobs)
+        print(f"   REWRITTEN: {rewritten} {table} rows")
+    deduplicated = len(cache) - len(set(cache.values()))
+    print(f"   STORED: {len(set(cache.values()))} blobs for {len(cache)} image files ({deduplicated} duplicates)")
@@ -0,0 +1,11 @@
+"""
+Hourly/daily rollup, visitor sketch and rollup state tables for the statistics page
+(fill with history with: python stats_rollup.py --backfill)
+"""
+
+from stats_rollup import SCHEMA
+
+
+def up(cursor):
+    for statement in SCHEMA:
+        cursor.execute(statement)
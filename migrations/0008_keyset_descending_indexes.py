@@ -0,0 +1,41 @@
+"""
+Keyset listings: view_count NOT NULL (a NULL sort key cannot go into a cursor), and
+idx_resources_subject_category rebuilt with the mixed directions of the
+category_popular ordering (category ASC, view_count DESC, ...) so subjects_category
+reads the index in order instead of filesorting
+"""
+
+from migrations import create_index, drop_index, set_not_null
+
+EXPLAIN = [
+    # subjects_category()'s own SQL: selecting only id would be index-only on any index
+    ('subjects_category: keyset page', """
+        SELECT r.id, r.title, r.description, r.category, r.subject, r.resource_type,
+               r.difficulty_level, r.view_count, r.download_count, r.like_count,
+               r.cover_image, r.created_at, u.username as author_name
+        FROM resources r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.subject = %s AND r.status = 'active'
+        ORDER BY r.category ASC, r.view_count DESC, r.created_at DESC, r.id DESC LIMIT 25
+    """, ('math',)),
+]
+
+
+def index_is_descending(cursor, table, index, column):
+    cursor.execute("""
+        SELECT COLLATION FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s AND COLUMN_NAME = %s
+    """, (table, index, column))
+    row = cursor.fetchone()
+    return row is not None and row['COLLATION'] == 'D'
+
+
+def up(cursor):
+    set_not_null(cursor, 'resources', 'view_count', 0)
+    set_not_null(cursor, 'forum_posts', 'view_count', 0)
+    if index_is_descending(cursor, 'resources', 'idx_resources_subject_category', 'view_count'):
+        print("   FOUND: resources.idx_resources_subject_category already descending, skipping")
+        return
+    drop_index(cursor, 'resources', 'idx_resources_subject_category')
+    create_index(cursor, 'resources', 'idx_resources_subject_category',
+                 ['subject', 'status', 'category', 'view_count DESC', 'created_at DESC', 'id DESC'])
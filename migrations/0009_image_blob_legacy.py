@@ -0,0 +1,18 @@
+"""
+image_blob_legacy: the old upload paths that migration 0006 hard-linked into the
+store, recorded so deleting a migrated post or resource unlinks them with the blob
+(otherwise the old link keeps the file's disk space after the blob is gone)
+"""
+
+from blob_store import LEGACY_SCHEMA, BlobStore
+
+IMAGE_ROOT = '/image'
+
+
+def up(cursor):
+    cursor.execute(LEGACY_SCHEMA)
+    store = BlobStore(IMAGE_ROOT)
+    if not store.enabled:
+        print(f"   SKIPPED: {IMAGE_ROOT} not found, no legacy paths recorded")
+        return
+    print(f"   RECORDED: {store.record_legacy(cursor)} legacy image paths")
@@ -0,0 +1,86 @@
+"""
+Schema Migrations
+Versioned migration modules applied in order by migrate.py
+
+Each module is named NNNN_description.py and defines:
+    up(cursor)   -- apply the change; must be safe to re-run (use the helpers below)
+    EXPLAIN      -- optional list of (label, sql, params) queries whose plans are
+                    captured before and after up() for the migration report
+"""
+
+import pymysql
+
+
+def column_exists(cursor, table, column):
+    """Check whether a column exists in the current database"""
+    cursor.execute("""
+        SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone() is not None
+
+
+def index_exists(cursor, table, index):
+    """Check whether an index exists in the current database"""
+    cursor.execute("""
+        SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+
+def add_column(cursor, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    if column_exists(cursor, table, column):
+        print(f"   FOUND: {table}.{column} already exists, skipping")
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    print(f"   ADDED: {table}.{column}")
+    return True
+
+
+def create_index(cursor, table, index, columns):
+    """CREATE INDEX unless an index with that name is already there
+
+    InnoDB secondary indexes carry the primary key, so an index whose columns
+    cover the WHERE and ORDER BY of a query that selects only id (or counts rows)
+    is a covering index for it.
+    """
+    if index_exists(cursor, table, index):
+        print(f"   FOUND: {table}.{index} already exists, skipping")
+        return False
+    try:
+        cursor.execute(f"CREATE INDEX {index} ON {table} ({', '.join(columns)})")
+    except pymysql.err.OperationalError as e:
+        # 1061 = duplicate key name (another process won the race)
+        if e.args[0] != 1061:
+            raise
+        return False
+    print(f"   CREATED: {table}.{index} ({', '.join(columns)})")
+    return True
+
+
+def drop_index(cursor, table, index):
+    """DROP INDEX if it exists"""
+    if not index_exists(cursor, table, index):
+        return False
+    cursor.execute(f"DROP INDEX {index} ON {table}")
+    print(f"   DROPPED: {table}.{index}")
+    return True
+
+
+def set_not_null(cursor, table, column, default):
+    """Replace NULLs with default and declare the column NOT NULL DEFAULT default, keeping its type"""
+    cursor.execute("""
+        SELECT COLUMN_TYPE, IS_NULLABLE FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    row = cursor.fetchone()
+    if row is None or row['IS_NULLABLE'] == 'NO':
+        print(f"   FOUND: {table}.{column} already NOT NULL (or missing), skipping")
+        return False
+    cursor.execute(f"UPDATE {table} SET {column} = %s WHERE {column} IS NULL", (default,))
+    cursor.execute(f"ALTER TABLE {table} MODIFY {column} {row['COLUMN_TYPE']} NOT NULL DEFAULT %s", (default,))
+    print(f"   ALTERED: {table}.{column} {row['COLUMN_TYPE']} NOT NULL DEFAULT {default}")
+    return True
@@ -0,0 +1,193 @@
+"""
+Page Cache
+Size-bounded LRU cache of rendered pages for anonymous visitors, with TTLs and tag invalidation
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# File mtimes come from a coarse kernel clock; treat markers as this much newer
+MARKER_SLACK_NS = 50 * 1000 * 1000
+
+
+class CachedPage:
+    __slots__ = ('status', 'headers', 'body', 'tags', 'expires', 'stored_ns', 'size')
+
+    def __init__(self, status, headers, body, tags, expires, stored_ns):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.tags = tags
+        self.expires = expires
+        self.stored_ns = stored_ns
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers) + 200
+
+
+class PageCache:
+    """LRU response cache bounded by total body bytes
+
+    Entries carry tags (e.g. 'resources', 'forum'). invalidate(tag) drops the
+    matching entries in this process and touches a marker file in marker_dir;
+    every worker compares that file's mtime with an entry's store time on
+    lookup, so invalidation reaches all worker processes on the host. A page
+    whose rendering started before an invalidation of one of its tags is never
+    stored, so a slow render cannot resurrect stale content.
+
+    Args:
+        max_bytes: Memory budget for cached bodies and headers
+        marker_dir: Directory for cross-process invalidation markers (None = process-local)
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, marker_dir=None):
+        self.max_bytes = max_bytes
+        self.marker_dir = marker_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._invalidated = {}   # tag -> time_ns of the last local invalidation
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'invalidations': 0}
+        if marker_dir:
+            os.makedirs(marker_dir, exist_ok=True)
+
+    @staticmethod
+    def clock():
+        """Timestamp to pass to put() for a render that starts now"""
+        return time.time_ns()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.expires <= time.monotonic()
+                                      or self._invalidated_since(entry.tags, entry.stored_ns)):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key, status, headers, body, ttl, tags, started_ns):
+        """Store a rendered page unless one of its tags was invalidated since started_ns"""
+        entry = CachedPage(status, headers, body, tuple(tags), time.monotonic() + ttl, started_ns)
+        if entry.size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            if self._invalidated_since(entry.tags, started_ns):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self.stats['stores'] += 1
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+        return True
+
+    def invalidate(self, *tags):
+        """Drop every cached page carrying any of `tags`, in all workers"""
+        now = time.time_ns()
+        with self._lock:
+            for tag in tags:
+                self._invalidated[tag] = now
+            for key in [k for k, e in self._entries.items() if set(e.tags) & set(tags)]:
+                self._remove(key)
+            self.stats['invalidations'] += 1
+        if self.marker_dir:
+            for tag in tags:
+                try:
+                    path = os.path.join(self.marker_dir, tag)
+                    with open(path, 'a'):
+                        pass
+                    os.utime(path)
+                except OSError as e:
+                    print(f"Error writing page cache marker for '{tag}': {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def last_invalidated(self, tags):
+        """time_ns of the latest invalidation of any of `tags` (0 if never)
+
+        With a marker_dir only the marker mtimes count, so every worker on the
+        host reports the same value for the same writes.
+        """
+        if not self.marker_dir:
+            with self._lock:
+                return max([self._invalidated.get(tag, 0) for tag in tags] or [0])
+        latest = 0
+        for tag in tags:
+            try:
+                latest = max(latest, os.stat(os.path.join(self.marker_dir, tag)).st_mtime_ns)
+            except FileNotFoundError:
+                pass
+        return latest
+
+    def invalidated_since(self, tags, since_ns):
+        """True if any of `tags` was invalidated (in any worker) at or after since_ns"""
+        with self._lock:
+            return self._invalidated_since(tags, since_ns)
+
+    def _invalidated_since(self, tags, since_ns):
+        for tag in tags:
+            if self._invalidated.get(tag, 0) >= since_ns:
+                return True
+            if self.marker_dir:
+                try:
+                    if os.stat(os.path.join(self.marker_dir, tag)).st_mtime_ns + MARKER_SLACK_NS >= since_ns:
+                        return True
+                except FileNotFoundError:
+                    pass
+        return False
+
+
+class TaggedValue:
+    """One computed value cached until its TTL passes or one of its tags is invalidated
+
+    Shares the tag invalidation of a PageCache, so writes that refresh cached
+    pages refresh the value too. Concurrent misses wait for a single load.
+
+    Args:
+        cache: PageCache whose invalidations apply to this value
+        load: Callable computing the value
+        ttl: Seconds the value may be reused
+        tags: Invalidation tags
+    """
+
+    def __init__(self, cache, load, ttl, tags):
+        self.cache = cache
+        self.load = load
+        self.ttl = ttl
+        self.tags = tuple(tags)
+        self._value = None
+        self._loaded_ns = 0
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if (self._value is None or self._expires <= time.monotonic()
+                    or self.cache.invalidated_since(self.tags, self._loaded_ns)):
+                started = self.cache.clock()
+                self._value = self.load()
+                self._loaded_ns = started
+                self._expires = time.monotonic() + self.ttl
+            return self._value
+
+    def reset(self):
+        with self._lock:
+            self._value = None
@@ -0,0 +1,148 @@
+"""
+Page View Writer
+Buffers page_views rows in memory and batch-inserts them from a background thread
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+
+PAGE_VIEW_COLUMNS = ('page_type', 'page_id', 'user_id', 'ip_address', 'user_agent',
+                     'referrer', 'session_id', 'created_at')
+
+
+class PageViewWriter:
+    """Bounded queue plus flusher thread for page view tracking
+
+    record() never blocks the request: when the queue is full the row is dropped
+    and counted. The flusher writes a multi-row INSERT whenever batch_size rows
+    are waiting or flush_interval seconds have passed, and drains the queue on
+    shutdown.
+
+    Args:
+        get_connection: Callable returning a DB connection whose close() releases it
+        max_queue: Rows buffered before new ones are dropped
+        batch_size: Maximum rows per INSERT statement
+        flush_interval: Seconds a row may wait before being written
+    """
+
+    def __init__(self, get_connection, max_queue=10000, batch_size=200, flush_interval=2.0):
+        self.get_connection = get_connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+
+        columns = ', '.join(PAGE_VIEW_COLUMNS)
+        placeholders = ', '.join(['%s'] * len(PAGE_VIEW_COLUMNS))
+        # PyMySQL's executemany rewrites this into a single multi-row INSERT
+        self.insert_sql = f"INSERT INTO page_views ({columns}) VALUES ({placeholders})"
+
+    def record(self, row):
+        """Queue one page_views row (tuple ordered like PAGE_VIEW_COLUMNS)"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def stats(self):
+        """Counters for queued, written, dropped and failed rows"""
+        with self._stats_lock:
+            return dict(self._stats, pending=self._queue.qsize())
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher after writing everything still queued"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        # Anything left (e.g. the thread never started) is written inline
+        self._drain()
+
+    def register_shutdown(self):
+        """Drain the queue when the interpreter exits"""
+        atexit.register(self.stop)
+        return self
+
+    def _ensure_started(self):
+        # Threads don't survive fork(), so each worker process starts its own flusher
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='page-view-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+        self._drain()
+
+    def _collect_batch(self):
+        """Block for the first row, then gather until batch_size or flush_interval"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        connection = None
+        try:
+            connection = self.get_connection()
+            if connection is None:
+                raise RuntimeError('database unavailable')
+            cursor = connection.cursor()
+            cursor.executemany(self.insert_sql, batch)
+            connection.commit()
+            cursor.close()
+            self._count('written', len(batch))
+            self._count('batches')
+        except Exception as e:
+            print(f"Error writing {len(batch)} page views: {e}")
+            self._count('failed', len(batch))
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
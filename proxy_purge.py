@@ -0,0 +1,83 @@
+"""
+Proxy Purge
+Tag-based purge requests to the reverse proxy / CDN that caches anonymous pages
+"""
+
+import os
+import threading
+import urllib.request
+
+
+class ProxyPurger:
+    """Sends purge requests for cache tags from a background thread
+
+    Anonymous pages carry their invalidation tags in a response header (e.g.
+    'Surrogate-Key: resources forum'); a proxy configured to index that header
+    can drop every page with a tag when it receives
+
+        PURGE <url>
+        Surrogate-Key: resources
+
+    purge() only queues the tags, so write routes never wait on the proxy.
+    Tags queued while a request is in flight are sent together in the next one.
+    With no url configured purge() does nothing.
+
+    Args:
+        url: Purge endpoint of the proxy (None/'' disables purging)
+        method: HTTP method the proxy expects
+        header: Request/response header carrying the tags
+        timeout: Seconds to wait for the proxy
+    """
+
+    def __init__(self, url=None, method='PURGE', header='Surrogate-Key', timeout=2.0):
+        self.url = url
+        self.method = method
+        self.header = header
+        self.timeout = timeout
+        self._pending = set()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.stats = {'requests': 0, 'failed': 0}
+
+    def purge(self, *tags):
+        """Queue a purge of every proxied page carrying any of `tags`"""
+        if not self.url or not tags:
+            return
+        with self._lock:
+            self._pending.update(tags)
+        self._ensure_started()
+        self._wakeup.set()
+
+    def send(self, tags):
+        """Purge `tags` now; returns True when the proxy accepted the request"""
+        request = urllib.request.Request(self.url, method=self.method,
+                                         headers={self.header: ' '.join(sorted(tags))})
+        self.stats['requests'] += 1
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return 200 <= response.status < 300
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Error purging proxy cache for {sorted(tags)}: {e}")
+            return False
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='proxy-purge', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                tags, self._pending = self._pending, set()
+            if tags:
+                self.send(tags)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Site Counters
+Maintained totals for users, resources and forum posts, kept current by the write paths
+
+使用方法:
+1. 立即对账（根据源表重新计算全部计数）: python site_counters.py
+2. 查看当前计数: python site_counters.py --show
+"""
+
+import argparse
+import os
+import threading
+import time
+from collections import Counter
+
+import pymysql
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS site_counters (
+        name VARCHAR(128) NOT NULL PRIMARY KEY,
+        value BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+
+def user_keys(row):
+    return ['users', f"users.status.{row['registration_status']}"]
+
+
+def resource_keys(row):
+    return ['resources', f"resources.status.{row['status']}"]
+
+
+def post_keys(row):
+    keys = ['posts', f"posts.status.{row['status']}", f"posts.approval.{row['approval_status']}"]
+    if row['status'] == 'active' and row['approval_status'] == 'approved':
+        # Posts shown on the forum
+        keys += ['posts.visible', f"posts.visible.category.{row['category']}"]
+    return keys
+
+
+# Always present after the first reconciliation; readers use it to detect an unfilled table
+BASE_COUNTERS = ('users', 'resources', 'posts')
+
+# table -> (columns that decide which counters a row contributes to, key function)
+COUNTED_TABLES = {
+    'users': (('registration_status',), user_keys),
+    'resources': (('status',), resource_keys),
+    'forum_posts': (('status', 'approval_status', 'category'), post_keys),
+}
+
+# First part of a counter name -> table it counts
+COUNTER_TABLES = {'users': 'users', 'resources': 'resources', 'posts': 'forum_posts'}
+
+
+class SiteCounters:
+    """Named counters in the site_counters table
+
+    Write paths report row changes inside their own transaction:
+
+        before = site_counters.lock_row(cursor, 'resources', resource_id)
+        cursor.execute("UPDATE resources SET status = 'archived' ...")
+        site_counters.row_updated(cursor, 'resources', before, status='archived')
+        connection.commit()
+
+    so the counters commit or roll back together with the row. Changes made
+    elsewhere (scripts, manual SQL, FK cascades) are corrected by reconcile(),
+    which recounts the source tables while holding the counter rows locked.
+
+    Until the table has been filled (by the background thread or
+    python site_counters.py) readers count the source tables directly.
+
+    Args:
+        get_connection: Callable returning a connection of its own (reconcile()
+            commits, so never the request's shared one) whose close() releases it
+        interval: Seconds between background reconciliations
+    """
+
+    def __init__(self, get_connection, interval=3600):
+        self.get_connection = get_connection
+        self.interval = interval
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # -- reads ---------------------------------------------------------------
+
+    def get(self, cursor, *names):
+        """Current values of the named counters (0 for counters never touched)"""
+        rows = self._read(cursor, names)
+        if rows is None:
+            # Not filled yet: count live, without locks and without touching the caller's transaction
+            rows = self._count(cursor, {COUNTER_TABLES[name.split('.')[0]] for name in names})
+        return {name: rows.get(name, 0) for name in names}
+
+    def with_prefix(self, cursor, prefix):
+        """Counters whose name starts with prefix, keyed by the remainder"""
+        if self._read(cursor, ()) is None:
+            rows = self._count(cursor, {COUNTER_TABLES[prefix.split('.')[0]]})
+            return {name[len(prefix):]: value for name, value in rows.items() if name.startswith(prefix)}
+        dict_cursor = cursor.connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            dict_cursor.execute("SELECT name, value FROM site_counters WHERE name LIKE %s",
+                                (prefix.replace('_', '\\_') + '%',))
+            return {row['name'][len(prefix):]: row['value'] for row in dict_cursor.fetchall()}
+        finally:
+            dict_cursor.close()
+
+    # -- write paths ---------------------------------------------------------
+
+    def lock_row(self, cursor, table, row_id):
+        """Counted columns of one row, locked until the caller's transaction ends"""
+        columns = COUNTED_TABLES[table][0]
+        dict_cursor = cursor.connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            dict_cursor.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE id = %s FOR UPDATE",
+                                (row_id,))
+            return dict_cursor.fetchone()
+        finally:
+            dict_cursor.close()
+
+    def row_inserted(self, cursor, table, **values):
+        self._apply(cursor, table, None, values)
+
+    def row_updated(self, cursor, table, before, **changes):
+        if before is not None:
+            self._apply(cursor, table, before, dict(before, **changes))
+
+    def row_deleted(self, cursor, table, before):
+        if before is not None:
+            self._apply(cursor, table, before, None)
+
+    def _apply(self, cursor, table, before, after):
+        key_fn = COUNTED_TABLES[table][1]
+        deltas = Counter(key_fn(after) if after else [])
+        deltas.subtract(key_fn(before) if before else [])
+        self.adjust(cursor, {name: delta for name, delta in deltas.items() if delta})
+
+    def adjust(self, cursor, deltas):
+        """Add deltas to counters within the caller's transaction"""
+        if not deltas:
+            return
+        # A fixed lock order keeps concurrent writers from deadlocking
+        items = sorted(deltas.items())
+        placeholders = ', '.join(['(%s, %s)'] * len(items))
+        cursor.execute(f"""
+            INSERT INTO site_counters (name, value) VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+        """, [value for item in items for value in item])
+
+    # -- reconciliation ------------------------------------------------------
+
+    def reconcile(self):
+        """Recount every counter from the source tables; returns the number of changed counters"""
+        connection = self.get_connection()
+        if connection is None:
+            print("Site counter reconciliation skipped: database unavailable")
+            return 0
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            # Locking the counters first makes concurrent writers wait, so their
+            # adjustments land either wholly before or wholly after the recount
+            try:
+                cursor.execute("SELECT name, value FROM site_counters ORDER BY name FOR UPDATE")
+            except pymysql.err.ProgrammingError:
+                print("Site counter reconciliation skipped: table not created yet (python migrate.py)")
+                return 0
+            current = {row['name']: row['value'] for row in cursor.fetchall()}
+
+            totals = Counter({name: 0 for name in BASE_COUNTERS})
+            totals.update(self._count(cursor, COUNTED_TABLES))
+
+            changed = {name: value for name, value in totals.items() if current.get(name) != value}
+            changed.update({name: 0 for name in current if name not in totals and current[name] != 0})
+            if changed:
+                items = sorted(changed.items())
+                placeholders = ', '.join(['(%s, %s)'] * len(items))
+                cursor.execute(f"""
+                    INSERT INTO site_counters (name, value) VALUES {placeholders}
+                    ON DUPLICATE KEY UPDATE value = VALUES(value)
+                """, [value for item in items for value in item])
+            connection.commit()
+            if current and changed:
+                print(f"Site counters corrected: {changed}")
+            return len(changed)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+    def ensure_started(self):
+        """Start the background reconciliation thread in this process"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run_forever, name='site-counters', daemon=True)
+            self._thread.start()
+
+    def _count(self, cursor, tables):
+        """Counter values recounted from the given source tables"""
+        totals = Counter()
+        dict_cursor = cursor.connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            for table in tables:
+                columns, key_fn = COUNTED_TABLES[table]
+                column_list = ', '.join(columns)
+                dict_cursor.execute(f"SELECT {column_list}, COUNT(*) as count FROM {table} GROUP BY {column_list}")
+                for row in dict_cursor.fetchall():
+                    for name in key_fn(row):
+                        totals[name] += row['count']
+        finally:
+            dict_cursor.close()
+        return totals
+
+    def _is_filled(self):
+        connection = self.get_connection()
+        if connection is None:
+            return False
+        cursor = connection.cursor()
+        try:
+            return self._read(cursor, ()) is not None
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _read(self, cursor, names):
+        lookup = sorted(set(names) | {'posts'})
+        dict_cursor = cursor.connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            placeholders = ', '.join(['%s'] * len(lookup))
+            dict_cursor.execute(f"SELECT name, value FROM site_counters WHERE name IN ({placeholders})", lookup)
+            rows = {row['name']: row['value'] for row in dict_cursor.fetchall()}
+            return rows if 'posts' in rows else None
+        except pymysql.err.ProgrammingError:
+            return None
+        finally:
+            dict_cursor.close()
+
+    def _run_forever(self):
+        # An unfilled table is reconciled right away; a filled one only needs correcting
+        try:
+            wait = self.interval if self._is_filled() else 0
+        except Exception:
+            wait = self.interval
+        while True:
+            time.sleep(wait)
+            wait = self.interval
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"Error reconciling site counters: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile the site_counters table')
+    parser.add_argument('--show', action='store_true', help='print the current counters instead of reconciling')
+    args = parser.parse_args()
+
+    from app import site_counters, get_db_connection
+
+    if args.show:
+        connection = get_db_connection()
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        cursor.execute("SELECT name, value FROM site_counters ORDER BY name")
+        for row in cursor.fetchall():
+            print(f"  {row['name']:<48} {row['value']}")
+        cursor.close()
+        connection.close()
+    else:
+        changed = site_counters.reconcile()
+        print(f"✅ Reconciled site counters ({changed} corrected)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Static Assets
+Content-hashed and precompressed copies of the static assets, served with immutable caching
+
+使用方法:
+1. 构建（部署时运行；应用启动时也会检查并在需要时自动构建）: python static_assets.py
+2. 删除旧版本文件后重新构建: python static_assets.py --clean
+
+同时生成 .br（Brotli，见 requirements.txt）和 .gz 文件；未安装 Brotli 时只生成 .gz 文件。
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz siblings are written
+    brotli = None
+
+# Asset directories under static/ (uploads are user content and never fingerprinted)
+ASSET_DIRS = ('css', 'js', 'webfonts')
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+
+# Formats worth compressing (images and woff2 fonts are compressed already)
+COMPRESSIBLE_SUFFIXES = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ttf', '.eot')
+MIN_COMPRESS_SIZE = 1024
+# Content-Encoding -> sibling file suffix, most preferred first
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output identical across builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class StaticManifest:
+    """Maps static filenames to content-hashed copies under static/dist/
+
+    build() copies every asset to dist/<dir>/<name>.<hash><ext>, with url()
+    references inside CSS rewritten to the hashed names so fonts are immutable
+    too, and records the mapping in dist/manifest.json. A copy's name changes
+    whenever its bytes change, so it can be cached forever; old copies stay on
+    disk for pages that still reference them until --clean.
+
+    Compressible assets and their hashed copies also get .br / .gz siblings,
+    listed in the manifest so negotiate() picks one without touching the disk.
+    Everything is written under dist/: siblings of the unhashed sources go to
+    dist/<dir>/<name><ext>.gz, so the tracked static/ tree is never touched.
+
+    Args:
+        static_folder: The app's static folder
+    """
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.dist_folder = os.path.join(static_folder, DIST_DIR)
+        self.files = {}      # 'css/app.css' -> 'dist/css/app.3f2a9c1d0b7e.css'
+        self.version = ''    # digest of the whole mapping
+        self.encodings = {}  # 'dist/css/app.3f2a9c1d0b7e.css' -> ['br', 'gzip']
+
+    def url(self, filename):
+        """Filename to put in a static URL (the hashed copy when there is one)"""
+        return self.files.get(filename, filename)
+
+    def is_fingerprinted(self, filename):
+        return filename.startswith(DIST_DIR + '/')
+
+    def negotiate(self, filename, accept_encodings):
+        """(Content-Encoding, file to send) for the best precompressed sibling the client accepts
+
+        accept_encodings is the request's parsed Accept-Encoding header.
+        """
+        for encoding in self.encodings.get(filename, ()):
+            if accept_encodings[encoding]:
+                return encoding, self.sibling(filename, encoding)
+        return None, filename
+
+    def sibling(self, filename, encoding):
+        """Path of the precompressed copy of filename ('css/a.css' -> 'dist/css/a.css.gz')"""
+        if not self.is_fingerprinted(filename):
+            filename = f"{DIST_DIR}/{filename}"
+        return filename + ENCODING_SUFFIXES[encoding]
+
+    def sources(self):
+        """Relative paths of every asset, sorted"""
+        paths = []
+        for asset_dir in ASSET_DIRS:
+            for root, dirs, names in os.walk(os.path.join(self.static_folder, asset_dir)):
+                for name in names:
+                    if name.endswith(tuple(ENCODING_SUFFIXES.values())):
+                        continue
+                    full_path = os.path.join(root, name)
+                    paths.append(os.path.relpath(full_path, self.static_folder).replace(os.sep, '/'))
+        return sorted(paths)
+
+    def load_or_build(self):
+        """Use dist/manifest.json if it matches the current assets, rebuild otherwise"""
+        try:
+            with open(os.path.join(self.dist_folder, MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest['sources'] == self._source_digests():
+                self._use(manifest['files'], manifest['encodings'])
+                return self
+        except (OSError, ValueError, KeyError):
+            pass
+        try:
+            self.build()
+        except OSError as e:
+            # Read-only deployment without a prebuilt manifest: plain URLs still work
+            print(f"Error building static assets, serving unhashed files: {e}")
+            self._use({}, {})
+        return self
+
+    def build(self):
+        """Write the hashed copies and the manifest; returns the mapping"""
+        digests = self._source_digests()
+        files = {}
+        encodings = {}
+        # CSS last, so its url() references can point at already hashed files
+        for path in sorted(digests, key=lambda p: (p.endswith('.css'), p)):
+            with open(os.path.join(self.static_folder, path), 'rb') as f:
+                source = f.read()
+            data = self._rewrite_css(path, source, files) if path.endswith('.css') else source
+            root, ext = posixpath.splitext(path)
+            hashed = f"{DIST_DIR}/{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+            exists = os.path.exists(os.path.join(self.static_folder, hashed))
+            if not exists:
+                self._write(hashed, data)
+            files[path] = hashed
+            encodings[path] = self._precompress(path, source, overwrite=True)
+            # A hashed copy never changes, so existing siblings are reused
+            encodings[hashed] = self._precompress(hashed, data, overwrite=not exists)
+        encodings = {path: found for path, found in encodings.items() if found}
+        manifest = json.dumps({'sources': digests, 'files': files, 'encodings': encodings},
+                              indent=2, sort_keys=True)
+        self._write(f"{DIST_DIR}/{MANIFEST_NAME}", manifest.encode('utf-8'))
+        self._use(files, encodings)
+        return files
+
+    def add_bundle(self, data, ext):
+        """Store generated content (e.g. CSS extracted from templates) as dist/bundles/<hash><ext>"""
+        hashed = f"{DIST_DIR}/bundles/{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+        exists = os.path.exists(os.path.join(self.static_folder, hashed))
+        if not exists:
+            self._write(hashed, data)
+        found = self._precompress(hashed, data, overwrite=not exists)
+        if found:
+            self.encodings[hashed] = found
+        return hashed
+
+    def clean(self):
+        """Remove dist/ entirely (pages cached with old URLs will miss until rebuilt)"""
+        shutil.rmtree(self.dist_folder, ignore_errors=True)
+
+    def _source_digests(self):
+        return {path: file_digest(os.path.join(self.static_folder, path)) for path in self.sources()}
+
+    def _use(self, files, encodings):
+        self.files = files
+        self.encodings = encodings
+        self.version = hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+    def _precompress(self, path, data, overwrite):
+        """Write .br / .gz siblings that are worth keeping; returns their encodings"""
+        if not path.endswith(COMPRESSIBLE_SUFFIXES) or len(data) < MIN_COMPRESS_SIZE:
+            return []
+        found = []
+        for encoding in ENCODING_SUFFIXES:
+            if encoding == 'br' and brotli is None:
+                continue
+            sibling = self.sibling(path, encoding)
+            if not overwrite and os.path.exists(os.path.join(self.static_folder, sibling)):
+                found.append(encoding)
+                continue
+            compressed = compress(data, encoding)
+            if len(compressed) < len(data) * 0.9:
+                self._write(sibling, compressed)
+                found.append(encoding)
+            elif os.path.exists(os.path.join(self.static_folder, sibling)):
+                os.unlink(os.path.join(self.static_folder, sibling))
+        return found
+
+    def _rewrite_css(self, path, data, files):
+        css_dir = posixpath.dirname(path)
+        hashed_dir = posixpath.join(DIST_DIR, css_dir)
+
+        def replace(match):
+            quote, ref = match.groups()
+            if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+                return match.group(0)
+            ref_path, suffix = re.match(r'([^?#]*)(.*)', ref).groups()
+            target = posixpath.normpath(posixpath.join(css_dir, ref_path))
+            # Files we did not copy keep pointing at their original location
+            new_ref = posixpath.relpath(files.get(target, target), hashed_dir)
+            return f"url({quote}{new_ref}{suffix}{quote})"
+
+        return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+    def _write(self, relative_path, data):
+        """Atomic write, so concurrent workers building at startup never see partial files"""
+        path = os.path.join(self.static_folder, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build content-hashed copies of the static assets')
+    parser.add_argument('--clean', action='store_true', help='delete old hashed copies before building')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='static folder (default: ./static)')
+    args = parser.parse_args()
+
+    manifest = StaticManifest(args.static)
+    if args.clean:
+        manifest.clean()
+    files = manifest.build()
+    for source, hashed in files.items():
+        print(f"  {source:<40} -> {hashed}  {' '.join(manifest.encodings.get(hashed, []))}")
+    print(f"✅ Built {len(files)} static assets (version {manifest.version})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Statistics Rollups
+Incrementally maintains hourly and daily aggregates that power the admin statistics page
+
+使用方法:
+1. 回填历史数据: python stats_rollup.py --backfill
+2. 从指定日期回填: python stats_rollup.py --backfill --since 2025-01-01
+3. 执行一次增量汇总: python stats_rollup.py
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pymysql
+
+from hyperloglog import HyperLogLog
+
+# metric -> (source table, dimension column or None)
+ROLLUP_SOURCES = {
+    'views': ('page_views', 'page_type'),
+    'registrations': ('users', None),
+    'posts': ('forum_posts', None),
+    'comments': ('forum_replies', None),
+    'activity': ('user_activity_logs', 'activity_type'),
+}
+
+# Distinct visitors are tracked with HyperLogLog sketches rather than rollup rows
+VISITOR_KEY = 'COALESCE(user_id, ip_address)'
+
+# HyperLogLog precision for visitor sketches (4096 registers, ~1.6% standard error)
+SKETCH_PRECISION = 12
+
+ROLLUP_TABLES = {
+    'hourly': ('stats_rollup_hourly', 'DATETIME', "DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:00:00')"),
+    'daily': ('stats_rollup_daily', 'DATE', 'DATE(created_at)'),
+}
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS stats_rollup_hourly (
+        bucket DATETIME NOT NULL,
+        metric VARCHAR(32) NOT NULL,
+        dimension VARCHAR(64) NOT NULL DEFAULT '',
+        value BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket, metric, dimension),
+        KEY idx_rollup_hourly_metric (metric, bucket)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stats_rollup_daily (
+        bucket DATE NOT NULL,
+        metric VARCHAR(32) NOT NULL,
+        dimension VARCHAR(64) NOT NULL DEFAULT '',
+        value BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket, metric, dimension),
+        KEY idx_rollup_daily_metric (metric, bucket)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stats_sketch_daily (
+        bucket DATE NOT NULL,
+        dimension VARCHAR(64) NOT NULL DEFAULT '',
+        sketch BLOB NOT NULL,
+        PRIMARY KEY (bucket, dimension)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stats_sketch_totals (
+        dimension VARCHAR(64) NOT NULL PRIMARY KEY,
+        sketch BLOB NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stats_rollup_state (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        watermark DATETIME NULL,
+        payload MEDIUMTEXT NULL,
+        updated_at DATETIME NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+]
+
+# Whole-table figures that have no time bucket; recomputed once per run and
+# stored as JSON so the statistics page never has to scan the source tables.
+SNAPSHOT_QUERIES = {
+    'totals': """
+        SELECT (SELECT COUNT(*) FROM users) as users,
+               (SELECT COUNT(*) FROM forum_posts) as posts,
+               (SELECT COUNT(*) FROM forum_replies) as comments,
+               (SELECT COUNT(*) FROM user_feedback) as feedback
+    """,
+    'top_users': """
+        SELECT u.username, u.user_role,
+               COUNT(DISTINCT fp.id) as post_count,
+               COUNT(DISTINCT fr.id) as comment_count,
+               (COUNT(DISTINCT fp.id) + COUNT(DISTINCT fr.id)) as total_activity
+        FROM users u
+        LEFT JOIN forum_posts fp ON u.id = fp.user_id
+        LEFT JOIN forum_replies fr ON u.id = fr.user_id
+        WHERE u.user_role != 'admin'
+        GROUP BY u.id, u.username, u.user_role
+        HAVING total_activity > 0
+        ORDER BY total_activity DESC
+        LIMIT 10
+    """,
+    'category_stats': """
+        SELECT category, COUNT(*) as count
+        FROM forum_posts
+        WHERE approval_status = 'approved'
+        GROUP BY category
+        ORDER BY count DESC
+    """,
+}
+
+LOCK_NAME = 'stem_stats_rollup'
+
+
+class StatsRollup:
+    """Hourly/daily rollup maintainer
+
+    Each run re-aggregates only the hours since the previous run (plus one hour of
+    grace for late page view batches) and the days they fall in, replacing those
+    buckets, so runs are idempotent. A MySQL named lock keeps several workers from
+    doing the same work.
+
+    Args:
+        get_connection: Callable returning a DB connection whose close() releases it
+        now: Callable returning the current Beijing time as a naive datetime
+        interval: Seconds between background runs
+    """
+
+    def __init__(self, get_connection, now, interval=300):
+        self.get_connection = get_connection
+        self.now = now
+        self.interval = interval
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start the background maintenance thread in this process"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run_forever, name='stats-rollup', daemon=True)
+            self._thread.start()
+
+    def run(self, now=None):
+        """Roll up everything since the last run; returns False if another worker holds the lock"""
+        now = now or self.now()
+        current_hour = now.replace(minute=0, second=0, microsecond=0)
+        return self._locked(lambda cursor: self._run_incremental(cursor, current_hour))
+
+    def backfill(self, since=None):
+        """Rebuild rollups day by day from `since` (or the oldest source row) up to now"""
+        now = self.now()
+        current_hour = now.replace(minute=0, second=0, microsecond=0)
+
+        def work(cursor):
+            start = since
+            if start is None:
+                start = self._oldest_row(cursor) or current_hour
+            day = datetime(start.year, start.month, start.day)
+            end = current_hour + timedelta(hours=1)
+            while day < end:
+                next_day = min(day + timedelta(days=1), end)
+                self._rollup_range(cursor, day, next_day)
+                cursor.connection.commit()
+                print(f"📊 Rolled up {day.strftime('%Y-%m-%d')}")
+                day = next_day
+            self._refresh_snapshots(cursor, now)
+            self._set_watermark(cursor, current_hour)
+
+        return self._locked(work)
+
+    def read_snapshot(self, cursor, name):
+        """Return a stored snapshot payload (or None if the job has not run yet)"""
+        try:
+            cursor.execute("SELECT payload FROM stats_rollup_state WHERE name = %s", (f'snapshot:{name}',))
+        except pymysql.err.ProgrammingError:
+            return None  # tables not created yet (python migrate.py)
+        row = cursor.fetchone()
+        if not row:
+            return None
+        payload = row['payload'] if isinstance(row, dict) else row[0]
+        return json.loads(payload) if payload else None
+
+    def _run_incremental(self, cursor, current_hour):
+        watermark = self._get_watermark(cursor)
+        if watermark is None:
+            print("📊 No rollup watermark yet - rolling up the current day only (run stats_rollup.py --backfill for history)")
+            watermark = current_hour.replace(hour=0)
+        # One hour of grace for page views that were still buffered at the last run
+        start = min(watermark, current_hour) - timedelta(hours=1)
+        end = current_hour + timedelta(hours=1)
+        self._rollup_range(cursor, start, end)
+        self._refresh_snapshots(cursor, self.now())
+        self._set_watermark(cursor, current_hour)
+
+    def _rollup_range(self, cursor, start, end):
+        """Recompute hourly buckets in [start, end) and the daily buckets they touch"""
+        day_start = datetime(start.year, start.month, start.day)
+        day_end = datetime(end.year, end.month, end.day)
+        if day_end < end:
+            day_end += timedelta(days=1)
+        self._rollup_granularity(cursor, 'hourly', start, end)
+        self._rollup_granularity(cursor, 'daily', day_start, day_end)
+        self._update_sketches(cursor, start, end)
+
+    def _update_sketches(self, cursor, start, end):
+        """Fold visitors seen in [start, end) into the daily and all-time sketches
+
+        Re-adding a visitor never changes a sketch, so overlapping runs are safe.
+        """
+        cursor.execute(f"""
+            SELECT DISTINCT DATE(created_at) as day, COALESCE(page_type, 'unknown') as page_type,
+                   {VISITOR_KEY} as visitor
+            FROM page_views
+            WHERE created_at >= %s AND created_at < %s
+        """, (start, end))
+        daily = {}
+        totals = {}
+        for row in cursor.fetchall():
+            for dimension in ('', row['page_type']):
+                for sketches, key in ((daily, (row['day'], dimension)), (totals, dimension)):
+                    if key not in sketches:
+                        sketches[key] = HyperLogLog(SKETCH_PRECISION)
+                    sketches[key].add(row['visitor'])
+        if not daily:
+            return
+
+        days = sorted({day for day, _ in daily})
+        placeholders = ', '.join(['%s'] * len(days))
+        cursor.execute(f"""
+            SELECT bucket, dimension, sketch FROM stats_sketch_daily
+            WHERE bucket IN ({placeholders})
+        """, days)
+        for row in cursor.fetchall():
+            key = (row['bucket'], row['dimension'])
+            if key in daily:
+                daily[key].merge(HyperLogLog.from_bytes(row['sketch']))
+
+        cursor.execute("SELECT dimension, sketch FROM stats_sketch_totals")
+        for row in cursor.fetchall():
+            if row['dimension'] in totals:
+                totals[row['dimension']].merge(HyperLogLog.from_bytes(row['sketch']))
+
+        cursor.executemany("""
+            REPLACE INTO stats_sketch_daily (bucket, dimension, sketch) VALUES (%s, %s, %s)
+        """, [(day, dimension, sketch.to_bytes()) for (day, dimension), sketch in daily.items()])
+        cursor.executemany("""
+            REPLACE INTO stats_sketch_totals (dimension, sketch) VALUES (%s, %s)
+        """, [(dimension, sketch.to_bytes()) for dimension, sketch in totals.items()])
+
+    def unique_visitors(self, cursor, start=None, end=None, dimension=''):
+        """Estimated distinct visitors between two dates (inclusive); all time if start is None"""
+        if start is None:
+            cursor.execute("SELECT sketch FROM stats_sketch_totals WHERE dimension = %s", (dimension,))
+        else:
+            cursor.execute("""
+                SELECT sketch FROM stats_sketch_daily
+                WHERE dimension = %s AND bucket >= %s AND bucket <= %s
+            """, (dimension, start, end or start))
+        return HyperLogLog.union((row['sketch'] for row in cursor.fetchall()), SKETCH_PRECISION).count()
+
+    def unique_visitors_by_dimension(self, cursor):
+        """Estimated all-time distinct visitors per page_type"""
+        cursor.execute("SELECT dimension, sketch FROM stats_sketch_totals WHERE dimension != ''")
+        return {row['dimension']: HyperLogLog.from_bytes(row['sketch']).count()
+                for row in cursor.fetchall()}
+
+    def _rollup_granularity(self, cursor, granularity, start, end):
+        table, _, bucket_expr = ROLLUP_TABLES[granularity]
+        rows = []
+        for metric, (source, dimension) in ROLLUP_SOURCES.items():
+            dimension_expr = f"COALESCE({dimension}, 'unknown')" if dimension else "''"
+            group_by = 'bucket, dimension WITH ROLLUP' if dimension else 'bucket'
+            try:
+                cursor.execute(f"""
+                    SELECT {bucket_expr} as bucket, {dimension_expr} as dimension,
+                           COUNT(*) as value
+                    FROM {source}
+                    WHERE created_at >= %s AND created_at < %s
+                    GROUP BY {group_by}
+                """, (start, end))
+            except Exception as e:
+                # Optional tables (e.g. user_activity_logs) may not exist everywhere
+                print(f"Rollup of {metric} from {source} skipped: {e}")
+                continue
+            for row in cursor.fetchall():
+                bucket, dim, value = row['bucket'], row['dimension'], row['value']
+                if bucket is None:
+                    continue  # WITH ROLLUP grand total
+                if dimension and dim is None:
+                    dim = ''  # WITH ROLLUP per-bucket total across dimensions
+                rows.append((bucket, metric, dim, value))
+
+        cursor.execute(f"DELETE FROM {table} WHERE bucket >= %s AND bucket < %s", (start, end))
+        if rows:
+            cursor.executemany(f"""
+                INSERT INTO {table} (bucket, metric, dimension, value)
+                VALUES (%s, %s, %s, %s)
+            """, rows)
+
+    def _refresh_snapshots(self, cursor, now):
+        for name, query in SNAPSHOT_QUERIES.items():
+            try:
+                cursor.execute(query)
+                rows = cursor.fetchall()
+            except Exception as e:
+                print(f"Rollup snapshot {name} skipped: {e}")
+                continue
+            payload = rows[0] if name == 'totals' and rows else rows
+            cursor.execute("""
+                REPLACE INTO stats_rollup_state (name, watermark, payload, updated_at)
+                VALUES (%s, NULL, %s, %s)
+            """, (f'snapshot:{name}', json.dumps(payload, default=str), now))
+
+    def _get_watermark(self, cursor):
+        cursor.execute("SELECT watermark FROM stats_rollup_state WHERE name = 'hourly'")
+        row = cursor.fetchone()
+        return row['watermark'] if row else None
+
+    def _set_watermark(self, cursor, watermark):
+        cursor.execute("""
+            REPLACE INTO stats_rollup_state (name, watermark, payload, updated_at)
+            VALUES ('hourly', %s, NULL, %s)
+        """, (watermark, self.now()))
+
+    def _oldest_row(self, cursor):
+        oldest = None
+        for source, _ in ROLLUP_SOURCES.values():
+            try:
+                cursor.execute(f"SELECT MIN(created_at) as oldest FROM {source}")
+            except Exception:
+                continue
+            value = cursor.fetchone()['oldest']
+            if value is not None and (oldest is None or value < oldest):
+                oldest = value
+        return oldest
+
+    def _locked(self, work):
+        connection = self.get_connection()
+        if connection is None:
+            print("Stats rollup skipped: database unavailable")
+            return False
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, 0) as acquired", (LOCK_NAME,))
+            if not cursor.fetchone()['acquired']:
+                return False
+            try:
+                work(cursor)
+                connection.commit()
+                return True
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _run_forever(self):
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                print(f"Error running stats rollup: {e}")
+            time.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain statistics rollup tables')
+    parser.add_argument('--backfill', action='store_true', help='rebuild rollups from existing history')
+    parser.add_argument('--since', help='backfill start date (YYYY-MM-DD), defaults to the oldest row')
+    args = parser.parse_args()
+
+    from app import stats_rollup
+
+    if args.backfill:
+        since = datetime.strptime(args.since, '%Y-%m-%d') if args.since else None
+        ok = stats_rollup.backfill(since)
+    else:
+        ok = stats_rollup.run()
+    print("✅ Rollup completed" if ok else "⚠️ Rollup not run (database unavailable or another worker holds the lock)")
+
+
+if __name__ == '__main__':
+    main()
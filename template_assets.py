@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Template Assets
+Moves inline <style>/<script> blocks out of the templates into minified, fingerprinted static bundles
+
+使用方法:
+1. 生成全部模板的静态包（部署时必须运行，在 python static_assets.py 之后；应用运行时只读取，未生成时样式/脚本保持内联）: python template_assets.py
+2. 查看各模板被提取的内容大小: python template_assets.py --report
+
+模板中需要保留内联的样式（首屏关键样式）写成 <style data-inline>。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from jinja2 import FileSystemLoader
+
+# Bare <style> / <script> elements; blocks with attributes (src, type, data-inline, ...) are left alone
+INLINE_BLOCK = re.compile(r'<(style|script)>(.*?)</\1>', re.DOTALL | re.IGNORECASE)
+JINJA_SYNTAX = re.compile(r'{{|{%|{#')
+# Smaller blocks cost more as an extra request than they save
+MIN_EXTRACT_SIZE = 512
+# Written under static/dist/ by the build: block digest -> bundle, plus the bundles' encodings
+BUNDLE_MANIFEST = 'bundles/templates.json'
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_STRING = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+CSS_SPACE = re.compile(r'\s+')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(css):
+    """Drops comments and squeezes whitespace outside quoted strings (content: "a , b" is kept)"""
+    css = CSS_COMMENT.sub('', css)
+    parts = []
+    last = 0
+    for match in CSS_STRING.finditer(css):
+        parts.append(_squeeze_css(css[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(_squeeze_css(css[last:]))
+    return ''.join(parts).strip()
+
+
+def _squeeze_css(css):
+    css = CSS_SPACE.sub(' ', css)
+    css = CSS_PUNCTUATION.sub(r'\1', css)
+    return css.replace(';}', '}')
+
+
+def minify_js(js):
+    """Whitespace-only: strips indentation and blank lines outside template literals"""
+    lines = []
+    in_template = False
+    for line in js.splitlines():
+        if in_template:
+            lines.append(line)
+        elif line.strip():
+            lines.append(line.strip())
+        # An odd number of unescaped backticks opens or closes a template literal
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines)
+
+
+MINIFIERS = {'style': (minify_css, '.css'), 'script': (minify_js, '.js')}
+
+
+class TemplateAssets:
+    """Rewrites template source so large inline blocks become links to static bundles
+
+    A <style> block becomes <link rel="stylesheet"> and a <script> block
+    becomes <script src> at the same position, so cascade and execution order
+    are unchanged. Blocks containing Jinja syntax are rendered per request and
+    stay inline, as do blocks with attributes (write <style data-inline> for
+    critical CSS). Bundles are named by the hash of their minified content, so
+    the shared blocks of base.html are one cached file for every page.
+
+    Bundles are only written at build time (build=True, run by
+    python template_assets.py), which also records which block went to which
+    bundle in dist/bundles/templates.json. At runtime load() reads that file
+    and transform() only looks blocks up; a block the build did not see (a
+    template edited without rebuilding) stays inline.
+
+    Args:
+        static_assets: StaticManifest that stores and precompresses the bundles
+        build: Write bundles for new blocks instead of keeping them inline
+    """
+
+    def __init__(self, static_assets, build=False):
+        self.static_assets = static_assets
+        self.build = build
+        self.bundles = {}    # sha256 of a block's tag and body -> bundle path
+        self.stats = {'extracted': 0, 'bytes_extracted': 0, 'kept_inline': 0, 'not_built': 0}
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.static_assets.dist_folder, BUNDLE_MANIFEST)
+
+    def load(self):
+        """Read the bundle map written by the build; returns self"""
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.bundles = manifest['bundles']
+            self.static_assets.encodings.update(manifest['encodings'])
+        except (OSError, ValueError, KeyError):
+            print("Template bundles not built (run: python template_assets.py), keeping blocks inline")
+        return self
+
+    def save(self):
+        """Write the bundle map (atomically, so running workers never read a partial file)"""
+        encodings = {path: self.static_assets.encodings[path]
+                     for path in set(self.bundles.values()) if path in self.static_assets.encodings}
+        data = json.dumps({'bundles': self.bundles, 'encodings': encodings}, indent=2, sort_keys=True)
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.manifest_path), prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, self.manifest_path)
+
+    def transform(self, source):
+        """Template source with extractable blocks replaced by bundle references"""
+        def replace(match):
+            tag, body = match.group(1).lower(), match.group(2)
+            if JINJA_SYNTAX.search(body) or len(body) < MIN_EXTRACT_SIZE:
+                self.stats['kept_inline'] += 1
+                return match.group(0)
+            key = hashlib.sha256(f"{tag}\0{body}".encode('utf-8')).hexdigest()
+            path = self.bundles.get(key)
+            if path is None and self.build:
+                minify, ext = MINIFIERS[tag]
+                path = self.bundles[key] = self.static_assets.add_bundle(minify(body).encode('utf-8'), ext)
+            if path is None:
+                self.stats['not_built'] += 1
+                return match.group(0)
+            self.stats['extracted'] += 1
+            self.stats['bytes_extracted'] += len(body.encode('utf-8'))
+            url = "{{ url_for('static', filename='%s') }}" % path
+            if tag == 'style':
+                return f'<link href="{url}" rel="stylesheet">'
+            return f'<script src="{url}"></script>'
+
+        return INLINE_BLOCK.sub(replace, source)
+
+
+class TemplateAssetLoader(FileSystemLoader):
+    """FileSystemLoader that passes every template through TemplateAssets"""
+
+    def __init__(self, searchpath, template_assets):
+        super().__init__(searchpath)
+        self.template_assets = template_assets
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        return self.template_assets.transform(source), filename, uptodate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract inline template CSS/JS into static bundles')
+    parser.add_argument('--report', action='store_true', help='print per-template sizes before and after')
+    args = parser.parse_args()
+
+    from app import app, static_assets
+
+    loader = app.jinja_loader
+    if not hasattr(loader, 'template_assets'):
+        print("Template asset extraction is disabled (TEMPLATE_ASSETS_ENABLED=False)")
+        return
+    template_assets = TemplateAssets(static_assets, build=True)
+    total_before = total_after = 0
+    for name in sorted(loader.list_templates()):
+        source, filename, _ = FileSystemLoader.get_source(loader, app.jinja_env, name)
+        transformed = template_assets.transform(source)
+        total_before += len(source.encode('utf-8'))
+        total_after += len(transformed.encode('utf-8'))
+        if args.report:
+            print(f"  {name:<48} {len(source.encode('utf-8')):>8} -> {len(transformed.encode('utf-8')):>8} bytes")
+    template_assets.save()
+    stats = template_assets.stats
+    print(f"✅ Extracted {stats['extracted']} blocks; templates {total_before} -> {total_after} bytes "
+          f"({stats['kept_inline']} blocks kept inline)")
+
+
+if __name__ == '__main__':
+    main()
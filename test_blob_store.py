@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+测试内容寻址图片存储: 相同内容只存一份, 引用计数归零后才删除文件(连同迁移前的旧路径)
+"""
+
+import io
+import os
+import time
+
+import blob_store
+from blob_store import BlobStore
+
+
+class RecordingCursor:
+    def __init__(self, rows=(), legacy=()):
+        self.calls = []
+        self.rows = list(rows)
+        self.legacy = list(legacy)
+        self.rowcount = 1
+
+    def execute(self, sql, params=None):
+        self.calls.append((' '.join(sql.split()), params))
+
+    def executemany(self, sql, rows):
+        self.calls.append((' '.join(sql.split()), list(rows)))
+
+    def fetchall(self):
+        return self.legacy if 'FROM image_blob_legacy' in self.calls[-1][0] else self.rows
+
+
+def age(store, path, seconds):
+    full_path = os.path.join(store.root, path)
+    os.utime(full_path, (time.time() - seconds, time.time() - seconds))
+
+
+def test_identical_uploads_share_one_blob(tmp_path):
+    store = BlobStore(str(tmp_path))
+    first, size, existed = store.save(io.BytesIO(b'diagram'), '.PNG')
+    assert (size, existed) == (7, False)
+    assert first.startswith('blobs/') and first.endswith('.png')
+    assert store.digest(first) == first.rsplit('/', 1)[1][:-4]
+
+    second, _, existed = store.save(io.BytesIO(b'diagram'), '.png')
+    assert (second, existed) == (first, True)
+    other, _, _ = store.save(io.BytesIO(b'another diagram'), '.png')
+    assert other != first
+    # Only the two blobs, no temporary files left behind
+    assert sorted(len(names) for _, _, names in os.walk(tmp_path / 'blobs') if names) == [1, 1]
+
+
+def test_link_counts_each_row_once(tmp_path):
+    store = BlobStore(str(tmp_path))
+    path, _, _ = store.save(io.BytesIO(b'diagram'), '.jpg')
+    cursor = RecordingCursor()
+    store.link(cursor, 'resources', 7, [path, path, None, 'resources/2024/01/old.jpg', 'https://x/y.png'])
+    assert [params for _, params in cursor.calls] == [
+        ('resources', 7, store.digest(path)), (store.digest(path), path, 7)]
+
+
+def test_released_blob_is_unlinked_unless_just_uploaded_again(tmp_path):
+    store = BlobStore(str(tmp_path))
+    path, _, _ = store.save(io.BytesIO(b'diagram'), '.jpg')
+    assert store.unlink([path]) == []  # a racing upload may still use it
+    age(store, path, blob_store.UNLINK_GRACE + 1)
+    assert store.unlink([path]) == [path]
+    assert not os.path.exists(os.path.join(store.root, path))
+
+
+def test_gc_removes_unreferenced_blobs_and_their_sized_copies(tmp_path):
+    store = BlobStore(str(tmp_path))
+    used, _, _ = store.save(io.BytesIO(b'used'), '.jpg')
+    orphan, _, _ = store.save(io.BytesIO(b'orphan'), '.jpg')
+    orphan_card = orphan[:-4] + '.card.webp'
+    with open(os.path.join(store.root, orphan_card), 'wb') as f:
+        f.write(b'card')
+    for path in (used, orphan, orphan_card):
+        age(store, path, blob_store.UNLINK_GRACE + 1)
+
+    removed = store.gc(RecordingCursor(rows=[{'sha256': store.digest(used)}]))
+    assert sorted(removed) == sorted([orphan, orphan_card])
+    assert os.path.exists(os.path.join(store.root, used))
+
+
+def test_legacy_paths_are_recorded_and_removed_with_their_blob(tmp_path):
+    store = BlobStore(str(tmp_path))
+    legacy = tmp_path / 'forum_images' / 'old.jpg'
+    legacy.parent.mkdir()
+    legacy.write_bytes(b'diagram')
+    copied = tmp_path / 'resources' / 'copy.jpg'
+    copied.parent.mkdir()
+    copied.write_bytes(b'diagram')
+    (tmp_path / 'resources' / 'other.jpg').write_bytes(b'unrelated')
+    path = store.adopt(str(legacy))
+
+    cursor = RecordingCursor(rows=[{'sha256': store.digest(path), 'bytes': 7}])
+    assert store.record_legacy(cursor) == 2
+    assert sorted(cursor.calls[-1][1]) == [('forum_images/old.jpg', store.digest(path)),
+                                           ('resources/copy.jpg', store.digest(path))]
+
+    for relative in (path, 'forum_images/old.jpg', 'resources/copy.jpg'):
+        age(store, relative, blob_store.UNLINK_GRACE + 1)
+    # Blob no longer used: the legacy files go too, and their rows once the files are gone
+    cursor = RecordingCursor(legacy=[{'path': 'forum_images/old.jpg'}, {'path': 'resources/copy.jpg'}])
+    assert sorted(store.gc(cursor)) == sorted([path, 'forum_images/old.jpg', 'resources/copy.jpg'])
+    assert not legacy.exists() and not copied.exists()
+    assert cursor.calls[-1] == ('DELETE FROM image_blob_legacy WHERE path IN (%s, %s)',
+                                ['forum_images/old.jpg', 'resources/copy.jpg'])
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+测试动态响应压缩: 大文本响应压缩、流式响应逐块输出、已压缩/文件下载响应跳过
+"""
+
+import gzip
+import zlib
+
+from compression import CompressionMiddleware
+
+
+def wsgi_app(chunks, headers):
+    def app(environ, start_response):
+        start_response('200 OK', headers)
+        return iter(chunks)
+    return app
+
+
+def call(middleware, accept_encoding='gzip, deflate'):
+    result = {}
+
+    def start_response(status, headers, exc_info=None):
+        result['headers'] = dict(headers)
+
+    environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept_encoding}
+    result['chunks'] = list(middleware(environ, start_response))
+    return result['headers'], result['chunks']
+
+
+def test_large_html_is_gzipped_with_updated_headers():
+    body = b'<tr><td>row</td></tr>' * 500
+    middleware = CompressionMiddleware(wsgi_app([body], [
+        ('Content-Type', 'text/html; charset=utf-8'), ('Content-Length', str(len(body))),
+        ('ETag', '"v1"'), ('Vary', 'Cookie')]))
+    headers, chunks = call(middleware)
+
+    assert headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in headers
+    assert headers['ETag'] == 'W/"v1"'
+    assert headers['Vary'] == 'Cookie, Accept-Encoding'
+    assert gzip.decompress(b''.join(chunks)) == body
+
+    stats = middleware.stats()
+    assert stats['compressed'] == 1 and stats['bytes_saved'] == len(body) - len(b''.join(chunks))
+
+
+def test_streamed_chunks_are_flushed_as_they_arrive():
+    parts = [b'<p>' + bytes([65 + i]) * 600 + b'</p>' for i in range(4)]
+    middleware = CompressionMiddleware(wsgi_app(parts, [('Content-Type', 'text/html')]))
+    headers, chunks = call(middleware)
+
+    assert headers['Content-Encoding'] == 'gzip'
+    decompressor = zlib.decompressobj(31)
+    # Every part before the last is decodable from the chunks emitted so far
+    seen = b''.join(decompressor.decompress(chunk) for chunk in chunks[:-2])
+    assert seen.startswith(parts[0] + parts[1])
+    assert gzip.decompress(b''.join(chunks)) == b''.join(parts)
+
+
+def test_ineligible_responses_pass_through():
+    big = b'x' * 5000
+    cases = [
+        [('Content-Type', 'text/html'), ('Content-Encoding', 'br')],
+        [('Content-Type', 'text/css'), ('Accept-Ranges', 'bytes')],
+        [('Content-Type', 'image/jpeg')],
+        [('Content-Type', 'text/html'), ('Cache-Control', 'no-transform')],
+    ]
+    for headers in cases:
+        out_headers, chunks = call(CompressionMiddleware(wsgi_app([big], headers)))
+        assert out_headers == dict(headers) and b''.join(chunks) == big
+
+    small = [b'<p>hi</p>', b'<p>there</p>']
+    out_headers, chunks = call(CompressionMiddleware(wsgi_app(small, [('Content-Type', 'text/html')])))
+    assert 'Content-Encoding' not in out_headers and b''.join(chunks) == b''.join(small)
+
+    out_headers, chunks = call(CompressionMiddleware(wsgi_app([big], [('Content-Type', 'text/html')])), 'identity')
+    assert 'Content-Encoding' not in out_headers
+
+
+def test_pass_through_returns_the_app_iterable_itself():
+    file_wrapper = iter([b'\xff\xd8' * 5000])
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'image/jpeg'), ('Accept-Ranges', 'bytes')])
+        return file_wrapper
+
+    sent = {}
+    environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'}
+    middleware = CompressionMiddleware(app)
+    # Headers reach the server before the body is touched, so it can use sendfile
+    assert middleware(environ, lambda status, headers, exc_info=None: sent.update(headers)) is file_wrapper
+    assert sent['Content-Type'] == 'image/jpeg'
+    assert middleware.stats()['skipped'] == 1
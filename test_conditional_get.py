@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+测试动态页面的条件请求: 数据未变时返回 304 且不执行视图, 写入后返回新页面
+"""
+
+import app as stem_app
+from app import app
+from page_cache import PageCache
+
+
+def setup_view(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_view():
+        calls.append(1)
+        return f'<p>render {len(calls)}</p>'
+
+    monkeypatch.setitem(app.view_functions, 'subjects_overview', fake_view)
+    monkeypatch.setattr(stem_app, 'page_cache', PageCache(marker_dir=str(tmp_path)))
+    monkeypatch.setattr(stem_app, 'PAGE_CACHE_ENABLED', False)
+    monkeypatch.setattr(stem_app, 'SHARED_CACHE_ENABLED', False)
+    return calls
+
+
+def test_matching_etag_gets_304_without_rendering(monkeypatch, tmp_path):
+    calls = setup_view(monkeypatch, tmp_path)
+    client = app.test_client()
+
+    first = client.get('/subjects')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    etag = first.headers['ETag']
+
+    second = client.get('/subjects', headers={'If-None-Match': etag})
+    assert second.status_code == 304 and second.headers['ETag'] == etag
+    assert len(calls) == 1
+
+    # A different query string is a different page
+    assert client.get('/subjects?a=1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_write_changes_the_validator(monkeypatch, tmp_path):
+    calls = setup_view(monkeypatch, tmp_path)
+    client = app.test_client()
+    etag = client.get('/subjects').headers['ETag']
+
+    stem_app.page_cache.invalidate('forum')
+    assert client.get('/subjects', headers={'If-None-Match': etag}).status_code == 304
+
+    stem_app.page_cache.invalidate('resources')
+    third = client.get('/subjects', headers={'If-None-Match': etag})
+    assert third.status_code == 200 and third.headers['ETag'] != etag
+    assert len(calls) == 2
+
+
+def test_logged_in_viewer_does_not_reuse_anonymous_page(monkeypatch, tmp_path):
+    setup_view(monkeypatch, tmp_path)
+    monkeypatch.setattr(stem_app, 'session_user_from_snapshot',
+                        lambda user_id: stem_app.User(user_id, 'alice', 'alice@example.com'))
+    client = app.test_client()
+    etag = client.get('/subjects').headers['ETag']
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = 7
+    assert client.get('/subjects', headers={'If-None-Match': etag}).status_code == 200
+
+
+class LikeCursor:
+    """Answers the queries of the like routes for one comment or resource with no likes yet"""
+
+    def __init__(self):
+        self.row = None
+
+    def execute(self, query, params=None):
+        if 'FROM forum_replies WHERE id' in query and 'like_count' not in query:
+            self.row = {'id': params[0], 'post_id': 3}
+        elif 'FROM comment_likes' in query or 'FROM resource_likes' in query:
+            self.row = None
+        elif 'SELECT like_count' in query:
+            self.row = {'like_count': 1}
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class LikeConnection:
+    def cursor(self, *args):
+        return LikeCursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_comment_like_changes_the_post_validator(monkeypatch, tmp_path):
+    monkeypatch.setitem(app.view_functions, 'forum_post_detail', lambda post_id: f'<p>post {post_id}</p>')
+    monkeypatch.setattr(stem_app, 'page_cache', PageCache(marker_dir=str(tmp_path)))
+    monkeypatch.setitem(stem_app.CONDITIONAL_PAGES, 'forum_post_detail',
+                        (('forum',), lambda post_id: {'updated_at': None, 'reply_count': 2}))
+    monkeypatch.setattr(stem_app, 'get_db_connection', LikeConnection)
+    monkeypatch.setattr(stem_app, 'session_user_from_snapshot',
+                        lambda user_id: stem_app.User(user_id, 'alice', 'alice@example.com'))
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 7
+    etag = client.get('/forum/post/3').headers['ETag']
+    assert client.get('/forum/post/3', headers={'If-None-Match': etag}).status_code == 304
+
+    liked = client.post('/forum/comment/11/like')
+    assert liked.get_json() == {'success': True, 'liked': True, 'like_count': 1}
+    after = client.get('/forum/post/3', headers={'If-None-Match': etag})
+    assert after.status_code == 200 and after.headers['ETag'] != etag
+
+
+def test_resource_like_changes_the_resource_validator(monkeypatch, tmp_path):
+    monkeypatch.setitem(app.view_functions, 'view_resource', lambda resource_id: f'<p>resource {resource_id}</p>')
+    monkeypatch.setattr(stem_app, 'page_cache', PageCache(marker_dir=str(tmp_path)))
+    monkeypatch.setitem(stem_app.CONDITIONAL_PAGES, 'view_resource',
+                        (('resources',), lambda resource_id: {'updated_at': None, 'like_count': 4,
+                                                              'download_count': 0}))
+    monkeypatch.setattr(stem_app, 'get_db_connection', LikeConnection)
+    monkeypatch.setattr(stem_app, 'session_user_from_snapshot',
+                        lambda user_id: stem_app.User(user_id, 'alice', 'alice@example.com'))
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 7
+    etag = client.get('/view_resource/5').headers['ETag']
+    assert client.get('/view_resource/5', headers={'If-None-Match': etag}).status_code == 304
+
+    liked = client.post('/like_resource/5')
+    assert liked.get_json() == {'success': True, 'liked': True, 'like_count': 1}
+    after = client.get('/view_resource/5', headers={'If-None-Match': etag})
+    assert after.status_code == 200 and after.headers['ETag'] != etag
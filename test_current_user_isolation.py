@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+测试 current_user 在多线程下的请求隔离
+Concurrent requests must never see each other's identity
+"""
+
+import threading
+
+import app as stem_app
+from app import app, login_user, logout_user, current_user, User, AnonymousUser
+
+THREADS = 16
+
+
+class FakeCursor:
+    """Answers the users lookup in load_logged_in_user from an in-memory table"""
+
+    def __init__(self, users):
+        self.users = users
+        self.row = None
+
+    def execute(self, query, params=None):
+        self.row = self.users.get(params[0]) if params else None
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, users):
+        self.users = users
+        self.open = True
+
+    def cursor(self, *args):
+        return FakeCursor(self.users)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+def run_in_threads(target):
+    """Run target(index) on THREADS threads that all start together; re-raise failures"""
+    barrier = threading.Barrier(THREADS)
+    errors = []
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index, barrier)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+
+
+def test_login_user_is_request_local():
+    """每个请求上下文中的登录用户互不影响"""
+    def target(index, barrier):
+        with app.test_request_context('/'):
+            assert not current_user.is_authenticated
+            login_user(User(index + 1, f'user{index}', f'user{index}@example.com'))
+            # Every thread has logged in before anyone checks
+            barrier.wait()
+            assert current_user.id == index + 1
+            assert current_user.username == f'user{index}'
+
+    run_in_threads(target)
+
+
+def test_logout_does_not_leak_across_requests():
+    """一个请求登出不会影响其他请求的用户"""
+    def target(index, barrier):
+        with app.test_request_context('/'):
+            login_user(User(index + 1, f'user{index}', None))
+            barrier.wait()
+            if index % 2:
+                logout_user()
+            barrier.wait()
+            if index % 2:
+                assert not current_user.is_authenticated
+            else:
+                assert current_user.id == index + 1
+
+    run_in_threads(target)
+
+
+def test_template_context_uses_request_user():
+    """inject_current_user 注入的是当前请求的用户对象"""
+    def target(index, barrier):
+        with app.test_request_context('/'):
+            login_user(User(index + 1, f'user{index}', None))
+            barrier.wait()
+            context = stem_app.inject_current_user()
+            assert context['current_user'].id == index + 1
+
+    run_in_threads(target)
+
+
+def test_session_users_loaded_concurrently():
+    """并发请求通过 session 加载各自的用户"""
+    users = {i + 1: (i + 1, f'user{i}', f'user{i}@example.com', 'student', 'approved')
+             for i in range(THREADS)}
+    original_factory = stem_app.db_pool.factory
+    stem_app.db_pool.factory = lambda: FakeConnection(users)
+    stem_app.db_pool.close_all()
+    try:
+        def target(index, barrier):
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = index + 1
+            with client:
+                response = client.get('/profile')
+                assert response.status_code == 200
+                assert current_user.id == index + 1
+                assert f'user{index}@example.com' in response.get_data(as_text=True)
+
+        run_in_threads(target)
+    finally:
+        stem_app.db_pool.close_all()
+        stem_app.db_pool.factory = original_factory
+
+
+def test_anonymous_outside_request():
+    """请求之外访问 current_user 返回匿名用户"""
+    assert isinstance(stem_app.get_current_user(), AnonymousUser)
+    assert not current_user.is_authenticated
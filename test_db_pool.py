@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试数据库连接池: 连接用尽时按超时报错, 超过 max_lifetime 的连接归还时关闭并重建
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import db_pool
+from db_pool import ConnectionPool, PoolExhausted
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.open = True
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+class Factory:
+    def __init__(self):
+        self.made = []
+
+    def __call__(self):
+        self.made.append(FakeConnection(len(self.made) + 1))
+        return self.made[-1]
+
+
+def test_checkout_times_out_when_the_pool_is_full():
+    factory = Factory()
+    pool = ConnectionPool(factory, max_size=1, checkout_timeout=0.05)
+    held = pool.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(PoolExhausted):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.05
+    assert len(factory.made) == 1
+
+    # A released connection is handed out again instead of a new one
+    pool.release(held)
+    assert pool.acquire() is held
+    assert pool.status()['reused'] == 1
+
+
+def test_connections_are_recycled_after_max_lifetime(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(db_pool, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    factory = Factory()
+    pool = ConnectionPool(factory, max_size=2, max_lifetime=60, ping_after=5)
+
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+
+    # Expired while checked out: closed on release, the next checkout opens a new one
+    now[0] += 61
+    pool.release(first)
+    assert not first.open
+    second = pool.acquire()
+    assert second is not first and second.number == 2
+
+    # Expired while idle: pruned at checkout
+    pool.release(second)
+    now[0] += 61
+    third = pool.acquire()
+    assert not second.open and third.number == 3
+    assert pool.status() == dict(created=3, reused=1, recycled=2, failed_checks=0,
+                                 size=1, idle=0, in_use=1, max_size=2)
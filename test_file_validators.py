@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+测试文件下载的强校验: ETag 随文件内容变化, 未变化时返回 304 且不打开文件
+"""
+
+import os
+
+import app as stem_app
+from app import app
+
+
+def make_upload(tmp_path, monkeypatch, data=b'diagram'):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'static' / 'uploads' / 'forum_images' / 'a.png'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_unchanged_file_is_a_304_without_opening_it(tmp_path, monkeypatch):
+    make_upload(tmp_path, monkeypatch)
+    client = app.test_client()
+
+    first = client.get('/uploads/forum_images/a.png')
+    assert first.status_code == 200 and first.data == b'diagram'
+    etag = first.headers['ETag']
+    assert not etag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'public, no-cache'
+
+    def fail(*args, **kwargs):
+        raise AssertionError('file opened for a 304')
+
+    monkeypatch.setattr(stem_app, 'send_file', fail)
+    for headers in ({'If-None-Match': etag}, {'If-Modified-Since': first.headers['Last-Modified']}):
+        second = client.get('/uploads/forum_images/a.png', headers=headers)
+        assert second.status_code == 304 and second.data == b''
+        assert second.headers['ETag'] == etag
+
+
+def test_replaced_file_gets_a_new_etag(tmp_path, monkeypatch):
+    path = make_upload(tmp_path, monkeypatch)
+    client = app.test_client()
+    etag = client.get('/uploads/forum_images/a.png').headers['ETag']
+
+    path.write_bytes(b'new diagram')
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+    second = client.get('/uploads/forum_images/a.png', headers={'If-None-Match': etag})
+    assert second.status_code == 200 and second.data == b'new diagram'
+    assert second.headers['ETag'] != etag
+
+
+def test_path_traversal_is_rejected(tmp_path, monkeypatch):
+    make_upload(tmp_path, monkeypatch)
+    assert app.test_client().get('/uploads/../../etc/passwd').status_code == 404
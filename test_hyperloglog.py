@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+测试 HyperLogLog 访客估算的误差与合并
+"""
+
+from hyperloglog import HyperLogLog
+
+
+def assert_close(estimate, exact, tolerance=0.05):
+    assert abs(estimate - exact) <= exact * tolerance, (estimate, exact)
+
+
+def test_empty_and_small_counts():
+    assert HyperLogLog().count() == 0
+    assert HyperLogLog().update(['1.2.3.4', '1.2.3.4', 42, 42]).count() == 2
+
+
+def test_estimate_within_error_bound():
+    for n in (1000, 20000, 100000):
+        assert_close(HyperLogLog().update(f'visitor-{i}' for i in range(n)).count(), n)
+
+
+def test_merge_matches_union():
+    monday = HyperLogLog().update(range(0, 30000))
+    tuesday = HyperLogLog().update(range(20000, 50000))
+    assert_close(monday.merge(tuesday).count(), 50000)
+
+
+def test_round_trip_and_union_of_blobs():
+    days = [HyperLogLog().update(range(day * 1000, day * 1000 + 1500)).to_bytes() for day in range(30)]
+    assert_close(HyperLogLog.union(days).count(), 30 * 1000 + 500)
+    restored = HyperLogLog.from_bytes(days[0])
+    assert restored.registers == HyperLogLog.from_bytes(restored.to_bytes()).registers
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试图片缩略图: 各尺寸副本的生成、命名与未生成时回退原图
+"""
+
+from datetime import datetime
+
+from PIL import Image
+
+from image_derivatives import ImageDerivatives, covering_size, derivative_name
+
+
+def test_covering_size_keeps_aspect_ratio_and_never_upscales():
+    assert covering_size((4000, 3000), (800, 600)) == (800, 600)
+    # A wide image keeps the full box height so object-fit: cover has no blur
+    assert covering_size((4000, 1000), (480, 360)) == (1440, 360)
+    assert covering_size((300, 200), (800, 600)) == (300, 200)
+
+
+def test_generate_writes_every_variant_and_format(tmp_path):
+    source_dir = tmp_path / 'uploads' / 'forum_images'
+    source_dir.mkdir(parents=True)
+    Image.new('RGBA', (2000, 1500), (200, 30, 30, 128)).save(source_dir / 'photo.png')
+
+    derivatives = ImageDerivatives(get_connection=lambda: None, image_root=str(tmp_path))
+    assert derivatives.resolve('uploads/forum_images/photo.png', 'card', 'webp') is None
+    assert derivatives.generate('uploads/forum_images/photo.png') == 6
+
+    card = derivatives.resolve('uploads/forum_images/photo.png', 'card', 'jpeg')
+    assert card == derivative_name('uploads/forum_images/photo.png', 'card', 'jpeg') == \
+        'uploads/forum_images/photo.card.jpg'
+    with Image.open(tmp_path / card) as img:
+        assert (img.format, img.mode, img.size) == ('JPEG', 'RGB', (480, 360))
+    with Image.open(tmp_path / 'uploads/forum_images/photo.thumb.webp') as img:
+        assert (img.format, img.size) == ('WEBP', (160, 120))
+
+
+def test_animated_images_are_left_alone(tmp_path):
+    frames = [Image.new('RGB', (50, 50), color) for color in ('red', 'blue')]
+    frames[0].save(tmp_path / 'anim.gif', save_all=True, append_images=frames[1:])
+
+    derivatives = ImageDerivatives(get_connection=lambda: None, image_root=str(tmp_path))
+    assert derivatives.generate('anim.gif') == 0
+    assert derivatives.resolve('anim.gif', 'thumb', 'jpeg') is None
+
+
+class TableConnection:
+    """Answers the image_derivatives queries of refresh() from a list of rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, *args):
+        return self
+
+    def execute(self, query, params=None):
+        self.result = [row for row in self.rows if not params or row['created_at'] >= params[0]]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+def test_full_reload_drops_rows_deleted_by_other_workers():
+    rows = [{'source_path': source, 'variant': 'thumb', 'format': 'jpeg', 'path': f'{source}.thumb.jpg',
+             'created_at': datetime(2025, 1, 1, 12, minute)} for minute, source in enumerate(('a.png', 'b.png'))]
+    derivatives = ImageDerivatives(get_connection=lambda: TableConnection(rows), image_root='/unused')
+    assert derivatives.refresh() == 2
+
+    del rows[0]
+    # An incremental refresh only sees new rows, so the deleted one is still resolved
+    derivatives.refresh()
+    assert derivatives.resolve('a.png', 'thumb', 'jpeg') == 'a.png.thumb.jpg'
+
+    derivatives.refresh(full=True)
+    assert derivatives.resolve('a.png', 'thumb', 'jpeg') is None
+    assert derivatives.resolve('b.png', 'thumb', 'jpeg') == 'b.png.thumb.jpg'
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+测试图片路径索引: 并行扫描、旧路径别名、未命中缓存与保存/删除后的更新
+"""
+
+import os
+
+import pytest
+
+from image_index import ImageIndex
+
+
+@pytest.fixture
+def image_root(tmp_path):
+    for path in ('uploads/forum_images/2025/08/a.jpg', 'forum_images/old.png',
+                 'resources/cover.jpg', 'resources/2025/08/new.jpg', '.variants/ab/cd/x.webp'):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_bytes(b'img')
+    return tmp_path
+
+
+def test_build_indexes_every_file_except_the_variant_cache(image_root):
+    index = ImageIndex(str(image_root), workers=4)
+    assert index.build() == 4
+    assert index.resolve('uploads/forum_images/2025/08/a.jpg') == 'uploads/forum_images/2025/08/a.jpg'
+    assert index.status()['probes'] == 0
+
+
+def test_legacy_aliases_resolve_to_the_stored_file(image_root):
+    index = ImageIndex(str(image_root))
+    index.build()
+    assert index.resolve('old.png') == 'forum_images/old.png'
+    assert index.resolve('resources/2024/01/cover.jpg') == 'resources/cover.jpg'
+    assert index.resolve('../etc/passwd') is None
+    assert index.status()['probes'] == 0
+
+
+def test_misses_are_remembered_until_a_file_is_added(image_root):
+    index = ImageIndex(str(image_root))
+    index.build()
+    assert index.resolve('uploads/forum_images/2025/08/b.jpg') is None
+    assert index.resolve('uploads/forum_images/2025/08/b.jpg') is None
+    assert (index.stats['probes'], index.stats['negative_hits']) == (1, 1)
+
+    (image_root / 'uploads/forum_images/2025/08/b.jpg').write_bytes(b'img')
+    index.add('uploads/forum_images/2025/08/b.jpg')
+    assert index.resolve('uploads/forum_images/2025/08/b.jpg') == 'uploads/forum_images/2025/08/b.jpg'
+
+
+def test_files_written_by_other_workers_are_found_by_one_probe(image_root):
+    index = ImageIndex(str(image_root))
+    index.build()
+    (image_root / 'resources/2025/08/other.jpg').write_bytes(b'img')
+    assert index.resolve('resources/2025/08/other.jpg') == 'resources/2025/08/other.jpg'
+    assert index.resolve('resources/2025/08/other.jpg') == 'resources/2025/08/other.jpg'
+    assert index.stats['probes'] == 1
+
+    os.remove(image_root / 'resources/2025/08/other.jpg')
+    index.discard('resources/2025/08/other.jpg')
+    assert index.resolve('resources/2025/08/other.jpg') is None
+
+
+def test_indexed_file_deleted_elsewhere_is_a_404_and_leaves_the_index(monkeypatch):
+    import app as stem_app
+
+    discarded = []
+    monkeypatch.setattr(stem_app.image_index, 'resolve', lambda filename: 'forum_images/gone.jpg')
+    monkeypatch.setattr(stem_app.image_index, 'discard', discarded.append)
+    response = stem_app.app.test_client().get('/image/gone.jpg')
+    assert response.status_code == 404 and response.data == b'Image not found'
+    assert discarded == ['forum_images/gone.jpg']
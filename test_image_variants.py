@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+测试按需缩放图片缓存: 白名单尺寸、磁盘命中、并发未命中合并与LRU淘汰
+"""
+
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import image_variants
+from image_variants import VariantCache
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    Image.new('RGB', (1600, 1200), (20, 120, 200)).save(path)
+    return str(path)
+
+
+def test_resizes_once_then_serves_from_disk(tmp_path, source):
+    cache = VariantCache(str(tmp_path / 'variants'))
+    path = cache.get(source, 480, 'webp')
+    with Image.open(path) as img:
+        assert (img.format, img.size) == ('WEBP', (480, 360))
+    assert os.path.relpath(path, cache.cache_dir).count(os.sep) == 2  # two shard levels
+    assert cache.get(source, 480, 'webp') == path
+    assert (cache.stats['misses'], cache.stats['hits']) == (1, 1)
+
+
+def test_only_allowlisted_variants(tmp_path, source):
+    cache = VariantCache(str(tmp_path / 'variants'), widths=(320,))
+    with pytest.raises(ValueError):
+        cache.get(source, 321, 'webp')
+    with pytest.raises(ValueError):
+        cache.get(source, 320, 'gif')
+
+
+def test_concurrent_misses_share_one_resize(tmp_path, source, monkeypatch):
+    cache = VariantCache(str(tmp_path / 'variants'))
+    render = cache._render
+    renders = []
+
+    def slow_render(*args):
+        renders.append(args)
+        time.sleep(0.2)
+        return render(*args)
+
+    monkeypatch.setattr(cache, '_render', slow_render)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(source, 320, 'jpeg'))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(renders) == 1
+    assert len(set(results)) == 1 and cache.stats['collapsed'] == 4
+
+
+def test_eviction_drops_least_recently_used(tmp_path, source, monkeypatch):
+    cache = VariantCache(str(tmp_path / 'variants'))
+    old = cache.get(source, 1600, 'png')
+    recent = cache.get(source, 160, 'jpeg')
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    monkeypatch.setattr(cache, 'max_bytes', int(os.path.getsize(recent) / image_variants.EVICT_TO) + 1)
+    assert cache.evict() == 1
+    assert not os.path.exists(old) and os.path.exists(recent)
+
+
+def test_replaced_source_gets_a_new_variant(tmp_path, source):
+    cache = VariantCache(str(tmp_path / 'variants'))
+    first = cache.get(source, 320, 'jpeg')
+    Image.new('RGB', (800, 800), (0, 0, 0)).save(source)
+    os.utime(source, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    assert cache.get(source, 320, 'jpeg') != first
+
+
+def test_animated_sources_get_no_variant(tmp_path, monkeypatch):
+    frames = [Image.new('RGB', (800, 600), color) for color in ('red', 'blue')]
+    frames[0].save(tmp_path / 'anim.gif', save_all=True, append_images=frames[1:])
+    cache = VariantCache(str(tmp_path / 'variants'))
+
+    assert cache.get(str(tmp_path / 'anim.gif'), 320, 'webp') is None
+    assert not os.path.exists(cache.cache_dir)
+    # Remembered, so later requests do not decode the source again
+    monkeypatch.setattr(cache, '_render', lambda *args: pytest.fail('animated source decoded twice'))
+    assert cache.get(str(tmp_path / 'anim.gif'), 480, 'jpeg') is None
+    assert cache.stats['animated'] == 1
+
+
+def test_variant_cache_is_not_served_as_an_image(monkeypatch):
+    import app as stem_app
+
+    monkeypatch.setattr(stem_app.image_index, 'resolve', lambda filename: pytest.fail('dot path resolved'))
+    client = stem_app.app.test_client()
+    assert client.get('/image/.variants/ab/cd/abcd.webp').status_code == 404
+    assert client.get('/image/blobs/.tmp-upload').status_code == 404
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试 keyset 分页: 逐页前进/后退应与完整排序结果一致
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import keyset
+
+
+class SqliteCursor:
+    """Runs the generated MySQL-style SQL against an in-memory SQLite table"""
+
+    def __init__(self, rows):
+        self.db = sqlite3.connect(':memory:')
+        self.db.execute('CREATE TABLE resources (id INTEGER, category TEXT, view_count INTEGER, created_at TEXT)')
+        self.db.executemany('INSERT INTO resources VALUES (?, ?, ?, ?)',
+                            [(r['id'], r['category'], r['view_count'], str(r['created_at'])) for r in rows])
+        self.result = []
+
+    def execute(self, sql, params):
+        params = [str(p) if isinstance(p, datetime) else p for p in params]
+        cur = self.db.execute(sql.replace('%s', '?'), params)
+        names = [d[0] for d in cur.description]
+        self.result = [dict(zip(names, row)) for row in cur.fetchall()]
+        for row in self.result:
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+
+    def fetchall(self):
+        return self.result
+
+
+def make_rows(n=103):
+    base = datetime(2025, 1, 1, 8, 0, 0)
+    # Few distinct view counts and timestamps so ties exercise every key column
+    return [{'id': i, 'category': 'ABC'[i % 3], 'view_count': i % 7,
+             'created_at': base + timedelta(hours=i % 11)} for i in range(1, n + 1)]
+
+
+def expected_order(rows, ordering):
+    result = list(rows)
+    for column, descending in reversed(keyset.ORDERINGS[ordering]):
+        result.sort(key=lambda r: r[column], reverse=descending)
+    return [r['id'] for r in result]
+
+
+def walk(ordering, limit=10):
+    rows = make_rows()
+    cursor = SqliteCursor(rows)
+    query = 'SELECT r.id, r.category, r.view_count, r.created_at FROM resources r WHERE 1 = 1'
+
+    pages = [keyset.fetch_page(cursor, query, [], ordering, alias='r', limit=limit)]
+    while pages[-1].has_next:
+        pages.append(keyset.fetch_page(cursor, query, [], ordering, alias='r',
+                                       after=pages[-1].next_cursor, limit=limit))
+    forward = [r['id'] for page in pages for r in page]
+    assert forward == expected_order(rows, ordering)
+    assert not pages[0].has_prev
+
+    # Walking back from the last page reproduces every earlier page
+    page = pages[-1]
+    for earlier in reversed(pages[:-1]):
+        page = keyset.fetch_page(cursor, query, [], ordering, alias='r', before=page.prev_cursor, limit=limit)
+        assert [r['id'] for r in page] == [r['id'] for r in earlier]
+    assert not page.has_prev
+
+
+def test_popular_ordering():
+    walk('popular')
+
+
+def test_recent_ordering():
+    walk('recent', limit=7)
+
+
+def test_mixed_direction_ordering():
+    walk('category_popular', limit=9)
+
+
+def test_invalid_cursor_falls_back_to_first_page():
+    cursor = SqliteCursor(make_rows(5))
+    query = 'SELECT r.id, r.category, r.view_count, r.created_at FROM resources r WHERE 1 = 1'
+    first = keyset.fetch_page(cursor, query, [], 'recent', alias='r', limit=2)
+    foreign = keyset.encode_cursor('popular', {'id': 1, 'view_count': 1, 'created_at': datetime(2025, 1, 1)})
+    for token in ('not-a-cursor', foreign, ''):
+        page = keyset.fetch_page(cursor, query, [], 'recent', alias='r', after=token, limit=2)
+        assert [r['id'] for r in page] == [r['id'] for r in first]
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+测试匿名整页缓存: LRU 内存上限、TTL、标签失效以及登录/闪现消息绕过
+"""
+
+import time
+
+import app as stem_app
+from app import app
+from page_cache import PageCache, TaggedValue
+
+
+def test_lru_budget_and_ttl():
+    cache = PageCache(max_bytes=4000)
+    for i in range(10):
+        cache.put(f'/p{i}', 200, [], b'x' * 500, 60, ('t',), cache.clock())
+    assert cache.status()['bytes'] <= 4000
+    assert cache.get('/p0') is None and cache.get('/p9') is not None
+
+    cache.put('/short', 200, [], b'y', 0.01, ('t',), cache.clock())
+    time.sleep(0.02)
+    assert cache.get('/short') is None
+
+
+def test_invalidation_drops_entries_and_blocks_stale_renders(tmp_path):
+    cache = PageCache(marker_dir=str(tmp_path))
+    other_worker = PageCache(marker_dir=str(tmp_path))
+    started = cache.clock()
+    other_worker.put('/forum', 200, [], b'old', 60, ('forum',), started)
+    cache.put('/subjects', 200, [], b'res', 60, ('resources',), started)
+
+    cache.invalidate('forum')
+    # The marker file reaches the other worker's copy
+    assert other_worker.get('/forum') is None
+    assert cache.get('/subjects') is not None
+    # A render that began before the invalidation is not stored
+    assert not cache.put('/forum', 200, [], b'old', 60, ('forum',), started)
+
+
+def test_anonymous_requests_served_from_cache(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_view():
+        calls.append(1)
+        return f'<p>render {len(calls)}</p>'
+
+    monkeypatch.setitem(app.view_functions, 'subjects_overview', fake_view)
+    monkeypatch.setattr(stem_app, 'page_cache', PageCache(marker_dir=str(tmp_path)))
+    client = app.test_client()
+
+    first = client.get('/subjects?b=2&a=1&utm_source=x')
+    second = client.get('/subjects?a=1&b=2')
+    assert first.headers['X-Page-Cache'] == 'MISS'
+    assert second.headers['X-Page-Cache'] == 'HIT'
+    assert second.data == first.data and len(calls) == 1
+
+    stem_app.page_cache.invalidate('resources')
+    assert client.get('/subjects?a=1&b=2').headers['X-Page-Cache'] == 'MISS'
+    assert len(calls) == 2
+
+
+def test_logged_in_and_flashed_requests_bypass_cache(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_view():
+        calls.append(1)
+        return '<p>page</p>'
+
+    monkeypatch.setitem(app.view_functions, 'subjects_overview', fake_view)
+    monkeypatch.setattr(stem_app, 'page_cache', PageCache(marker_dir=str(tmp_path)))
+    monkeypatch.setattr(stem_app, 'session_user_from_snapshot',
+                        lambda user_id: stem_app.User(user_id, 'alice', 'alice@example.com'))
+    client = app.test_client()
+    client.get('/subjects')
+
+    with client.session_transaction() as sess:
+        sess['_flashes'] = [('info', 'hello')]
+    assert 'X-Page-Cache' not in client.get('/subjects').headers
+
+    with client.session_transaction() as sess:
+        sess.clear()
+        sess['user_id'] = 7
+    assert 'X-Page-Cache' not in client.get('/subjects').headers
+    assert len(calls) == 3
+
+
+def test_tagged_value_reloads_after_invalidation(tmp_path):
+    cache = PageCache(marker_dir=str(tmp_path))
+    loads = []
+    value = TaggedValue(cache, lambda: loads.append(1) or len(loads), 60, ('resources',))
+    assert value.get() == 1 and value.get() == 1
+    cache.invalidate('forum')
+    assert value.get() == 1
+    cache.invalidate('resources')
+    time.sleep(0.06)  # past the marker slack, so the reload is final
+    assert value.get() == 2 and value.get() == 2
+
+
+def test_anonymous_listing_is_shared_cacheable(monkeypatch, tmp_path):
+    monkeypatch.setitem(app.view_functions, 'subjects_overview', lambda: '<p>page</p>')
+    monkeypatch.setattr(stem_app, 'page_cache', PageCache(marker_dir=str(tmp_path)))
+    monkeypatch.setattr(stem_app, 'session_user_from_snapshot',
+                        lambda user_id: stem_app.User(user_id, 'alice', 'alice@example.com'))
+    client = app.test_client()
+
+    for _ in range(2):  # the render and the cache hit
+        response = client.get('/subjects')
+        assert response.headers['Cache-Control'].startswith('public, max-age=0, s-maxage=300')
+        assert 'Cookie' in response.headers['Vary']
+        assert response.headers['Surrogate-Key'] == 'resources'
+        assert 'Set-Cookie' not in response.headers
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = 7
+    assert client.get('/subjects').headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_pages_that_count_views_stay_out_of_the_shared_cache(monkeypatch, tmp_path):
+    tracked = []
+    monkeypatch.setitem(app.view_functions, 'forum', lambda: '<p>forum</p>')
+    monkeypatch.setattr(stem_app, 'page_cache', PageCache(marker_dir=str(tmp_path)))
+    monkeypatch.setattr(stem_app, 'track_page_view', lambda *args: tracked.append(args))
+    monkeypatch.setattr(stem_app, 'CONDITIONAL_GET_ENABLED', False)
+    client = app.test_client()
+
+    client.get('/forum')
+    hit = client.get('/forum')
+    # A proxy hit would never reach track_page_view, so only the app caches the page
+    assert hit.headers['X-Page-Cache'] == 'HIT'
+    assert 's-maxage' not in hit.headers['Cache-Control'] and 'Surrogate-Key' not in hit.headers
+    assert tracked == [('forum', None, None)]
+
+
+def test_write_routes_purge_the_proxy(monkeypatch, tmp_path):
+    purged = []
+    monkeypatch.setattr(stem_app, 'page_cache', PageCache(marker_dir=str(tmp_path)))
+    monkeypatch.setattr(stem_app.proxy_purger, 'purge', lambda *tags: purged.append(tags))
+
+    write = stem_app.invalidates_pages('forum')(lambda: 'ok')
+    with app.test_request_context('/forum/create-post', method='POST'):
+        write()
+    with app.test_request_context('/forum/create-post', method='GET'):
+        write()
+    assert purged == [('forum',)]
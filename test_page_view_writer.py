@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+测试访问记录批量写入: 队列满时丢弃并计数, 排空时按 batch_size 分批 executemany
+"""
+
+from page_view_writer import PageViewWriter
+
+
+class RecordingCursor:
+    def __init__(self, batches):
+        self.batches = batches
+
+    def executemany(self, sql, rows):
+        assert sql.startswith('INSERT INTO page_views (page_type, page_id,')
+        self.batches.append(list(rows))
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, batches):
+        self.batches = batches
+        self.commits = 0
+        self.closed = 0
+
+    def cursor(self):
+        return RecordingCursor(self.batches)
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        self.closed += 1
+
+
+def row(n):
+    return ('forum', n, None, '127.0.0.1', 'pytest', None, None, None)
+
+
+def test_full_queue_drops_rows_and_drain_writes_batches(monkeypatch):
+    batches = []
+    connection = RecordingConnection(batches)
+    writer = PageViewWriter(lambda: connection, max_queue=5, batch_size=2)
+    # No flusher thread: rows stay queued until stop() drains them inline
+    monkeypatch.setattr(writer, '_ensure_started', lambda: None)
+
+    results = [writer.record(row(n)) for n in range(7)]
+    assert results == [True] * 5 + [False] * 2
+    assert writer.stats() == dict(queued=5, written=0, dropped=2, failed=0, batches=0, pending=5)
+
+    writer.stop()
+    assert batches == [[row(0), row(1)], [row(2), row(3)], [row(4)]]
+    assert connection.commits == 3 and connection.closed == 3
+    assert writer.stats() == dict(queued=5, written=5, dropped=2, failed=0, batches=3, pending=0)
+
+
+def test_failed_batch_is_counted_not_raised(monkeypatch):
+    writer = PageViewWriter(lambda: None, batch_size=10)
+    monkeypatch.setattr(writer, '_ensure_started', lambda: None)
+    writer.record(row(1))
+    writer.record(row(2))
+
+    writer.stop()
+    assert writer.stats()['failed'] == 2 and writer.stats()['written'] == 0
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试站点计数: 写入路径产生的增量应与重新统计的结果一致, 计数表未填充时直接统计且不在请求内对账
+"""
+
+import pymysql
+import pytest
+
+from site_counters import SiteCounters
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, params):
+        self.calls.append(params)
+
+
+def applied(action, *args, **kwargs):
+    counters = SiteCounters(get_connection=None)
+    cursor = RecordingCursor()
+    getattr(counters, action)(cursor, *args, **kwargs)
+    if not cursor.calls:
+        return {}
+    params = cursor.calls[0]
+    return dict(zip(params[::2], params[1::2]))
+
+
+def test_new_post_counts_as_visible():
+    deltas = applied('row_inserted', 'forum_posts', status='active', approval_status='approved', category='books')
+    assert deltas == {'posts': 1, 'posts.status.active': 1, 'posts.approval.approved': 1,
+                      'posts.visible': 1, 'posts.visible.category.books': 1}
+
+
+def test_rejecting_a_post_moves_it_between_counters():
+    before = {'status': 'active', 'approval_status': 'approved', 'category': 'homework'}
+    deltas = applied('row_updated', 'forum_posts', before, approval_status='rejected')
+    assert deltas == {'posts.approval.approved': -1, 'posts.approval.rejected': 1,
+                      'posts.visible': -1, 'posts.visible.category.homework': -1}
+
+
+def test_unchanged_or_missing_rows_write_nothing():
+    assert applied('row_updated', 'resources', {'status': 'active'}, status='active') == {}
+    assert applied('row_updated', 'users', None, registration_status='approved') == {}
+    assert applied('row_deleted', 'resources', None) == {}
+    assert applied('row_deleted', 'users', {'registration_status': 'pending'}) == {
+        'users': -1, 'users.status.pending': -1}
+
+
+class SourceCursor:
+    """Answers the counter and GROUP BY queries; the site_counters table may be missing"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append(' '.join(sql.split()))
+        if 'site_counters' in sql:
+            if self.connection.counters is None:
+                raise pymysql.err.ProgrammingError(1146, "Table 'site_counters' doesn't exist")
+            self.rows = [{'name': name, 'value': value} for name, value in self.connection.counters.items()]
+        elif 'FROM forum_posts' in sql:
+            self.rows = [
+                {'status': 'active', 'approval_status': 'approved', 'category': 'books', 'count': 3},
+                {'status': 'active', 'approval_status': 'pending', 'category': 'books', 'count': 2},
+            ]
+        else:
+            self.rows = []
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class SourceConnection:
+    def __init__(self, counters=None):
+        self.counters = counters
+        self.statements = []
+        self.ended = []
+
+    def cursor(self, cursor_class=None):
+        return SourceCursor(self)
+
+    def commit(self):
+        self.ended.append('commit')
+
+    def rollback(self):
+        self.ended.append('rollback')
+
+    def close(self):
+        pass
+
+
+def test_unfilled_table_is_counted_live_without_reconciling():
+    request_connection = SourceConnection()
+    counters = SiteCounters(get_connection=lambda: pytest.fail('reconciled inside the request'))
+    cursor = request_connection.cursor()
+
+    assert counters.get(cursor, 'posts.visible', 'posts') == {'posts.visible': 3, 'posts': 5}
+    assert counters.with_prefix(cursor, 'posts.visible.category.') == {'books': 3}
+    # Only reads: no locks, and the caller's transaction is left alone
+    assert request_connection.ended == []
+    assert not any('FOR UPDATE' in sql for sql in request_connection.statements)
+    assert [sql for sql in request_connection.statements if 'GROUP BY' in sql] == [
+        'SELECT status, approval_status, category, COUNT(*) as count FROM forum_posts '
+        'GROUP BY status, approval_status, category'] * 2
+
+
+def test_reconcile_without_the_table_creates_nothing():
+    connection = SourceConnection()
+    counters = SiteCounters(get_connection=lambda: connection)
+
+    assert counters.reconcile() == 0
+    assert not any('CREATE' in sql for sql in connection.statements)
+    assert connection.ended == []
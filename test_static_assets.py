@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+测试静态资源指纹: 内容哈希文件名、CSS 内引用改写以及清单复用
+"""
+
+import os
+
+from static_assets import StaticManifest
+
+
+def write(root, path, data):
+    full_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'w') as f:
+        f.write(data)
+
+
+def test_build_hashes_files_and_rewrites_css_references(tmp_path):
+    root = str(tmp_path)
+    write(root, 'webfonts/icons.woff2', 'font-bytes')
+    write(root, 'css/icons.css', '@font-face{src:url(../webfonts/icons.woff2) format("woff2"),'
+                                 'url("../webfonts/missing.ttf?v=1")}a{background:url(data:image/png;base64,xx)}')
+    write(root, 'uploads/photo.jpg', 'user content')
+
+    files = StaticManifest(root).build()
+    assert set(files) == {'webfonts/icons.woff2', 'css/icons.css'}
+    font = files['webfonts/icons.woff2']
+    assert font.startswith('dist/webfonts/icons.') and font.endswith('.woff2')
+
+    with open(os.path.join(root, files['css/icons.css'])) as f:
+        css = f.read()
+    assert f"url(../{font[len('dist/'):]})" in css
+    assert 'url("../../webfonts/missing.ttf?v=1")' in css
+    assert 'url(data:image/png;base64,xx)' in css
+
+
+def test_manifest_reused_until_an_asset_changes(tmp_path):
+    root = str(tmp_path)
+    write(root, 'js/app.js', 'one')
+    first = StaticManifest(root).load_or_build()
+    again = StaticManifest(root).load_or_build()
+    assert again.files == first.files and again.version == first.version
+    assert again.url('js/app.js') != 'js/app.js' and again.url('img/logo.png') == 'img/logo.png'
+
+    write(root, 'js/app.js', 'two')
+    changed = StaticManifest(root).load_or_build()
+    assert changed.url('js/app.js') != first.url('js/app.js')
+    # The old copy stays for pages that still reference it
+    assert os.path.exists(os.path.join(root, first.url('js/app.js')))
+
+
+def test_precompressed_siblings_are_negotiated(tmp_path):
+    from werkzeug.datastructures import Accept
+
+    root = str(tmp_path)
+    write(root, 'css/site.css', 'body { color: red; }\n' * 200)
+    write(root, 'css/tiny.css', 'a{}')
+    manifest = StaticManifest(root)
+    manifest.build()
+    hashed = manifest.url('css/site.css')
+
+    assert 'gzip' in manifest.encodings[hashed]
+    assert os.path.exists(os.path.join(root, hashed + '.gz'))
+    assert manifest.url('css/tiny.css') not in manifest.encodings
+
+    assert manifest.negotiate(hashed, Accept([('gzip', 1)])) == ('gzip', hashed + '.gz')
+    assert manifest.negotiate(hashed, Accept([('gzip', 0)])) == (None, hashed)
+    assert manifest.negotiate(hashed, Accept([])) == (None, hashed)
+
+
+def test_unhashed_siblings_are_written_under_dist(tmp_path):
+    from werkzeug.datastructures import Accept
+
+    root = str(tmp_path)
+    write(root, 'js/site.js', 'console.log("hello");\n' * 200)
+    manifest = StaticManifest(root)
+    manifest.build()
+
+    assert sorted(os.listdir(os.path.join(root, 'js'))) == ['site.js']
+    assert manifest.negotiate('js/site.js', Accept([('gzip', 1)])) == ('gzip', 'dist/js/site.js.gz')
+    assert os.path.exists(os.path.join(root, 'dist/js/site.js.gz'))
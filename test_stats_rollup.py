@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+测试统计汇总: 增量运行只重算水位线之后的小时桶及其所在的整天桶, WITH ROLLUP 小计写为空维度
+"""
+
+from datetime import datetime
+
+from stats_rollup import StatsRollup
+
+
+class RollupCursor:
+    def __init__(self, watermark, views):
+        self.watermark = watermark
+        self.views = views
+        self.deletes = {}
+        self.inserts = {}
+        self.selected = {}
+        self.result = []
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self.result = []
+        if 'GET_LOCK' in sql:
+            self.result = [{'acquired': 1}]
+        elif sql.startswith('SELECT watermark'):
+            self.result = [{'watermark': self.watermark}]
+        elif sql.startswith('DELETE FROM'):
+            self.deletes[sql.split()[2]] = params
+        elif 'COUNT(*) as value' in sql and 'FROM page_views' in sql:
+            granularity = 'hourly' if 'DATE_FORMAT' in sql else 'daily'
+            self.selected[granularity] = params
+            self.result = self.views[granularity]
+        elif "VALUES ('hourly'" in sql:
+            self.watermark = params[0]
+
+    def executemany(self, sql, rows):
+        self.inserts[' '.join(sql.split()).split()[2]] = list(rows)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class RollupConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, cursor_class=None):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_run_rebuilds_hours_since_the_watermark_and_their_days():
+    views = {
+        'hourly': [
+            {'bucket': datetime(2025, 3, 9, 23), 'dimension': 'forum', 'value': 4},
+            {'bucket': datetime(2025, 3, 9, 23), 'dimension': None, 'value': 5},
+            {'bucket': datetime(2025, 3, 10, 0), 'dimension': 'resource', 'value': 2},
+            {'bucket': None, 'dimension': None, 'value': 7},
+        ],
+        'daily': [{'bucket': datetime(2025, 3, 10).date(), 'dimension': None, 'value': 2}],
+    }
+    cursor = RollupCursor(datetime(2025, 3, 9, 23), views)
+    now = datetime(2025, 3, 10, 0, 20)
+    rollup = StatsRollup(lambda: RollupConnection(cursor), now=lambda: now)
+
+    assert rollup.run() is True
+    # One hour of grace before the watermark, up to the end of the current hour
+    hours = (datetime(2025, 3, 9, 22), datetime(2025, 3, 10, 1))
+    assert cursor.selected['hourly'] == hours
+    assert cursor.deletes['stats_rollup_hourly'] == hours
+    # ...and every whole day those hours touch
+    days = (datetime(2025, 3, 9), datetime(2025, 3, 11))
+    assert cursor.selected['daily'] == days
+    assert cursor.deletes['stats_rollup_daily'] == days
+
+    # WITH ROLLUP rows: per-bucket totals get an empty dimension, the grand total is dropped
+    assert cursor.inserts['stats_rollup_hourly'] == [
+        (datetime(2025, 3, 9, 23), 'views', 'forum', 4),
+        (datetime(2025, 3, 9, 23), 'views', '', 5),
+        (datetime(2025, 3, 10, 0), 'views', 'resource', 2),
+    ]
+    assert cursor.inserts['stats_rollup_daily'] == [(datetime(2025, 3, 10).date(), 'views', '', 2)]
+    assert cursor.watermark == datetime(2025, 3, 10, 0)
+
+
+def test_first_run_without_a_watermark_covers_the_current_day():
+    cursor = RollupCursor(None, {'hourly': [], 'daily': []})
+    now = datetime(2025, 3, 10, 15, 5)
+    rollup = StatsRollup(lambda: RollupConnection(cursor), now=lambda: now)
+
+    assert rollup.run() is True
+    assert cursor.selected['hourly'] == (datetime(2025, 3, 9, 23), datetime(2025, 3, 10, 16))
+    assert cursor.selected['daily'] == (datetime(2025, 3, 9), datetime(2025, 3, 11))
+    assert 'stats_rollup_hourly' not in cursor.inserts
+    assert cursor.watermark == datetime(2025, 3, 10, 15)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+测试模板内联样式/脚本提取: 大块静态内容转为静态包引用, 含 Jinja 语法或标记为内联的保留
+"""
+
+import os
+
+from static_assets import StaticManifest
+from template_assets import TemplateAssets, minify_css, minify_js
+
+BIG_CSS = '.card {\n    color: red;   /* note */\n}\n' * 40
+BIG_JS = 'function hello() {\n    console.log("hi");\n}\n' * 30
+
+
+def test_static_blocks_become_bundles(tmp_path):
+    assets = TemplateAssets(StaticManifest(str(tmp_path)), build=True)
+    source = (f'<style data-inline>body {{ margin: 0; }}</style>\n<style>{BIG_CSS}</style>\n'
+              f'<script>{BIG_JS}</script>\n<script>var postId = {{{{ post.id }}}};{BIG_JS}</script>\n'
+              '<script>tiny();</script>')
+    result = assets.transform(source)
+
+    assert '<style data-inline>body { margin: 0; }</style>' in result
+    assert 'var postId = {{ post.id }};' in result and '<script>tiny();</script>' in result
+    assert BIG_CSS not in result
+    css_ref = result.split('<link href="')[1].split('"')[0]
+    bundle = css_ref.split("filename='")[1].split("'")[0]
+    assert bundle.startswith('dist/bundles/') and bundle.endswith('.css')
+    with open(os.path.join(str(tmp_path), bundle)) as f:
+        assert f.read() == minify_css(BIG_CSS)
+    assert assets.stats['extracted'] == 2 and assets.stats['kept_inline'] == 2
+
+    # Identical blocks in other templates share the bundle
+    assert assets.transform(f'<style>{BIG_CSS}</style>') == f'<link href="{css_ref}" rel="stylesheet">'
+
+
+def test_runtime_only_reads_what_the_build_wrote(tmp_path):
+    source = f'<style>{BIG_CSS}</style>'
+    built = TemplateAssets(StaticManifest(str(tmp_path)), build=True)
+    expected = built.transform(source)
+    built.save()
+
+    runtime = TemplateAssets(StaticManifest(str(tmp_path))).load()
+    before = sorted(os.listdir(tmp_path / 'dist' / 'bundles'))
+    assert runtime.transform(source) == expected
+    # A block the build never saw stays inline and nothing is written
+    edited = f'<style>{BIG_CSS}.new {{ color: blue; }}</style>'
+    assert runtime.transform(edited) == edited
+    assert sorted(os.listdir(tmp_path / 'dist' / 'bundles')) == before
+    assert runtime.stats['not_built'] == 1
+
+
+def test_minifiers():
+    assert minify_css('a > b ,  c {\n  color : red ;\n  margin: 0 auto; }') == 'a>b,c{color : red;margin: 0 auto}'
+    assert minify_css('a::after { content: "x , y ; > z"; }  b { content:\'{ }\' }') == \
+        'a::after{content: "x , y ; > z"}b{content:\'{ }\'}'
+    js = 'if (a) {\n\n    const html = `\n    <div>\n\n    </div>`;\n    run(html);\n}'
+    assert minify_js(js) == 'if (a) {\nconst html = `\n    <div>\n\n    </div>`;\nrun(html);\n}'
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+测试浏览量合并写入: 同一行的增量合并为一条 UPDATE, 写入失败时增量放回下次重试
+"""
+
+import pytest
+
+from view_counter import ViewCounter
+
+
+class UpdateCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params):
+        if self.connection.fail:
+            raise RuntimeError('lost connection')
+        table = sql.split()[1]
+        self.connection.updates.append((table, list(params)))
+
+    def close(self):
+        pass
+
+
+class UpdateConnection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.updates = []
+        self.rolled_back = False
+
+    def cursor(self):
+        return UpdateCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def counter(monkeypatch):
+    counter = ViewCounter(get_connection=None, max_ids_per_update=2)
+    monkeypatch.setattr(counter, '_ensure_started', lambda: None)
+    return counter
+
+
+def test_failed_flush_puts_the_counts_back(counter):
+    broken = UpdateConnection(fail=True)
+    counter.get_connection = lambda: broken
+    counter.increment('resources', 1)
+    counter.increment('resources', 1)
+
+    assert counter.flush() == 0
+    assert broken.rolled_back and counter.stats['failed_flushes'] == 1
+    # Views recorded while the flush failed are added to the restored delta
+    counter.increment('resources', 1)
+    assert counter.pending('resources', 1) == 3
+
+    working = UpdateConnection()
+    counter.get_connection = lambda: working
+    assert counter.flush() == 1
+    assert working.updates == [('resources', [1, 3, 1])]
+    assert counter.pending('resources', 1) == 0
+
+
+def test_flush_writes_one_update_per_table_chunk(counter):
+    connection = UpdateConnection()
+    counter.get_connection = lambda: connection
+    for row_id in (1, 2, 3):
+        counter.increment('forum_posts', row_id)
+    counter.increment('resources', 9, amount=4)
+
+    assert counter.flush() == 4
+    assert connection.updates == [('forum_posts', [1, 1, 2, 1, 1, 2]),
+                                  ('forum_posts', [3, 1, 3]),
+                                  ('resources', [9, 4, 9])]
+    assert (counter.stats['flushed_rows'], counter.stats['updates']) == (4, 3)
+    with pytest.raises(ValueError):
+        counter.increment('users', 1)
@@ -0,0 +1,165 @@
+"""
+View Counter
+Coalesces view_count increments in memory and flushes them as batched UPDATEs
+"""
+
+import atexit
+import os
+import threading
+
+# Tables whose view_count column may be incremented (names are interpolated into SQL)
+COUNTED_TABLES = ('resources', 'forum_posts')
+
+
+class ViewCounter:
+    """Per-(table, id) delta aggregator for hot view counters
+
+    increment() only touches a dict. A background thread swaps the dict out every
+    flush_interval seconds and writes one UPDATE per table:
+
+        UPDATE resources SET view_count = view_count + CASE id WHEN 1 THEN 3 ... END
+        WHERE id IN (1, ...)
+
+    Deltas from a failed flush are merged back so they are retried, and the
+    remaining deltas are flushed when the interpreter exits.
+
+    Args:
+        get_connection: Callable returning a DB connection whose close() releases it
+        flush_interval: Seconds between flushes
+        max_ids_per_update: Upper bound on ids in a single UPDATE statement
+    """
+
+    def __init__(self, get_connection, flush_interval=5.0, max_ids_per_update=500):
+        self.get_connection = get_connection
+        self.flush_interval = flush_interval
+        self.max_ids_per_update = max_ids_per_update
+        self._deltas = {}   # (table, id) -> pending increment
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.stats = {'increments': 0, 'flushed_rows': 0, 'updates': 0, 'failed_flushes': 0}
+
+    def increment(self, table, row_id, amount=1):
+        """Add to the pending view_count delta of one row"""
+        if table not in COUNTED_TABLES:
+            raise ValueError(f'Unsupported table for view counting: {table}')
+        self._ensure_started()
+        key = (table, int(row_id))
+        with self._lock:
+            self._deltas[key] = self._deltas.get(key, 0) + amount
+            self.stats['increments'] += amount
+
+    def pending(self, table, row_id):
+        """Views recorded in this process but not yet written to the database"""
+        with self._lock:
+            return self._deltas.get((table, int(row_id)), 0)
+
+    def apply_pending(self, rows, table, id_field='id', count_field='view_count'):
+        """Add pending deltas to view counts of rows fetched from the database"""
+        if not rows:
+            return rows
+        with self._lock:
+            if not self._deltas:
+                return rows
+            for row in rows:
+                delta = self._deltas.get((table, row.get(id_field)), 0)
+                if delta:
+                    row[count_field] = (row.get(count_field) or 0) + delta
+        return rows
+
+    def flush(self):
+        """Write all pending deltas; failed deltas are kept for the next flush"""
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas = self._deltas, {}
+            if not deltas:
+                return 0
+
+            by_table = {}
+            for (table, row_id), delta in deltas.items():
+                by_table.setdefault(table, []).append((row_id, delta))
+
+            connection = None
+            try:
+                connection = self.get_connection()
+                if connection is None:
+                    raise RuntimeError('database unavailable')
+                cursor = connection.cursor()
+                updates = 0
+                for table, items in by_table.items():
+                    for start in range(0, len(items), self.max_ids_per_update):
+                        chunk = items[start:start + self.max_ids_per_update]
+                        self._execute_update(cursor, table, chunk)
+                        updates += 1
+                connection.commit()
+                cursor.close()
+            except Exception as e:
+                print(f"Error flushing view counts ({len(deltas)} rows): {e}")
+                if connection is not None:
+                    try:
+                        connection.rollback()
+                    except Exception:
+                        pass
+                self._restore(deltas)
+                return 0
+            finally:
+                if connection is not None:
+                    connection.close()
+
+            with self._lock:
+                self.stats['flushed_rows'] += len(deltas)
+                self.stats['updates'] += updates
+            return len(deltas)
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher and write whatever is still pending"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+        with self._lock:
+            lost = sum(self._deltas.values())
+        if lost:
+            print(f"⚠️ {lost} view count increments could not be written on shutdown")
+
+    def register_shutdown(self):
+        """Flush pending deltas when the interpreter exits"""
+        atexit.register(self.stop)
+        return self
+
+    def _execute_update(self, cursor, table, chunk):
+        cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+        placeholders = ', '.join(['%s'] * len(chunk))
+        params = [value for row_id, delta in chunk for value in (row_id, delta)]
+        params.extend(row_id for row_id, _ in chunk)
+        cursor.execute(f"""
+            UPDATE {table}
+            SET view_count = view_count + CASE id {cases} ELSE 0 END
+            WHERE id IN ({placeholders})
+        """, params)
+
+    def _restore(self, deltas):
+        """Merge the deltas of a failed flush back for the next one"""
+        with self._lock:
+            self.stats['failed_flushes'] += 1
+            for key, delta in deltas.items():
+                self._deltas[key] = self._deltas.get(key, 0) + delta
+
+    def _ensure_started(self):
+        # Threads don't survive fork(), so each worker process starts its own flusher
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()